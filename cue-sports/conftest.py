@@ -0,0 +1,12 @@
+"""
+pytest setup for the algorithm blueprint tests.
+routes.py imports get_firestore_client from the deployment's __init__ module; when that module is not
+on the path the tests provide one without a client, since every test brings its own storage backend.
+"""
+import sys
+import types
+
+try:
+    import __init__  # noqa: F401
+except ImportError:
+    sys.modules['__init__'] = types.SimpleNamespace(get_firestore_client=lambda: None)
@@ -3,23 +3,2004 @@ from flask import Blueprint, request, jsonify
 from __init__ import get_firestore_client
 import firebase_admin
 from firebase_admin import firestore
+import copy
 import math
 import random
+import re
 import json
 import os
+import sqlite3
 import traceback
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from enum import Enum
 from typing import List, Dict, Optional, Tuple
 import logging
 
 # Create Blueprint
 bp = Blueprint('algorithm', __name__, url_prefix='/api/algorithm')
 
-class TournamentProgressionAlgorithm:
+# Number of user documents fetched per multi-document read
+PLAYER_PROFILE_BATCH_SIZE = 100
+
+# Firestore allows at most 500 writes per WriteBatch commit
+FIRESTORE_BATCH_LIMIT = 500
+# Write loads above this size go through a BulkWriter instead of sequential batch commits
+BULK_WRITER_THRESHOLD = 2500
+BULK_WRITER_MAX_ATTEMPTS = 5
+
+# Rounds that can determine community positions, fetched together by the position resolver
+POSITION_BRACKET_BASE_ROUNDS = ['R2', 'R3', 'R4', 'R5']
+POSITION_BRACKET_SUFFIXES = ['_WB', '_LB', '_3WS']
+POSITION_FINAL_ROUNDS = ['Community_WF', 'Community_Final', 'Community_Final_POSITIONING', 'Community_Final_3WAY_FINAL']
+
+# Match field holding the entity id for each tournament level (national matches have no entity field)
+LEVEL_ENTITY_FIELDS = {
+    'community': 'communityId',
+    'county': 'countyId',
+    'regional': 'regionId',
+    'national': None
+}
+
+# Named match field projections; readers ask for the smallest profile they need ('full' = no projection)
+MATCH_FIELD_PROFILES = {
+    'completion_check': [
+        'roundNumber', 'tournamentLevel', 'communityId', 'countyId', 'regionId', 'status',
+        'player1Id', 'player2Id', 'player1Points', 'player2Points', 'winnerId', 'isByeMatch'
+    ],
+    'winner_extraction': [
+        'roundNumber', 'tournamentLevel', 'communityId', 'countyId', 'regionId', 'status',
+        'player1Id', 'player1Name', 'player1Points', 'player1CommunityId', 'player1CountyId', 'player1RegionId',
+        'player2Id', 'player2Name', 'player2Points', 'player2CommunityId', 'player2CountyId', 'player2RegionId',
+        'winnerId', 'loserId'
+    ],
+    'full': None
+}
+
+# Fields admins and result submission fill in after a match is generated, with the values a freshly
+# generated match carries; re-writing an existing match never resets them to these values unless its
+# pairing changed
+MATCH_ADMIN_FIELD_DEFAULTS = {
+    'status': 'scheduled', 'player1Points': 0, 'player2Points': 0,
+    'winnerId': None, 'winnerName': None, 'loserId': None, 'loserName': None,
+    'resultSubmittedAt': None, 'resultSubmittedBy': None,
+    'scheduledDate': None, 'scheduledDateTime': None, 'actualStartTime': None, 'actualEndTime': None,
+    'venueId': None, 'venueName': None, 'venueAddress': None, 'tableNumber': None,
+    'maximumBreaks': None, 'adminNotes': None, 'disputeReason': None
+}
+
+# Stamped on every generated match, so never a reason on their own to re-write one
+MATCH_GENERATION_STAMP_FIELDS = ('createdAt', 'updatedAt')
+
+# A re-written match whose players differ from its prior document is a new pairing and is stored whole
+MATCH_PAIRING_FIELDS = ('player1Id', 'player2Id')
+
+# Sparse match schema: newly written matches leave out fields equal to these defaults and readers fill
+# them back in (documents without schemaVersion predate it and are stored whole)
+MATCH_SCHEMA_VERSION = 2
+MATCH_SPARSE_DEFAULTS = {field: None for field in (
+    'communityId', 'countyId', 'regionId',
+    'winnerId', 'winnerName', 'loserId', 'loserName', 'resultSubmittedAt', 'resultSubmittedBy',
+    'scheduledDate', 'scheduledDateTime', 'actualStartTime', 'actualEndTime',
+    'venueId', 'venueName', 'venueAddress', 'tableNumber', 'maximumBreaks', 'adminNotes', 'disputeReason'
+)}
+
+# How long cached geographical_units documents stay valid
+GEOGRAPHICAL_CACHE_TTL_SECONDS = 6 * 60 * 60
+# After a failed collection scan, misses read single documents for this long before scanning again
+GEOGRAPHICAL_CACHE_RETRY_SECONDS = 60
+
+# Bracket documents kept by the read-through bracket cache (least recently used evicted first)
+BRACKET_CACHE_MAX_TOURNAMENTS = 50
+
+# SQLite database used by testing/offline mode
+LOCAL_STORAGE_PATH = os.environ.get('ALGORITHM_LOCAL_DB', 'tournament_local.db')
+
+# Bracket fields split into per-level / per-entity shard documents when sharded bracket storage is enabled
+BRACKET_SHARD_FIELDS = ('rounds', 'positions', 'winners', 'bracketLevels', 'progression')
+BRACKET_SHARD_LAYOUT_VERSION = 1
+SHARDED_BRACKET_STORAGE = os.environ.get('ALGORITHM_SHARDED_BRACKETS', '').lower() in ('1', 'true', 'yes')
+
+# Resident tournament state kept current by Firestore snapshot listeners (opt-in)
+LIVE_STATE_ENABLED = os.environ.get('ALGORITHM_LIVE_STATE', '').lower() in ('1', 'true', 'yes')
+LIVE_STATE_MAX_TOURNAMENTS = int(os.environ.get('ALGORITHM_LIVE_STATE_MAX_TOURNAMENTS', '20'))
+LIVE_STATE_READY_TIMEOUT_SECONDS = 10
+
+# =================== STORAGE BACKENDS ===================
+
+def resolve_server_timestamps(value):
+    """Stand in for Firestore's server-side timestamp sentinel outside Firestore"""
+    if value is firestore.SERVER_TIMESTAMP:
+        return datetime.now()
+    if isinstance(value, dict):
+        return {key: resolve_server_timestamps(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_server_timestamps(item) for item in value]
+    return value
+
+def apply_field_path_updates(document: Dict, updates: Dict):
+    """Apply Firestore-style dotted field path updates to a document dict in place"""
+    for path, value in updates.items():
+        target = document
+        parts = path.split('.')
+        for part in parts[:-1]:
+            if not isinstance(target.get(part), dict):
+                target[part] = {}
+            target = target[part]
+        target[parts[-1]] = resolve_server_timestamps(copy.deepcopy(value))
+
+def changed_match_fields(prior: Dict, match: Dict) -> List[str]:
+    """
+    Top-level fields of a generated match that need writing over its prior stored document.
+    Empty when nothing changed; updatedAt is only included alongside real changes.
+    """
+    changed = []
+    for field, value in match.items():
+        if field in MATCH_GENERATION_STAMP_FIELDS or (field in prior and prior[field] == value):
+            continue
+        if field in prior and field in MATCH_ADMIN_FIELD_DEFAULTS and value == MATCH_ADMIN_FIELD_DEFAULTS[field]:
+            continue
+        changed.append(field)
+    if changed and 'updatedAt' in match:
+        changed.append('updatedAt')
+    return changed
+
+def merge_match_fields(stored: Optional[Dict], match: Dict, fields: List[str]) -> Dict:
+    """A stored match with only the given top-level fields taken from match, like set(merge=fields)"""
+    merged = copy.deepcopy(stored) if stored else {}
+    for field in fields:
+        merged[field] = copy.deepcopy(match[field])
+    return merged
+
+def compact_match(match: Dict) -> Dict:
+    """Match document in the sparse schema: default-valued fields left out, schemaVersion stamped"""
+    compacted = {field: value for field, value in match.items()
+                 if not (field in MATCH_SPARSE_DEFAULTS and value == MATCH_SPARSE_DEFAULTS[field])}
+    compacted['schemaVersion'] = MATCH_SCHEMA_VERSION
+    return compacted
+
+def expand_match(match: Dict, fields: List[str] = None) -> Dict:
+    """Fill sparse-schema defaults into a stored match in place (only projected fields when fields is given)"""
+    for field, default in MATCH_SPARSE_DEFAULTS.items():
+        if field not in match and (fields is None or field in fields):
+            match[field] = default
+    return match
+
+# ID lists held by each round summary entry
+ROUND_SUMMARY_FIELDS = ('matchIds', 'completedMatchIds', 'winnerIds', 'tiedMatchIds')
+
+def merge_round_summary_results(round_summary: Dict, add: Dict = None, remove: Dict = None):
+    """Union / remove IDs in a round summary entry's lists, like Firestore ArrayUnion / ArrayRemove"""
+    for field, ids in (add or {}).items():
+        values = round_summary.setdefault(field, [])
+        values.extend(value for value in ids if value not in values)
+    for field, ids in (remove or {}).items():
+        round_summary[field] = [value for value in round_summary.get(field, []) if value not in ids]
+
+def apply_round_summary_update(summary: Optional[Dict], update: Dict) -> Dict:
+    """Apply one update_round_summaries() entry to a summary document dict"""
+    summary = summary or {'level': update['level'], 'entityId': update['entityId'], 'rounds': {}}
+    if 'coversAllRounds' in update:
+        summary['coversAllRounds'] = update['coversAllRounds']
+    round_summary = summary.setdefault('rounds', {}).setdefault(update['roundNumber'], {})
+    merge_round_summary_results(round_summary, update.get('add'), update.get('remove'))
+    summary['lastUpdated'] = datetime.now()
+    return summary
+
+class StorageBackend(ABC):
+    """
+    Persistence used by the progression engine: tournaments, users, geographical units,
+    matches (tournaments/{id}/matches) and brackets (tournament_brackets/{id}).
+    Match and bracket dicts are plain data; bracket updates use dotted field paths.
+    Every method is abstract, so an incomplete backend fails when it is created.
+    """
+    
+    @abstractmethod
+    def get_tournament(self, tournament_id: str) -> Optional[Dict]:
+        pass
+    
+    @abstractmethod
+    def get_users(self, user_ids: List[str]) -> Dict[str, Dict]:
+        """Profiles for the given user IDs; missing users are left out"""
+    
+    @abstractmethod
+    def get_geographical_unit(self, unit_id: str) -> Optional[Dict]:
+        pass
+    
+    @abstractmethod
+    def list_geographical_units(self) -> Dict[str, Dict]:
+        pass
+    
+    @abstractmethod
+    def get_matches(self, tournament_id: str, match_ids: List[str], fields: List[str] = None) -> List[Dict]:
+        """Matches by ID in the given order; missing IDs are left out"""
+    
+    @abstractmethod
+    def query_matches(self, tournament_id: str, filters: Dict, round_numbers: List[str] = None,
+                      fields: List[str] = None) -> List[Dict]:
+        """Matches whose fields equal every filter value (and whose roundNumber is in round_numbers)"""
+    
+    @abstractmethod
+    def write_matches(self, tournament_id: str, matches: List[Dict], bracket: Dict = None,
+                      bracket_updates: Dict = None, label: str = 'matches',
+                      match_fields: Dict[str, List[str]] = None) -> Dict:
+        """
+        Store matches, then the bracket (replaced by bracket, or patched by bracket_updates).
+        Matches listed in match_fields only have those top-level fields merged into the stored
+        document; every other match is written whole.
+        The bracket is only written when every match write succeeded.
+        Returns {'success', 'totalWrites', 'chunks': [per-chunk results]}
+        """
+    
+    @abstractmethod
+    def get_bracket(self, tournament_id: str) -> Optional[Dict]:
+        pass
+    
+    @abstractmethod
+    def update_bracket(self, tournament_id: str, updates: Dict):
+        """Apply dotted-path updates to an existing bracket"""
+    
+    @abstractmethod
+    def get_round_summary(self, tournament_id: str, summary_id: str) -> Optional[Dict]:
+        """
+        Round summary document for one level/entity:
+        {'level', 'entityId', 'coversAllRounds', 'rounds': {round: {'matchIds', 'completedMatchIds', 'winnerIds', 'tiedMatchIds'}}}
+        """
+    
+    @abstractmethod
+    def update_round_summaries(self, tournament_id: str, updates: List[Dict]):
+        """
+        Apply incremental round summary updates, creating documents as needed. Each update is
+        {'summaryId', 'level', 'entityId', 'roundNumber', 'add': {list_field: ids}, 'remove': {list_field: ids}}
+        with an optional 'coversAllRounds' flag; add/remove behave like ArrayUnion/ArrayRemove.
+        One update must not add to and remove from the same field (Firestore allows one transform per field).
+        """
+
+class BracketCache:
+    """
+    Bounded LRU of bracket documents keyed by tournament id. Each entry carries the document's
+    update time as its version; an entry is only served while that version is still current.
+    """
+    
+    def __init__(self, max_entries: int = BRACKET_CACHE_MAX_TOURNAMENTS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # tournament_id -> (update_time, bracket)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, tournament_id: str, version) -> Optional[Dict]:
+        """Cached bracket when its version matches, else None"""
+        with self._lock:
+            entry = self._entries.get(tournament_id)
+            if entry is None or version is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(tournament_id)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+    
+    def version(self, tournament_id: str):
+        with self._lock:
+            entry = self._entries.get(tournament_id)
+            return entry[0] if entry else None
+    
+    def put(self, tournament_id: str, version, bracket: Dict):
+        if version is None:
+            return
+        with self._lock:
+            self._entries[tournament_id] = (version, copy.deepcopy(bracket))
+            self._entries.move_to_end(tournament_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, tournament_id: str = None):
+        with self._lock:
+            if tournament_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(tournament_id, None)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'maxEntries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+class FirestoreStorageBackend(StorageBackend):
+    """StorageBackend on a Firestore client, with chunked batch writes and a read-through bracket cache"""
+    
+    def __init__(self, db):
+        self.db = db
+        self.bracket_cache = BracketCache()
+    
+    def _matches_collection(self, tournament_id: str):
+        return self.db.collection('tournaments').document(tournament_id).collection('matches')
+    
+    def _bracket_ref(self, tournament_id: str):
+        return self.db.collection('tournament_brackets').document(tournament_id)
+    
+    def get_tournament(self, tournament_id: str) -> Optional[Dict]:
+        tournament_doc = self.db.collection('tournaments').document(tournament_id).get()
+        return tournament_doc.to_dict() if tournament_doc.exists else None
+    
+    def get_users(self, user_ids: List[str]) -> Dict[str, Dict]:
+        users_ref = self.db.collection('users')
+        profiles = {}
+        for start in range(0, len(user_ids), PLAYER_PROFILE_BATCH_SIZE):
+            chunk = user_ids[start:start + PLAYER_PROFILE_BATCH_SIZE]
+            for user_doc in self.db.get_all([users_ref.document(user_id) for user_id in chunk]):
+                if user_doc.exists:
+                    profiles[user_doc.id] = user_doc.to_dict()
+        return profiles
+    
+    def get_geographical_unit(self, unit_id: str) -> Optional[Dict]:
+        geo_doc = self.db.collection('geographical_units').document(unit_id).get()
+        return geo_doc.to_dict() if geo_doc.exists else None
+    
+    def list_geographical_units(self) -> Dict[str, Dict]:
+        return {doc.id: doc.to_dict() for doc in self.db.collection('geographical_units').get()}
+    
+    def get_matches(self, tournament_id: str, match_ids: List[str], fields: List[str] = None) -> List[Dict]:
+        matches_collection = self._matches_collection(tournament_id)
+        matches_by_id = {}
+        for start in range(0, len(match_ids), FIRESTORE_BATCH_LIMIT):
+            chunk = match_ids[start:start + FIRESTORE_BATCH_LIMIT]
+            for doc in self.db.get_all([matches_collection.document(match_id) for match_id in chunk],
+                                       field_paths=fields):
+                if doc.exists:
+                    match_data = doc.to_dict()
+                    match_data['id'] = doc.id  # Ensure match has ID
+                    matches_by_id[doc.id] = match_data
+        return [matches_by_id[match_id] for match_id in match_ids if match_id in matches_by_id]
+    
+    def query_matches(self, tournament_id: str, filters: Dict, round_numbers: List[str] = None,
+                      fields: List[str] = None) -> List[Dict]:
+        matches_query = self._matches_collection(tournament_id)
+        for field, value in filters.items():
+            matches_query = matches_query.where(field, '==', value)
+        if round_numbers is not None:
+            matches_query = matches_query.where('roundNumber', 'in', list(round_numbers))
+        if fields:
+            matches_query = matches_query.select(fields)
+        
+        matches = []
+        for doc in matches_query.get():
+            match_data = doc.to_dict()
+            match_data['id'] = doc.id  # Ensure match has ID
+            matches.append(match_data)
+        return matches
+    
+    def write_matches(self, tournament_id: str, matches: List[Dict], bracket: Dict = None,
+                      bracket_updates: Dict = None, label: str = 'matches',
+                      match_fields: Dict[str, List[str]] = None) -> Dict:
+        match_writes = self._match_writes(tournament_id, matches, match_fields)
+        final_writes = []
+        if bracket is not None:
+            final_writes.append(('set', self._bracket_ref(tournament_id), bracket))
+        elif bracket_updates:
+            final_writes.append(('update', self._bracket_ref(tournament_id), bracket_updates))
+        try:
+            return self.commit_writes_in_batches(match_writes, final_writes=final_writes, label=label)
+        finally:
+            if final_writes:
+                self.bracket_cache.invalidate(tournament_id)
+    
+    def _match_writes(self, tournament_id: str, matches: List[Dict], match_fields: Dict[str, List[str]] = None) -> List[Tuple]:
+        """Whole-document sets, or field-path merges for matches listed in match_fields"""
+        matches_collection = self._matches_collection(tournament_id)
+        match_fields = match_fields or {}
+        writes = []
+        for match in matches:
+            match_ref = matches_collection.document(match['id'])
+            if match['id'] in match_fields:
+                writes.append(('merge', match_ref, (match, match_fields[match['id']])))
+            else:
+                writes.append(('set', match_ref, match))
+        return writes
+    
+    def get_bracket(self, tournament_id: str) -> Optional[Dict]:
+        bracket_ref = self._bracket_ref(tournament_id)
+        
+        version = None
+        if self.bracket_cache.version(tournament_id) is not None:
+            # Check the cached copy's version with a projected read instead of fetching the whole document
+            version_doc = bracket_ref.get(field_paths=['tournamentId'])
+            if not version_doc.exists:
+                self.bracket_cache.invalidate(tournament_id)
+                return None
+            version = version_doc.update_time
+        cached = self.bracket_cache.get(tournament_id, version)
+        if cached is not None:
+            return cached
+        
+        bracket_doc = bracket_ref.get()
+        if not bracket_doc.exists:
+            self.bracket_cache.invalidate(tournament_id)
+            return None
+        bracket = bracket_doc.to_dict()
+        self.bracket_cache.put(tournament_id, bracket_doc.update_time, bracket)
+        return bracket
+    
+    def update_bracket(self, tournament_id: str, updates: Dict):
+        try:
+            self._bracket_ref(tournament_id).update(updates)
+        finally:
+            self.bracket_cache.invalidate(tournament_id)
+    
+    def _round_summary_ref(self, tournament_id: str, summary_id: str):
+        return self.db.collection('tournaments').document(tournament_id).collection('round_summaries').document(summary_id)
+    
+    def get_round_summary(self, tournament_id: str, summary_id: str) -> Optional[Dict]:
+        summary_doc = self._round_summary_ref(tournament_id, summary_id).get()
+        return summary_doc.to_dict() if summary_doc.exists else None
+    
+    def update_round_summaries(self, tournament_id: str, updates: List[Dict]):
+        writes = []
+        for update in updates:
+            # Firestore rejects empty ArrayUnion / ArrayRemove transforms
+            round_fields = {field: firestore.ArrayUnion(list(ids)) for field, ids in (update.get('add') or {}).items() if ids}
+            round_fields.update({field: firestore.ArrayRemove(list(ids))
+                                 for field, ids in (update.get('remove') or {}).items() if ids})
+            document = {
+                'level': update['level'],
+                'entityId': update['entityId'],
+                'rounds': {update['roundNumber']: round_fields},
+                'lastUpdated': firestore.SERVER_TIMESTAMP
+            }
+            if 'coversAllRounds' in update:
+                document['coversAllRounds'] = update['coversAllRounds']
+            writes.append(('set_merge', self._round_summary_ref(tournament_id, update['summaryId']), document))
+        
+        report = self.commit_writes_in_batches(writes, label='round summaries')
+        if not report['success']:
+            raise RuntimeError(f"Round summary update failed for tournament {tournament_id}")
+    
+    def commit_writes_in_batches(self, writes: List[Tuple], final_writes: List[Tuple] = None,
+                                 label: str = 'documents') -> Dict:
+        """
+        Commit (operation, doc_ref, data) writes in chunked WriteBatch commits, or through a
+        BulkWriter when the load is large. operation is 'set', 'update', 'delete' (data unused),
+        'set_merge' (a set merged into the existing document) or 'merge' (data is
+        (document, field_paths), a set that only replaces those paths).
+        final_writes (e.g. the bracket document) are only committed once every other chunk
+        succeeded, and in the same atomic batch as the other writes whenever everything fits.
+        Returns {'success', 'totalWrites', 'chunks': [per-chunk results]}
+        """
+        final_writes = final_writes or []
+        report = {'success': True, 'totalWrites': len(writes) + len(final_writes), 'chunks': []}
+        
+        if report['totalWrites'] <= FIRESTORE_BATCH_LIMIT:
+            self._commit_write_batch(writes + final_writes, 1, label, report)
+            return report
+        
+        if len(writes) > BULK_WRITER_THRESHOLD:
+            self._commit_with_bulk_writer(writes, label, report)
+        else:
+            for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+                chunk = writes[start:start + FIRESTORE_BATCH_LIMIT]
+                if not self._commit_write_batch(chunk, len(report['chunks']) + 1, label, report):
+                    break
+        
+        if not report['success']:
+            if final_writes:
+                print(f"⚠️ Skipped {len(final_writes)} final write(s) because an earlier chunk failed")
+            return report
+        
+        if final_writes:
+            self._commit_write_batch(final_writes, len(report['chunks']) + 1, label, report)
+        return report
+    
+    def _add_writes(self, writer, writes: List[Tuple]):
+        """Queue (operation, doc_ref, data) writes on a WriteBatch or BulkWriter"""
+        for operation, doc_ref, data in writes:
+            if operation == 'update':
+                writer.update(doc_ref, data)
+            elif operation == 'delete':
+                writer.delete(doc_ref)
+            elif operation == 'merge':
+                document, field_paths = data
+                writer.set(doc_ref, document, merge=field_paths)
+            elif operation == 'set_merge':
+                writer.set(doc_ref, data, merge=True)
+            else:
+                writer.set(doc_ref, data)
+    
+    def _commit_write_batch(self, writes: List[Tuple], chunk_number: int, label: str, report: Dict) -> bool:
+        """Commit a single WriteBatch (at most FIRESTORE_BATCH_LIMIT writes) and record the result"""
+        try:
+            batch = self.db.batch()
+            self._add_writes(batch, writes)
+            batch.commit()
+            report['chunks'].append({'chunk': chunk_number, 'writes': len(writes), 'success': True})
+            print(f"   ✅ Batch {chunk_number}: committed {len(writes)} {label}")
+            return True
+        except Exception as e:
+            report['success'] = False
+            report['chunks'].append({'chunk': chunk_number, 'writes': len(writes), 'success': False, 'error': str(e)})
+            print(f"   ❌ Batch {chunk_number}: failed to commit {len(writes)} {label}: {e}")
+            return False
+    
+    def _commit_with_bulk_writer(self, writes: List[Tuple], label: str, report: Dict):
+        """Stream a large write load through a BulkWriter, flushing and reporting per chunk"""
+        bulk_writer = self.db.bulk_writer()
+        failures = []
+        
+        def on_write_error(error, _writer) -> bool:
+            if error.attempts < BULK_WRITER_MAX_ATTEMPTS:
+                return True
+            failures.append(f"{error.operation.reference.id}: {error.message}")
+            return False
+        
+        bulk_writer.on_write_error(on_write_error)
+        
+        try:
+            for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+                chunk = writes[start:start + FIRESTORE_BATCH_LIMIT]
+                failed_before = len(failures)
+                self._add_writes(bulk_writer, chunk)
+                bulk_writer.flush()
+                
+                chunk_failures = failures[failed_before:]
+                chunk_number = len(report['chunks']) + 1
+                chunk_result = {'chunk': chunk_number, 'writes': len(chunk), 'success': not chunk_failures}
+                if chunk_failures:
+                    chunk_result['errors'] = chunk_failures
+                    report['success'] = False
+                    print(f"   ❌ Bulk chunk {chunk_number}: {len(chunk_failures)} of {len(chunk)} {label} failed")
+                else:
+                    print(f"   ✅ Bulk chunk {chunk_number}: wrote {len(chunk)} {label}")
+                report['chunks'].append(chunk_result)
+        finally:
+            bulk_writer.close()
+
+class ShardedFirestoreStorageBackend(FirestoreStorageBackend):
+    """
+    FirestoreStorageBackend that splits the bracket's rounds, positions, winners and bracketLevels
+    into shard documents under tournament_brackets/{id}/shards, one per entity (one per field for
+    the national level), and keeps the root document as a small index.
+    Concurrent entity updates write different documents, and no document grows with the number
+    of communities. Brackets created without shards are still read and updated in place.
+    """
+    
+    def __init__(self, db):
+        super().__init__(db)
+        # tournament_id -> whether its bracket is sharded (fixed once the bracket is written)
+        self._sharded_brackets = {}
+    
+    def _shards_collection(self, tournament_id: str):
+        return self._bracket_ref(tournament_id).collection('shards')
+    
+    def _shard_ref(self, tournament_id: str, shard_key: Tuple):
+        # Field and level names never contain '.', so the joined id is unique; it is never parsed back
+        return self._shards_collection(tournament_id).document('.'.join(shard_key))
+    
+    def _stored_shard_key(self, shard: Dict) -> Tuple:
+        """Shard key of a stored shard document, from its fields (entity IDs may contain '.')"""
+        if shard.get('entityId') is None:
+            return (shard.get('field'), shard.get('level'))
+        return (shard.get('field'), shard.get('level'), shard['entityId'])
+    
+    def _split_field_path(self, parts: List[str], value) -> List[Tuple]:
+        """
+        Map a bracket field path and value onto (shard_key, path inside the shard, value) entries.
+        Shards are keyed (field, level, entity), or (field, 'national') for the national level;
+        paths above shard depth are spread over the shards of their value.
+        """
+        shard_depth = 2 if len(parts) >= 2 and parts[1] == 'national' else 3
+        if len(parts) >= shard_depth:
+            return [(tuple(parts[:shard_depth]), parts[shard_depth:], value)]
+        entries = []
+        for key, item in (value or {}).items():
+            entries.extend(self._split_field_path(parts + [key], item))
+        return entries
+    
+    def _shard_document(self, shard_key: Tuple, data) -> Dict:
+        return {
+            'field': shard_key[0],
+            'level': shard_key[1],
+            'entityId': shard_key[2] if len(shard_key) > 2 else None,
+            'data': data,
+            'lastUpdated': firestore.SERVER_TIMESTAMP
+        }
+    
+    def _split_bracket(self, tournament_id: str, bracket: Dict) -> Tuple[Dict, Dict]:
+        """Split a full bracket into the root index document and {shard_key: shard document}"""
+        root = {key: value for key, value in bracket.items() if key not in BRACKET_SHARD_FIELDS}
+        shards = {}
+        for field in BRACKET_SHARD_FIELDS:
+            if field not in bracket:
+                continue
+            # The root keeps each field's level keys so empty levels survive reassembly
+            root[field] = {level: {} for level in (bracket[field] or {})}
+            for shard_key, _, data in self._split_field_path([field], bracket[field]):
+                shards[shard_key] = self._shard_document(shard_key, data)
+        root['shardLayout'] = {'version': BRACKET_SHARD_LAYOUT_VERSION, 'collection': 'shards'}
+        return root, shards
+    
+    def _is_sharded(self, tournament_id: str) -> bool:
+        if tournament_id not in self._sharded_brackets:
+            root_doc = self._bracket_ref(tournament_id).get(field_paths=['shardLayout'])
+            if not root_doc.exists:
+                raise ValueError(f"No bracket document to update: tournament_brackets/{tournament_id}")
+            self._sharded_brackets[tournament_id] = bool((root_doc.to_dict() or {}).get('shardLayout'))
+        return self._sharded_brackets[tournament_id]
+    
+    def _bracket_update_writes(self, tournament_id: str, updates: Dict) -> List[Tuple]:
+        """Turn dotted-path bracket updates into writes against the root and the touched shards"""
+        if not self._is_sharded(tournament_id):
+            return [('update', self._bracket_ref(tournament_id), updates)]
+        
+        timestamp = updates.get('lastUpdated', firestore.SERVER_TIMESTAMP)
+        root_updates = {}
+        shard_updates = {}
+        for path, value in updates.items():
+            parts = path.split('.')
+            if parts[0] in BRACKET_SHARD_FIELDS:
+                for shard_key, inner_path, data in self._split_field_path(parts, value):
+                    shard_updates.setdefault(shard_key, {})['.'.join(['data'] + inner_path)] = data
+            elif path != 'lastUpdated':
+                root_updates[path] = value
+        
+        writes = []
+        for shard_key, field_updates in shard_updates.items():
+            document = self._shard_document(shard_key, {})
+            document['lastUpdated'] = timestamp
+            for field_path, data in field_updates.items():
+                target = document
+                field_parts = field_path.split('.')
+                for part in field_parts[:-1]:
+                    target = target.setdefault(part, {})
+                target[field_parts[-1]] = data
+            field_paths = ['field', 'level', 'entityId', 'lastUpdated'] + list(field_updates)
+            writes.append(('merge', self._shard_ref(tournament_id, shard_key), (document, field_paths)))
+        
+        # Only non-shard fields touch the root, so entity updates do not contend on it
+        if root_updates:
+            root_updates['lastUpdated'] = timestamp
+            writes.append(('update', self._bracket_ref(tournament_id), root_updates))
+        return writes
+    
+    def write_matches(self, tournament_id: str, matches: List[Dict], bracket: Dict = None,
+                      bracket_updates: Dict = None, label: str = 'matches',
+                      match_fields: Dict[str, List[str]] = None) -> Dict:
+        writes = self._match_writes(tournament_id, matches, match_fields)
+        final_writes = []
+        
+        if bracket is not None:
+            root, shards = self._split_bracket(tournament_id, bracket)
+            # Shards from an earlier bracket for this tournament must not be reassembled into the new one
+            for shard_doc in self._shards_collection(tournament_id).select(['field', 'level', 'entityId']).get():
+                if self._stored_shard_key(shard_doc.to_dict() or {}) not in shards:
+                    writes.append(('delete', shard_doc.reference, None))
+            writes.extend(('set', self._shard_ref(tournament_id, shard_key), shard)
+                          for shard_key, shard in shards.items())
+            # The root index is committed last, once every shard is in place
+            final_writes.append(('set', self._bracket_ref(tournament_id), root))
+        elif bracket_updates:
+            final_writes.extend(self._bracket_update_writes(tournament_id, bracket_updates))
+        
+        report = self.commit_writes_in_batches(writes, final_writes=final_writes, label=label)
+        if bracket is not None and report['success']:
+            self._sharded_brackets[tournament_id] = True
+        return report
+    
+    def get_bracket(self, tournament_id: str) -> Optional[Dict]:
+        bracket_doc = self._bracket_ref(tournament_id).get()
+        if not bracket_doc.exists:
+            return None
+        bracket = bracket_doc.to_dict()
+        self._sharded_brackets[tournament_id] = bool(bracket.get('shardLayout'))
+        if not bracket.get('shardLayout'):
+            return bracket
+        
+        # Reassemble the full bracket from its shards
+        for shard_doc in self._shards_collection(tournament_id).get():
+            shard = shard_doc.to_dict()
+            levels = bracket.setdefault(shard['field'], {})
+            if shard.get('entityId') is None:
+                levels[shard['level']] = shard.get('data')
+            else:
+                levels.setdefault(shard['level'], {})[shard['entityId']] = shard.get('data')
+        return bracket
+    
+    def update_bracket(self, tournament_id: str, updates: Dict):
+        batch = self.db.batch()
+        self._add_writes(batch, self._bracket_update_writes(tournament_id, updates))
+        batch.commit()
+
+def create_firestore_storage(db) -> StorageBackend:
+    """
+    Firestore storage backend for production: sharded when ALGORITHM_SHARDED_BRACKETS is set,
+    wrapped with resident live state when ALGORITHM_LIVE_STATE is set
+    """
+    backend = ShardedFirestoreStorageBackend(db) if SHARDED_BRACKET_STORAGE else FirestoreStorageBackend(db)
+    if LIVE_STATE_ENABLED:
+        return LiveStorageBackend(backend)
+    return backend
+
+class InMemoryStorageBackend(StorageBackend):
+    """
+    StorageBackend kept entirely in process memory, for benchmarks, simulations and offline tests.
+    Matches are indexed by tournament, entity fields and round so queries avoid full scans.
+    """
+    
+    INDEXED_FIELDS = ('communityId', 'countyId', 'regionId', 'roundNumber')
+    
     def __init__(self):
-        self.db = get_firestore_client()
+        self.tournaments = {}
+        self.users = {}
+        self.geographical_units = {}
+        self.brackets = {}
+        self.round_summaries = {}   # (tournament_id, summary_id) -> round summary document
+        self.matches = {}     # tournament_id -> {match_id: match}
+        self._index = {}      # (tournament_id, field, value) -> set(match_ids)
+        self._lock = threading.RLock()
+    
+    # Seeding helpers
+    
+    def put_tournament(self, tournament_id: str, data: Dict):
+        with self._lock:
+            self.tournaments[tournament_id] = copy.deepcopy(data)
+    
+    def put_user(self, user_id: str, data: Dict):
+        with self._lock:
+            self.users[user_id] = copy.deepcopy(data)
+    
+    def put_geographical_unit(self, unit_id: str, data: Dict):
+        with self._lock:
+            self.geographical_units[unit_id] = copy.deepcopy(data)
+    
+    # StorageBackend
+    
+    def get_tournament(self, tournament_id: str) -> Optional[Dict]:
+        with self._lock:
+            return copy.deepcopy(self.tournaments.get(tournament_id))
+    
+    def get_users(self, user_ids: List[str]) -> Dict[str, Dict]:
+        with self._lock:
+            return {user_id: copy.deepcopy(self.users[user_id]) for user_id in user_ids if user_id in self.users}
+    
+    def get_geographical_unit(self, unit_id: str) -> Optional[Dict]:
+        with self._lock:
+            return copy.deepcopy(self.geographical_units.get(unit_id))
+    
+    def list_geographical_units(self) -> Dict[str, Dict]:
+        with self._lock:
+            return copy.deepcopy(self.geographical_units)
+    
+    def _project(self, match: Dict, fields: List[str] = None) -> Dict:
+        if not fields:
+            return copy.deepcopy(match)
+        projected = {field: copy.deepcopy(match[field]) for field in fields if field in match}
+        projected['id'] = match['id']
+        return projected
+    
+    def get_matches(self, tournament_id: str, match_ids: List[str], fields: List[str] = None) -> List[Dict]:
+        with self._lock:
+            tournament_matches = self.matches.get(tournament_id, {})
+            return [self._project(tournament_matches[match_id], fields)
+                    for match_id in match_ids if match_id in tournament_matches]
+    
+    def query_matches(self, tournament_id: str, filters: Dict, round_numbers: List[str] = None,
+                      fields: List[str] = None) -> List[Dict]:
+        with self._lock:
+            tournament_matches = self.matches.get(tournament_id, {})
+            
+            # Narrow candidates with the indexes before checking the remaining filters
+            candidates = None
+            for field, value in filters.items():
+                if field in self.INDEXED_FIELDS:
+                    ids = self._index.get((tournament_id, field, value), set())
+                    candidates = ids if candidates is None else candidates & ids
+            if round_numbers is not None:
+                ids = set()
+                for round_number in round_numbers:
+                    ids |= self._index.get((tournament_id, 'roundNumber', round_number), set())
+                candidates = ids if candidates is None else candidates & ids
+            if candidates is None:
+                candidates = tournament_matches.keys()
+            
+            results = []
+            for match_id in sorted(candidates):
+                match = tournament_matches[match_id]
+                if all(match.get(field) == value for field, value in filters.items()):
+                    results.append(self._project(match, fields))
+            return results
+    
+    def _store_match(self, tournament_id: str, match: Dict, fields: List[str] = None):
+        tournament_matches = self.matches.setdefault(tournament_id, {})
+        match_id = match['id']
+        previous = tournament_matches.get(match_id)
+        if previous:
+            for field in self.INDEXED_FIELDS:
+                self._index.get((tournament_id, field, previous.get(field)), set()).discard(match_id)
+        if fields is not None:
+            match = merge_match_fields(previous, match, fields)
+        tournament_matches[match_id] = resolve_server_timestamps(copy.deepcopy(match))
+        for field in self.INDEXED_FIELDS:
+            self._index.setdefault((tournament_id, field, match.get(field)), set()).add(match_id)
+    
+    def write_matches(self, tournament_id: str, matches: List[Dict], bracket: Dict = None,
+                      bracket_updates: Dict = None, label: str = 'matches',
+                      match_fields: Dict[str, List[str]] = None) -> Dict:
+        with self._lock:
+            if bracket is None and bracket_updates and tournament_id not in self.brackets:
+                error = f"No bracket document to update: {tournament_id}"
+                return {'success': False, 'totalWrites': 0,
+                        'chunks': [{'chunk': 1, 'writes': 0, 'success': False, 'error': error}]}
+            match_fields = match_fields or {}
+            for match in matches:
+                self._store_match(tournament_id, match, match_fields.get(match['id']))
+            if bracket is not None:
+                self.brackets[tournament_id] = resolve_server_timestamps(copy.deepcopy(bracket))
+            elif bracket_updates:
+                apply_field_path_updates(self.brackets[tournament_id], bracket_updates)
+        total_writes = len(matches) + (1 if bracket is not None or bracket_updates else 0)
+        return {'success': True, 'totalWrites': total_writes,
+                'chunks': [{'chunk': 1, 'writes': total_writes, 'success': True}]}
+    
+    def get_bracket(self, tournament_id: str) -> Optional[Dict]:
+        with self._lock:
+            return copy.deepcopy(self.brackets.get(tournament_id))
+    
+    def update_bracket(self, tournament_id: str, updates: Dict):
+        with self._lock:
+            if tournament_id not in self.brackets:
+                raise KeyError(f"No bracket document to update: {tournament_id}")
+            apply_field_path_updates(self.brackets[tournament_id], updates)
+    
+    def get_round_summary(self, tournament_id: str, summary_id: str) -> Optional[Dict]:
+        with self._lock:
+            return copy.deepcopy(self.round_summaries.get((tournament_id, summary_id)))
+    
+    def update_round_summaries(self, tournament_id: str, updates: List[Dict]):
+        with self._lock:
+            for update in updates:
+                key = (tournament_id, update['summaryId'])
+                self.round_summaries[key] = apply_round_summary_update(self.round_summaries.get(key), update)
+    
+    def remove_match(self, tournament_id: str, match_id: str):
+        with self._lock:
+            match = self.matches.get(tournament_id, {}).pop(match_id, None)
+            if match:
+                for field in self.INDEXED_FIELDS:
+                    self._index.get((tournament_id, field, match.get(field)), set()).discard(match_id)
+    
+    def drop_tournament(self, tournament_id: str):
+        """Forget everything held for a tournament"""
+        with self._lock:
+            self.matches.pop(tournament_id, None)
+            self.brackets.pop(tournament_id, None)
+            self._index = {key: ids for key, ids in self._index.items() if key[0] != tournament_id}
+
+class LiveStorageBackend(StorageBackend):
+    """
+    Wraps a Firestore backend with resident state for watched tournaments. on_snapshot listeners on
+    each tournament's matches subcollection and bracket document keep an indexed in-memory copy
+    current, so match and bracket reads for those tournaments need no Firestore reads.
+    Writes go to Firestore and are applied to the copy straight away; everything else is delegated.
+    """
+    
+    def __init__(self, backend: FirestoreStorageBackend, max_tournaments: int = LIVE_STATE_MAX_TOURNAMENTS,
+                 auto_watch: bool = True):
+        self.backend = backend
+        self.state = InMemoryStorageBackend()
+        self.max_tournaments = max_tournaments
+        self.auto_watch = auto_watch
+        self._watches = {}   # tournament_id -> watch record, least recently used first
+        self._lock = threading.RLock()
+    
+    # Watch management
+    
+    def watch(self, tournament_id: str, timeout: float = LIVE_STATE_READY_TIMEOUT_SECONDS) -> bool:
+        """Start listening to a tournament; returns True once its initial state has loaded (timeout 0 does not wait)"""
+        with self._lock:
+            watch = self._watches.pop(tournament_id, None)
+            if watch is None:
+                watch = self._start_watch(tournament_id)
+            self._watches[tournament_id] = watch
+            while len(self._watches) > self.max_tournaments:
+                self.unwatch(next(iter(self._watches)))
+        
+        if not timeout:
+            return watch['matches_ready'].is_set() and watch['bracket_ready'].is_set()
+        ready = watch['matches_ready'].wait(timeout) and watch['bracket_ready'].wait(timeout)
+        if not ready:
+            print(f"⚠️ Live state for {tournament_id} not ready after {timeout}s - reading from Firestore")
+        return ready
+    
+    def _start_watch(self, tournament_id: str) -> Dict:
+        watch = {
+            'matches_ready': threading.Event(),
+            'bracket_ready': threading.Event(),
+            'bracket_live': True,
+            'listeners': []
+        }
+        
+        def on_matches(_docs, changes, _read_time):
+            # Listener threads share the resident copy with request threads reading its indexes
+            with self.state._lock:
+                for change in changes:
+                    if change.type.name == 'REMOVED':
+                        self.state.remove_match(tournament_id, change.document.id)
+                    else:
+                        match = change.document.to_dict()
+                        match['id'] = change.document.id
+                        self.state._store_match(tournament_id, match)
+            watch['matches_ready'].set()
+        
+        def on_bracket(docs, _changes, _read_time):
+            bracket_doc = docs[0] if docs else None
+            with self.state._lock:
+                if bracket_doc is None or not bracket_doc.exists:
+                    self.state.brackets.pop(tournament_id, None)
+                else:
+                    bracket = bracket_doc.to_dict()
+                    # Sharded brackets are assembled from several documents; keep reading those from Firestore
+                    watch['bracket_live'] = not bracket.get('shardLayout')
+                    self.state.brackets[tournament_id] = resolve_server_timestamps(bracket)
+            watch['bracket_ready'].set()
+        
+        watch['listeners'] = [
+            self.backend._matches_collection(tournament_id).on_snapshot(on_matches),
+            self.backend._bracket_ref(tournament_id).on_snapshot(on_bracket)
+        ]
+        print(f"📡 Listening for live state of tournament {tournament_id}")
+        return watch
+    
+    def unwatch(self, tournament_id: str) -> bool:
+        with self._lock:
+            watch = self._watches.pop(tournament_id, None)
+            if watch is None:
+                return False
+            # Dropped under the lock so a watch started right after never finds its fresh state wiped
+            self.state.drop_tournament(tournament_id)
+        for listener in watch['listeners']:
+            try:
+                listener.unsubscribe()
+            except Exception as e:
+                print(f"⚠️ Error stopping listener for {tournament_id}: {e}")
+        print(f"📴 Stopped live state for tournament {tournament_id}")
+        return True
+    
+    def watched_tournaments(self) -> List[str]:
+        with self._lock:
+            return list(self._watches)
+    
+    def _live_watch(self, tournament_id: str) -> Optional[Dict]:
+        """
+        Watch record when tournament_id is served from resident state. With auto_watch an unwatched
+        tournament starts listening without waiting; reads go to Firestore until its state has loaded.
+        """
+        with self._lock:
+            watch = self._watches.get(tournament_id)
+            if watch is not None:
+                self._watches[tournament_id] = self._watches.pop(tournament_id)
+        if watch is None and self.auto_watch:
+            self.watch(tournament_id, timeout=0)
+            with self._lock:
+                watch = self._watches.get(tournament_id)
+        if watch is None or not (watch['matches_ready'].is_set() and watch['bracket_ready'].is_set()):
+            return None
+        if not all(getattr(listener, 'is_active', True) for listener in watch['listeners']):
+            # A listener stopped streaming - the copy may be stale
+            return None
+        return watch
+    
+    # StorageBackend
+    
+    def get_tournament(self, tournament_id: str) -> Optional[Dict]:
+        return self.backend.get_tournament(tournament_id)
+    
+    def get_users(self, user_ids: List[str]) -> Dict[str, Dict]:
+        return self.backend.get_users(user_ids)
+    
+    def get_geographical_unit(self, unit_id: str) -> Optional[Dict]:
+        return self.backend.get_geographical_unit(unit_id)
+    
+    def list_geographical_units(self) -> Dict[str, Dict]:
+        return self.backend.list_geographical_units()
+    
+    def get_matches(self, tournament_id: str, match_ids: List[str], fields: List[str] = None) -> List[Dict]:
+        if self._live_watch(tournament_id) is not None:
+            return self.state.get_matches(tournament_id, match_ids, fields)
+        return self.backend.get_matches(tournament_id, match_ids, fields)
+    
+    def query_matches(self, tournament_id: str, filters: Dict, round_numbers: List[str] = None,
+                      fields: List[str] = None) -> List[Dict]:
+        if self._live_watch(tournament_id) is not None:
+            return self.state.query_matches(tournament_id, filters, round_numbers, fields)
+        return self.backend.query_matches(tournament_id, filters, round_numbers, fields)
+    
+    def write_matches(self, tournament_id: str, matches: List[Dict], bracket: Dict = None,
+                      bracket_updates: Dict = None, label: str = 'matches',
+                      match_fields: Dict[str, List[str]] = None) -> Dict:
+        report = self.backend.write_matches(tournament_id, matches, bracket=bracket,
+                                            bracket_updates=bracket_updates, label=label, match_fields=match_fields)
+        with self._lock:
+            watch = self._watches.get(tournament_id)
+            if report['success'] and watch is not None:
+                # Apply locally so the writer sees its own writes before the listener echoes them
+                if not watch['bracket_live']:
+                    bracket, bracket_updates = None, None
+                if bracket_updates and self.state.get_bracket(tournament_id) is None:
+                    bracket_updates = None
+                self.state.write_matches(tournament_id, matches, bracket=bracket, bracket_updates=bracket_updates,
+                                         match_fields=match_fields)
+        return report
+    
+    def get_bracket(self, tournament_id: str) -> Optional[Dict]:
+        watch = self._live_watch(tournament_id)
+        if watch is not None and watch['bracket_live']:
+            return self.state.get_bracket(tournament_id)
+        return self.backend.get_bracket(tournament_id)
+    
+    def update_bracket(self, tournament_id: str, updates: Dict):
+        self.backend.update_bracket(tournament_id, updates)
+        with self._lock:
+            watch = self._watches.get(tournament_id)
+            if watch is not None and watch['bracket_live']:
+                try:
+                    self.state.update_bracket(tournament_id, updates)
+                except KeyError:
+                    pass
+    
+    def get_round_summary(self, tournament_id: str, summary_id: str) -> Optional[Dict]:
+        return self.backend.get_round_summary(tournament_id, summary_id)
+    
+    def update_round_summaries(self, tournament_id: str, updates: List[Dict]):
+        self.backend.update_round_summaries(tournament_id, updates)
+
+class SQLiteStorageBackend(StorageBackend):
+    """
+    StorageBackend on an embedded SQLite database for testing and offline runs.
+    Every match is its own row, upserted in place and indexed by tournament, level, entity and round;
+    documents are stored as JSON.
+    """
+    
+    # Match fields stored in their own columns so filters run in SQL
+    MATCH_COLUMNS = {
+        'tournamentLevel': 'level',
+        'communityId': 'community_id',
+        'countyId': 'county_id',
+        'regionId': 'region_id',
+        'roundNumber': 'round_number',
+        'status': 'status'
+    }
+    
+    # SQLite caps the number of bound parameters per statement
+    QUERY_CHUNK_SIZE = 500
+    
+    def __init__(self, path: str = LOCAL_STORAGE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._create_schema()
+    
+    def _create_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            for table in ('tournaments', 'users', 'geographical_units'):
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS brackets (tournament_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS round_summaries (tournament_id TEXT NOT NULL, id TEXT NOT NULL, "
+                               "data TEXT NOT NULL, PRIMARY KEY (tournament_id, id))")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS matches (
+                    tournament_id TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    level TEXT,
+                    entity_id TEXT,
+                    community_id TEXT,
+                    county_id TEXT,
+                    region_id TEXT,
+                    round_number TEXT,
+                    status TEXT,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (tournament_id, id)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_entity_round "
+                               "ON matches (tournament_id, level, entity_id, round_number)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_community_round "
+                               "ON matches (tournament_id, community_id, round_number)")
+    
+    def _encode(self, document: Dict) -> str:
+        return json.dumps(resolve_server_timestamps(document), ensure_ascii=False, default=str)
+    
+    def _get_document(self, table: str, doc_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT data FROM {table} WHERE id = ?", (doc_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+    
+    def _put_document(self, table: str, doc_id: str, data: Dict):
+        with self._lock, self._conn:
+            self._conn.execute(f"INSERT OR REPLACE INTO {table} (id, data) VALUES (?, ?)", (doc_id, self._encode(data)))
+    
+    # Seeding helpers
+    
+    def put_tournament(self, tournament_id: str, data: Dict):
+        self._put_document('tournaments', tournament_id, data)
+    
+    def put_user(self, user_id: str, data: Dict):
+        self._put_document('users', user_id, data)
+    
+    def put_geographical_unit(self, unit_id: str, data: Dict):
+        self._put_document('geographical_units', unit_id, data)
+    
+    # StorageBackend
+    
+    def get_tournament(self, tournament_id: str) -> Optional[Dict]:
+        return self._get_document('tournaments', tournament_id)
+    
+    def get_users(self, user_ids: List[str]) -> Dict[str, Dict]:
+        profiles = {}
+        with self._lock:
+            for start in range(0, len(user_ids), self.QUERY_CHUNK_SIZE):
+                chunk = user_ids[start:start + self.QUERY_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                for row in self._conn.execute(f"SELECT id, data FROM users WHERE id IN ({placeholders})", chunk):
+                    profiles[row['id']] = json.loads(row['data'])
+        return profiles
+    
+    def get_geographical_unit(self, unit_id: str) -> Optional[Dict]:
+        return self._get_document('geographical_units', unit_id)
+    
+    def list_geographical_units(self) -> Dict[str, Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT id, data FROM geographical_units").fetchall()
+        return {row['id']: json.loads(row['data']) for row in rows}
+    
+    def _decode_match(self, row, fields: List[str] = None) -> Dict:
+        match = json.loads(row['data'])
+        if fields:
+            match = {field: match[field] for field in fields if field in match}
+        match['id'] = row['id']  # Ensure match has ID
+        return match
+    
+    def get_matches(self, tournament_id: str, match_ids: List[str], fields: List[str] = None) -> List[Dict]:
+        matches_by_id = {}
+        with self._lock:
+            for start in range(0, len(match_ids), self.QUERY_CHUNK_SIZE):
+                chunk = match_ids[start:start + self.QUERY_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                for row in self._conn.execute(f"SELECT id, data FROM matches WHERE tournament_id = ? AND id IN ({placeholders})",
+                                              [tournament_id] + chunk):
+                    matches_by_id[row['id']] = self._decode_match(row, fields)
+        return [matches_by_id[match_id] for match_id in match_ids if match_id in matches_by_id]
+    
+    def query_matches(self, tournament_id: str, filters: Dict, round_numbers: List[str] = None,
+                      fields: List[str] = None) -> List[Dict]:
+        clauses = ['tournament_id = ?']
+        params = [tournament_id]
+        remaining_filters = {}
+        
+        # Level-scoped entity filters use the (level, entity_id, round_number) index
+        level = filters.get('tournamentLevel')
+        level_entity_field = LEVEL_ENTITY_FIELDS.get(level) if level else None
+        for field, value in filters.items():
+            if field == level_entity_field:
+                clauses.append('entity_id = ?')
+            elif field in self.MATCH_COLUMNS:
+                clauses.append(f'{self.MATCH_COLUMNS[field]} = ?')
+            else:
+                remaining_filters[field] = value
+                continue
+            params.append(value)
+        if round_numbers is not None:
+            if not round_numbers:
+                return []
+            clauses.append(f"round_number IN ({','.join('?' * len(round_numbers))})")
+            params.extend(round_numbers)
+        
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id, data FROM matches WHERE {' AND '.join(clauses)} ORDER BY id",
+                                      params).fetchall()
+        
+        matches = []
+        for row in rows:
+            match = json.loads(row['data'])
+            if all(match.get(field) == value for field, value in remaining_filters.items()):
+                matches.append(self._decode_match(row, fields))
+        return matches
+    
+    def _match_row(self, tournament_id: str, match: Dict) -> Tuple:
+        level = match.get('tournamentLevel')
+        entity_field = LEVEL_ENTITY_FIELDS.get(level) if level else None
+        return (
+            tournament_id, match['id'], level, match.get(entity_field) if entity_field else None,
+            match.get('communityId'), match.get('countyId'), match.get('regionId'),
+            match.get('roundNumber'), match.get('status'), self._encode(match)
+        )
+    
+    def write_matches(self, tournament_id: str, matches: List[Dict], bracket: Dict = None,
+                      bracket_updates: Dict = None, label: str = 'matches',
+                      match_fields: Dict[str, List[str]] = None) -> Dict:
+        total_writes = len(matches) + (1 if bracket is not None or bracket_updates else 0)
+        try:
+            with self._lock, self._conn:
+                # Matches and bracket commit in one transaction
+                match_fields = match_fields or {}
+                rows = []
+                for match in matches:
+                    if match['id'] in match_fields:
+                        stored = self._conn.execute("SELECT data FROM matches WHERE tournament_id = ? AND id = ?",
+                                                    (tournament_id, match['id'])).fetchone()
+                        match = merge_match_fields(json.loads(stored['data']) if stored else None,
+                                                   match, match_fields[match['id']])
+                    rows.append(self._match_row(tournament_id, match))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO matches (tournament_id, id, level, entity_id, community_id, county_id, "
+                    "region_id, round_number, status, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                if bracket is not None:
+                    self._conn.execute("INSERT OR REPLACE INTO brackets (tournament_id, data) VALUES (?, ?)",
+                                       (tournament_id, self._encode(bracket)))
+                elif bracket_updates:
+                    self._update_bracket_row(tournament_id, bracket_updates)
+        except Exception as e:
+            print(f"❌ Failed to write {label}: {e}")
+            return {'success': False, 'totalWrites': 0,
+                    'chunks': [{'chunk': 1, 'writes': total_writes, 'success': False, 'error': str(e)}]}
+        return {'success': True, 'totalWrites': total_writes,
+                'chunks': [{'chunk': 1, 'writes': total_writes, 'success': True}]}
+    
+    def get_bracket(self, tournament_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM brackets WHERE tournament_id = ?", (tournament_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+    
+    def update_bracket(self, tournament_id: str, updates: Dict):
+        with self._lock, self._conn:
+            self._update_bracket_row(tournament_id, updates)
+    
+    def _update_bracket_row(self, tournament_id: str, updates: Dict):
+        row = self._conn.execute("SELECT data FROM brackets WHERE tournament_id = ?", (tournament_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No bracket document to update: {tournament_id}")
+        bracket = json.loads(row['data'])
+        apply_field_path_updates(bracket, updates)
+        self._conn.execute("UPDATE brackets SET data = ? WHERE tournament_id = ?", (self._encode(bracket), tournament_id))
+    
+    def get_round_summary(self, tournament_id: str, summary_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM round_summaries WHERE tournament_id = ? AND id = ?",
+                                     (tournament_id, summary_id)).fetchone()
+        return json.loads(row['data']) if row else None
+    
+    def update_round_summaries(self, tournament_id: str, updates: List[Dict]):
+        with self._lock, self._conn:
+            for update in updates:
+                row = self._conn.execute("SELECT data FROM round_summaries WHERE tournament_id = ? AND id = ?",
+                                         (tournament_id, update['summaryId'])).fetchone()
+                summary = apply_round_summary_update(json.loads(row['data']) if row else None, update)
+                self._conn.execute("INSERT OR REPLACE INTO round_summaries (tournament_id, id, data) VALUES (?, ?, ?)",
+                                   (tournament_id, update['summaryId'], self._encode(summary)))
+
+# =================== GEOGRAPHICAL UNIT CACHE ===================
+
+class GeographicalUnitCache:
+    """
+    Process-wide cache of geographical_units documents keyed by community id.
+    Entries expire after ttl_seconds; warm() loads the whole collection in one scan, run by one
+    thread at a time (concurrent misses wait for it). A failed scan is retried after retry_seconds.
+    Missing units are cached too so unknown ids are not re-read for every player.
+    """
+    
+    def __init__(self, ttl_seconds: int = GEOGRAPHICAL_CACHE_TTL_SECONDS,
+                 retry_seconds: int = GEOGRAPHICAL_CACHE_RETRY_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self._entries = {}   # community_id -> (expires_at, unit data or None)
+        self._warmed_until = 0   # no collection scan before this time (warm expiry or failure backoff)
+        self._lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+    
+    def get(self, storage: StorageBackend, community_id: str) -> Optional[Dict]:
+        """Return the cached unit, warming the cache or reading the single document on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(community_id)
+            if entry and entry[0] > now:
+                return entry[1]
+            needs_warm = self._warmed_until <= now
+        
+        if needs_warm:
+            self.warm(storage, force=False)
+            with self._lock:
+                entry = self._entries.get(community_id)
+                if entry and entry[0] > now:
+                    return entry[1]
+        
+        unit = storage.get_geographical_unit(community_id)
+        with self._lock:
+            self._entries[community_id] = (time.time() + self.ttl_seconds, unit)
+        return unit
+    
+    def warm(self, storage: StorageBackend, force: bool = True) -> int:
+        """
+        Load every geographical unit with a single collection scan. Without force, a thread that
+        waited on another's scan (or finds the cache warm or backing off) returns without scanning.
+        """
+        with self._warm_lock:
+            if not force:
+                with self._lock:
+                    if self._warmed_until > time.time():
+                        return 0
+            try:
+                units = storage.list_geographical_units()
+            except Exception as e:
+                with self._lock:
+                    self._warmed_until = time.time() + self.retry_seconds
+                print(f"⚠️ Could not warm geographical unit cache (retrying in {self.retry_seconds}s): {e}")
+                return 0
+            
+            expires_at = time.time() + self.ttl_seconds
+            with self._lock:
+                for unit_id, unit in units.items():
+                    self._entries[unit_id] = (expires_at, unit)
+                self._warmed_until = expires_at
+        print(f"🗺️ Geographical unit cache warmed with {len(units)} units")
+        return len(units)
+    
+    def invalidate(self, community_id: str = None):
+        """Drop one community (or everything when community_id is None) so it is re-read on next use"""
+        with self._lock:
+            if community_id is None:
+                self._entries.clear()
+                self._warmed_until = 0
+            else:
+                self._entries.pop(community_id, None)
+
+geographical_unit_cache = GeographicalUnitCache()
+
+# =================== REQUEST CONTEXT ===================
+
+class AlgorithmRequestContext:
+    """Per-request state, kept apart from the shared algorithm engine"""
+    
+    def __init__(self, request_scoped: bool = True):
+        # False for the default context of code running outside an API request
+        self.request_scoped = request_scoped
+        self.snapshots = {}              # tournament_id -> TournamentSnapshot
+        self.player_profile_loads = {}   # tournament_id -> (registered_player_ids, profiles)
+        self.bracket_rounds = {}         # tournament_id -> bracket 'rounds' map
+        self.round_summaries = {}        # (tournament_id, summary_id) -> round summary document or None
+        self.documents = {}              # document path -> document (None if missing), the request's identity map
+        self.started_at = time.time()
+
+_request_local = threading.local()
+
+def begin_request_context(request_scoped: bool = True) -> AlgorithmRequestContext:
+    """Start a fresh context for the current thread's request"""
+    _request_local.context = AlgorithmRequestContext(request_scoped)
+    return _request_local.context
+
+def end_request_context():
+    """Drop the current thread's request context and everything it holds"""
+    _request_local.context = None
+
+def get_request_context() -> AlgorithmRequestContext:
+    """Current request context; calls made outside a request get a thread-local default"""
+    context = getattr(_request_local, 'context', None)
+    if context is None:
+        context = begin_request_context(request_scoped=False)
+    return context
+
+# =================== REQUEST-SCOPED TOURNAMENT SNAPSHOT ===================
+
+class TournamentSnapshot:
+    """
+    Matches of one tournament, loaded once per entity and indexed by level, entity and round.
+    Lives for a single API request so repeated round lookups do not re-query Firestore.
+    """
+    
+    def __init__(self, tournament_id: str):
+        self.tournament_id = tournament_id
+        self.matches = {}            # match_id -> match data
+        self.loaded_entities = set()
+        self._by_entity_round = {}   # (entity_id, round) -> [match_ids]
+        self._by_level = {}          # (level, entity_id, round) -> [match_ids]
+        self.queries = 0
+    
+    def is_loaded(self, entity_id: str) -> bool:
+        return entity_id in self.loaded_entities
+    
+    def load_entity(self, entity_id: str, matches: List[Dict]):
+        """Store every match of an entity; later lookups for that entity are served from memory"""
+        self.loaded_entities.add(entity_id)
+        self.queries += 1
+        for match in matches:
+            self.put(match)
+    
+    def put(self, match: Dict):
+        """Insert or replace a match, keeping the indexes in sync"""
+        match_id = match.get('id')
+        if not match_id:
+            return
+        if match_id in self.matches:
+            self._unindex(self.matches[match_id])
+        self.matches[match_id] = match
+        entity_key = (match.get('communityId'), match.get('roundNumber'))
+        level_key = (match.get('tournamentLevel'), match.get('communityId'), match.get('roundNumber'))
+        self._by_entity_round.setdefault(entity_key, []).append(match_id)
+        self._by_level.setdefault(level_key, []).append(match_id)
+    
+    def _unindex(self, match: Dict):
+        for index, key in ((self._by_entity_round, (match.get('communityId'), match.get('roundNumber'))),
+                           (self._by_level, (match.get('tournamentLevel'), match.get('communityId'), match.get('roundNumber')))):
+            if match.get('id') in index.get(key, []):
+                index[key].remove(match.get('id'))
+    
+    def round_matches(self, entity_id: str, round_number: str, level: str = None) -> List[Dict]:
+        if level:
+            match_ids = self._by_level.get((level, entity_id, round_number), [])
+        else:
+            match_ids = self._by_entity_round.get((entity_id, round_number), [])
+        return [dict(self.matches[match_id]) for match_id in match_ids]
+    
+    def entity_matches(self, entity_id: str) -> List[Dict]:
+        return [dict(match) for match in self.matches.values() if match.get('communityId') == entity_id]
+
+# =================== MATCH RECORDS ===================
+
+class MatchRecord(MutableMapping):
+    """
+    Compact in-memory match used while generating rounds: the fields create_comprehensive_match
+    emits live in __slots__ and anything a generator adds later goes to a small overflow dict.
+    Reads and mutates like the match dict it stands in for (match['x'], get, update, in, dict(match));
+    storage writes and API responses receive plain dicts.
+    """
+    
+    FIELDS = (
+        'id', 'tournamentId', 'matchNumber', 'roundNumber', 'tournamentLevel', 'communityId', 'countyId', 'regionId',
+        'player1Id', 'player1Name', 'player1CommunityId', 'player1Points',
+        'player2Id', 'player2Name', 'player2CommunityId', 'player2Points',
+        'status', 'winnerId', 'winnerName', 'loserId', 'loserName', 'resultSubmittedAt', 'resultSubmittedBy',
+        'scheduledDate', 'scheduledDateTime', 'actualStartTime', 'actualEndTime', 'timeZone',
+        'venueId', 'venueName', 'venueAddress', 'tableNumber', 'maximumBreaks', 'adminNotes', 'searchableText',
+        'isByeMatch', 'disputeReason', 'isLevelFinal', 'geographicalSeparation', 'positionBasedMatching',
+        'determinesTop3', 'createdAt', 'updatedAt', 'createdBy'
+    )
+    __slots__ = FIELDS + ('_extra',)
+    _FIELD_SET = frozenset(FIELDS)
+    
+    def __init__(self, fields: Dict = None):
+        self._extra = None
+        for key, value in (fields or {}).items():
+            if key in self._FIELD_SET:
+                setattr(self, key, value)
+            else:
+                self[key] = value
+    
+    def __getitem__(self, key):
+        if key in self._FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None or key not in self._extra:
+            raise KeyError(key)
+        return self._extra[key]
+    
+    def __setitem__(self, key, value):
+        if key in self._FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+    
+    def __delitem__(self, key):
+        if key in self._FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+    
+    def __iter__(self):
+        for field in self.FIELDS:
+            if hasattr(self, field):
+                yield field
+        if self._extra:
+            yield from self._extra
+    
+    def __len__(self):
+        return sum(1 for _ in self)
+    
+    def copy(self) -> 'MatchRecord':
+        return MatchRecord(self)
+    
+    def __repr__(self):
+        return f"MatchRecord({dict(self)!r})"
+
+# =================== PLAYER PAIRING ===================
+
+class PlayerPairing:
+    """
+    Pairs players in list order (after a random shuffle unless shuffle=False).
+    pairs() lazily yields (match_number, player1, player2) by walking an index over the list,
+    so pairing stays linear in the field size; odd_player is the one left over, if any.
+    """
+    
+    def __init__(self, players: List[Dict], shuffle: bool = True):
+        self.players = list(players)
+        if shuffle:
+            random.shuffle(self.players)
+        self.pair_count = len(self.players) // 2
+        self.odd_player = self.players[-1] if len(self.players) % 2 else None
+        self.next_match_number = self.pair_count + 1  # first match number after the pairs
+    
+    def pairs(self):
+        players = self.players
+        for index in range(self.pair_count):
+            yield index + 1, players[2 * index], players[2 * index + 1]
+
+# =================== ROUND NAMES ===================
+
+# Round name prefix for each tournament level; community elimination rounds are unprefixed (R1, R2, ...)
+ROUND_LEVEL_NAMES = {
+    'community': 'Community',
+    'county': 'County',
+    'regional': 'Regional',
+    'national': 'National',
+    'special': 'Special'
+}
+ROUND_LEVELS_BY_NAME = {name: level for level, name in ROUND_LEVEL_NAMES.items()}
+# Community elimination runs R1-R5 before its final; other levels count on (County_R6, ...)
+COMMUNITY_ELIMINATION_ROUNDS = 5
+LEVEL_ELIMINATION_ROUNDS = 8
+# Stage rounds checked first when detecting the current round, highest first
+SPECIAL_ROUND_PRIORITY = {'Final': 30, 'WF': 20, 'SF': 10}
+ROUND_NAME_PATTERN = re.compile(r'^(?:(Community|County|Regional|National|Special)_)?'
+                                r'(?:R(\d+)|(SF|WF|LF|Final))(?:_(WB|LB|3WS))?$')
+
+class RoundDescriptor:
+    """
+    Parsed round name. phase is R for elimination rounds, SF/WF/LF/Final for stage rounds and
+    WB/LB/3WS for the bracket rounds hanging off an elimination round (base is the unsuffixed name).
+    next/previous link the static progression; winner-count rules live in next_community_round.
+    Names outside the grammar get a descriptor with no level or phase.
+    """
+    
+    __slots__ = ('name', 'level', 'ordinal', 'phase', 'base', 'next', 'previous', 'priority')
+    
+    def __init__(self, name: str, level: Optional[str] = None, ordinal: Optional[int] = None,
+                 phase: Optional[str] = None, base: Optional[str] = None,
+                 next_round: Optional[str] = None, previous_round: Optional[str] = None):
+        self.name = name
+        self.level = level
+        self.ordinal = ordinal
+        self.phase = phase
+        self.base = base or name
+        self.next = next_round
+        self.previous = previous_round
+        self.priority = SPECIAL_ROUND_PRIORITY.get(phase, 0)
+    
+    @property
+    def is_elimination(self) -> bool:
+        return self.phase == 'R'
+    
+    def __repr__(self):
+        return f"RoundDescriptor({self.name!r}, level={self.level!r}, phase={self.phase!r})"
+
+def elimination_round_name(level: str, ordinal: int) -> str:
+    """R3 for community, County_R3 / Regional_R3 / National_R3 elsewhere"""
+    if level == 'community':
+        return f"R{ordinal}"
+    return f"{ROUND_LEVEL_NAMES[level]}_R{ordinal}"
+
+def parse_round_name(round_name: str) -> RoundDescriptor:
+    """Build the descriptor for one round name (use round_descriptor for the interned lookup)"""
+    match = ROUND_NAME_PATTERN.match(round_name)
+    if not match:
+        return RoundDescriptor(round_name)
+    prefix, ordinal, stage, bracket = match.groups()
+    level = ROUND_LEVELS_BY_NAME[prefix] if prefix else 'community'
+    level_name = ROUND_LEVEL_NAMES[level]
+    ordinal = int(ordinal) if ordinal else None
+    
+    if bracket:
+        base = round_name[:-len(bracket) - 1]
+        return RoundDescriptor(round_name, level, ordinal, bracket, base)
+    if stage:
+        next_round = f"{level_name}_Final" if stage == 'WF' else None
+        return RoundDescriptor(round_name, level, None, stage, next_round=next_round)
+    
+    if level == 'community' and ordinal >= COMMUNITY_ELIMINATION_ROUNDS:
+        next_round = 'Community_Final'
+    else:
+        next_round = elimination_round_name(level, ordinal + 1)
+    previous_round = elimination_round_name(level, ordinal - 1) if ordinal > 1 else None
+    return RoundDescriptor(round_name, level, ordinal, 'R', next_round=next_round, previous_round=previous_round)
+
+# Interned descriptors by round name, precomputed below for every level's standard rounds
+ROUND_DESCRIPTORS: Dict[str, RoundDescriptor] = {}
+
+def round_descriptor(round_name: str) -> RoundDescriptor:
+    """O(1) descriptor lookup; names in the grammar but outside the precomputed set are parsed once and interned"""
+    descriptor = ROUND_DESCRIPTORS.get(round_name)
+    if descriptor is None:
+        descriptor = parse_round_name(round_name)
+        if descriptor.phase is not None:
+            descriptor = ROUND_DESCRIPTORS.setdefault(round_name, descriptor)
+    return descriptor
+
+def build_round_descriptors():
+    """Precompute every level's elimination, bracket and stage rounds"""
+    for level, level_name in ROUND_LEVEL_NAMES.items():
+        round_count = COMMUNITY_ELIMINATION_ROUNDS if level == 'community' else LEVEL_ELIMINATION_ROUNDS
+        for ordinal in range(1, round_count + 1):
+            round_name = elimination_round_name(level, ordinal)
+            round_descriptor(round_name)
+            for suffix in POSITION_BRACKET_SUFFIXES:
+                round_descriptor(f"{round_name}{suffix}")
+        for stage in ('SF', 'WF', 'LF', 'Final'):
+            round_descriptor(f"{level_name}_{stage}")
+
+build_round_descriptors()
+
+# Every community round a bracket tracks status for, in progression order
+COMMUNITY_STANDARD_ROUNDS = [elimination_round_name('community', ordinal)
+                             for ordinal in range(1, COMMUNITY_ELIMINATION_ROUNDS + 1)] + \
+                            ['Community_SF', 'Community_WF', 'Community_LF', 'Community_Final']
+
+# =================== COMMUNITY PROGRESSION PLAN ===================
+
+def next_community_round(current_round: str, winners_count: int) -> Optional[str]:
+    """Next community round for a completed round and its winner count (None once the final is done)"""
+    descriptor = round_descriptor(current_round)
+    phase = descriptor.phase
+    if phase == 'Final':
+        return None
+    if phase == 'SF':
+        # 3-player SF (1 match) has 1 winner → Final, 4-player SF (2 matches) has 2 → WF
+        return 'Community_WF' if winners_count == 2 else 'Community_Final'
+    if phase == 'WF':
+        return 'Community_Final'
+    if winners_count in (3, 4):
+        return 'Community_SF'
+    if winners_count <= 2:
+        return 'Community_Final'
+    return descriptor.next or 'Community_Final'
+
+class ProgressionState(str, Enum):
+    """
+    Where a community's progression plan stands. Derived from the plan's results map, the generated
+    rounds and the bracket's finalized positions whenever it is read, never stored, so concurrent result
+    writes (each touching only its own results entry) cannot leave a stale state behind.
+    """
+    AWAITING_RESULTS = 'awaiting_results'    # the latest generated stage still has undecided matches
+    STAGE_DECIDED = 'stage_decided'          # every match of the latest stage decided, next stage can be generated
+    POSITIONS_DECIDED = 'positions_decided'  # every position source decided, ready to finalize
+    FINALIZED = 'finalized'                  # the decided positions are the ones written to the bracket
+
+def plan_stage_match_ids(plan: Dict, stage: Dict) -> List[str]:
+    """
+    Match IDs of a plan stage. Elimination stages only store their match count (match_1..match_N, then
+    bye_N+1 when the round has a bye); positioning stages list their IDs.
+    """
+    if 'matchIds' in stage:
+        return stage['matchIds']
+    prefix = f"{stage['round']}_COMM_{plan['communityId']}"
+    match_ids = [f"{prefix}_match_{number}" for number in range(1, stage['matchCount'] + 1)]
+    if stage.get('byeMatch'):
+        match_ids.append(f"{prefix}_bye_{stage['matchCount'] + 1}")
+    return match_ids
+
+def current_plan_stage_index(plan: Dict, generated_rounds: Dict[str, List[str]]) -> Optional[int]:
+    """Index of the latest plan stage whose matches have all been generated"""
+    current_index = None
+    for index, stage in enumerate(plan.get('stages') or []):
+        match_ids = plan_stage_match_ids(plan, stage)
+        if match_ids and set(match_ids) <= set(generated_rounds.get(stage['round']) or []):
+            current_index = index
+    return current_index
+
+def build_community_progression_plan(community_id: str, player_count: int) -> Dict:
+    """
+    Precompute a community's whole progression tree from its player count.
+    Positioning stages list their match IDs with entrant slots: 'winner:<match_id>', 'loser:<match_id>'
+    and 'waiting:<match_id>', or the stage's 'winners:<round>' redraw source. Elimination stages redraw
+    every match from one source, so they only store it with their match count (see plan_stage_match_ids)
+    to keep plans of large communities small. Results fill in per match.
+    Communities of 4+ players follow next-round generation ('next_round' flow); smaller ones the
+    positioning matches created at initialization ('progressive' flow).
+    """
+    prefix = f"COMM_{community_id}"
+    stages = []
+    positions = {}
+    positioning_players = player_count
+    
+    def add_stage(round_name: str, slots: Dict[str, List[str]], next_round: Optional[str],
+                  phase: str = 'positioning', **extra):
+        stages.append(dict({'round': round_name, 'phase': phase, 'matchIds': list(slots), 'slots': slots,
+                            'next': next_round}, **extra))
+    
+    def add_four_player_stages(sf_ids: List[str], source: str) -> Dict[str, str]:
+        winners_id = f"Community_WF_{prefix}_winners"
+        losers_id = f"Community_WF_{prefix}_losers"
+        final_id = f"Community_Final_{prefix}_match_1"
+        add_stage('Community_SF', {sf_id: [source, source] for sf_id in sf_ids}, 'Community_WF',
+                  entrants=4, advancing=2)
+        add_stage('Community_WF', {winners_id: [f'winner:{sf_id}' for sf_id in sf_ids],
+                                   losers_id: [f'loser:{sf_id}' for sf_id in sf_ids]}, 'Community_Final',
+                  entrants=4, advancing=2)
+        add_stage('Community_Final', {final_id: [f'loser:{winners_id}', f'winner:{losers_id}']}, None,
+                  entrants=2, advancing=1)
+        return {'1': f'winner:{winners_id}', '2': f'winner:{final_id}', '3': f'loser:{final_id}'}
+    
+    if player_count == 1:
+        auto_id = f"SINGLE_PLAYER_{prefix}_auto_1"
+        add_stage('Community_Final', {auto_id: ['registered', 'AUTO_POS1']}, None)
+        positions = {'1': f'winner:{auto_id}'}
+    elif player_count == 2:
+        final_id = f"TWO_PLAYER_FINAL_{prefix}_final_1"
+        add_stage('Community_Final', {final_id: ['registered', 'registered']}, None)
+        positions = {'1': f'winner:{final_id}', '2': f'loser:{final_id}'}
+    elif player_count == 3:
+        initial_id = f"Community_Final_{prefix}_INITIAL"
+        final_id = f"Community_Final_{prefix}_POS23_FINAL"
+        add_stage('Community_Final', {initial_id: ['registered', 'registered']}, 'Community_Final',
+                  waiting={initial_id: 'registered'})
+        add_stage('Community_Final', {final_id: [f'loser:{initial_id}', f'waiting:{initial_id}']}, None)
+        positions = {'1': f'winner:{initial_id}', '2': f'winner:{final_id}', '3': f'loser:{final_id}'}
+    elif player_count == 4:
+        # Initialization creates the semi-finals directly; next-round carries them through WF and Final
+        positions = add_four_player_stages([f"Community_SF_{prefix}_SF1", f"Community_SF_{prefix}_SF2"], 'registered')
+    elif player_count >= 5:
+        # Elimination rounds: every match produces one winner (byes and the R1 double-duty match included)
+        round_name, entrants, source = 'R1', player_count, 'registered'
+        while round_name not in ('Community_SF', 'Community_Final'):
+            pair_count, odd = divmod(entrants, 2)
+            match_count = pair_count + 1 if odd and round_name == 'R1' and entrants > 3 else pair_count
+            bye_match = odd and match_count == pair_count
+            advancing = match_count + 1 if bye_match else match_count
+            next_round = next_community_round(round_name, advancing)
+            stages.append({'round': round_name, 'phase': 'elimination', 'source': source, 'matchCount': match_count,
+                           'byeMatch': bye_match, 'next': next_round, 'entrants': entrants, 'advancing': advancing})
+            round_name, entrants, source = next_round, advancing, f'winners:{round_name}'
+        positioning_players = entrants
+        
+        if round_name == 'Community_SF' and entrants == 3:
+            sf_id = f"Community_SF_{prefix}_match_1"
+            final_id = f"Community_Final_{prefix}_match_1"
+            add_stage('Community_SF', {sf_id: [source, source]}, 'Community_Final',
+                      waiting={sf_id: source}, entrants=3, advancing=1)
+            add_stage('Community_Final', {final_id: [f'loser:{sf_id}', f'waiting:{sf_id}']}, None,
+                      entrants=2, advancing=1)
+            positions = {'1': f'winner:{sf_id}', '2': f'winner:{final_id}', '3': f'loser:{final_id}'}
+        elif round_name == 'Community_SF':
+            positions = add_four_player_stages([f"Community_SF_{prefix}_match_1", f"Community_SF_{prefix}_match_2"], source)
+        else:
+            # Fields too large to reach 4 by R5 go straight to a final, which only pairs exactly 2 players
+            final_id = f"Community_Final_{prefix}_match_1"
+            add_stage('Community_Final', {final_id: [source, source]} if entrants == 2 else {}, None,
+                      entrants=entrants, advancing=1 if entrants == 2 else 0)
+            if entrants == 2:
+                positions = {'1': f'winner:{final_id}', '2': f'loser:{final_id}'}
+    
+    return {
+        'communityId': community_id,
+        'playersCount': player_count,
+        'flow': 'next_round' if player_count >= 4 else 'progressive',
+        'scenario': f'{positioning_players}_player' if 1 <= positioning_players <= 4 else 'unknown',
+        'stages': stages,
+        'positions': positions,
+        'results': {},
+    }
+
+class TournamentProgressionAlgorithm:
+    def __init__(self, db=None, storage: StorageBackend = None, testing_mode: bool = False):
+        # Shared engine: per-request state lives in AlgorithmRequestContext, not on the instance
+        if storage is None:
+            # Testing/offline mode keeps everything in a local SQLite database
+            storage = (SQLiteStorageBackend(LOCAL_STORAGE_PATH) if testing_mode
+                       else create_firestore_storage(db if db is not None else get_firestore_client()))
+        self.storage = storage
+        self.testing_mode = testing_mode
+        # Production shares the process-wide cache; other backends keep their own
+        self.geographical_cache = (geographical_unit_cache
+                                   if isinstance(storage, (FirestoreStorageBackend, LiveStorageBackend))
+                                   else GeographicalUnitCache())
         print("🎯 Enhanced Tournament Algorithm initialized!")
-        print("🔥 Production mode: Writing directly to Firebase database")
+        print(f"🔥 Storage backend: {type(storage).__name__}")
+    
+    # =================== REQUEST SNAPSHOT MANAGEMENT ===================
+    
+    @contextmanager
+    def tournament_snapshot(self, tournament_id: str):
+        """Serve match reads for tournament_id from one TournamentSnapshot for the duration of the block"""
+        snapshots = self._request_snapshots()
+        if tournament_id in snapshots:
+            # Nested call within the same request - reuse the open snapshot
+            yield snapshots[tournament_id]
+            return
+        
+        snapshot = TournamentSnapshot(tournament_id)
+        snapshots[tournament_id] = snapshot
+        try:
+            yield snapshot
+        finally:
+            snapshots.pop(tournament_id, None)
+            print(f"📸 Snapshot for {tournament_id} closed: {len(snapshot.matches)} matches from {snapshot.queries} queries")
+    
+    def _request_snapshots(self) -> Dict[str, TournamentSnapshot]:
+        return get_request_context().snapshots
+    
+    def get_tournament_snapshot(self, tournament_id: str) -> Optional[TournamentSnapshot]:
+        """Return the snapshot open for this request, if any"""
+        return self._request_snapshots().get(tournament_id)
+    
+    def get_snapshot_entity(self, tournament_id: str, entity_id: str) -> Optional[TournamentSnapshot]:
+        """Return the open snapshot with entity_id's matches loaded (one query on first use)"""
+        snapshot = self.get_tournament_snapshot(tournament_id)
+        if snapshot is None:
+            return None
+        if not snapshot.is_loaded(entity_id):
+            snapshot.load_entity(entity_id, self.query_entity_matches(tournament_id, entity_id))
+        return snapshot
+    
+    def get_bracket_rounds(self, tournament_id: str) -> Dict:
+        """Bracket rounds map (level -> entity -> round -> [match_ids]), read once per request"""
+        bracket_rounds = get_request_context().bracket_rounds
+        if tournament_id not in bracket_rounds:
+            bracket_rounds[tournament_id] = (self.get_bracket_document(tournament_id) or {}).get('rounds', {})
+        return bracket_rounds[tournament_id]
+    
+    def record_bracket_round(self, tournament_id: str, level: str, entity_id: str,
+                             round_number: str, match_ids: List[str]):
+        """Keep the request's cached bracket rounds in sync with a rounds write"""
+        bracket_rounds = get_request_context().bracket_rounds
+        if tournament_id in bracket_rounds:
+            bracket_rounds[tournament_id].setdefault(level, {}).setdefault(entity_id, {})[round_number] = list(match_ids)
+    
+    def get_bracket_round_match_ids(self, tournament_id: str, entity_id: str, round_number: str) -> Optional[List[str]]:
+        """Resolve a round's deterministic match IDs from the bracket; None when the bracket has no entry"""
+        if not entity_id:
+            return None
+        for level_rounds in self.get_bracket_rounds(tournament_id).values():
+            entity_rounds = level_rounds.get(entity_id) if isinstance(level_rounds, dict) else None
+            if isinstance(entity_rounds, dict) and entity_rounds.get(round_number):
+                return entity_rounds[round_number]
+        return None
+    
+    def get_matches_by_ids(self, tournament_id: str, match_ids: List[str], profile: str = 'full') -> List[Dict]:
+        """Fetch match documents directly by ID with chunked multi-gets, keeping the given order"""
+        fields = MATCH_FIELD_PROFILES[profile]
+        return [expand_match(match, fields) for match in self.storage.get_matches(tournament_id, match_ids, fields)]
+    
+    def record_matches_in_snapshot(self, tournament_id: str, matches: List[Dict]):
+        """Keep an open snapshot consistent with matches just written"""
+        snapshot = self.get_tournament_snapshot(tournament_id)
+        if snapshot is None:
+            return
+        for match in matches:
+            snapshot.put(dict(match))
+    
+    def get_prior_matches(self, tournament_id: str, matches: List[Dict]) -> Dict[str, Dict]:
+        """
+        Stored documents of the given generated matches, where they already exist. Served from the
+        open snapshot; matches the bracket already lists (re-generated rounds) are multi-read once.
+        """
+        prior_matches = {}
+        unknown_ids = []
+        snapshot = self.get_tournament_snapshot(tournament_id)
+        for match in matches:
+            match_id = match['id']
+            if snapshot is not None and match_id in snapshot.matches:
+                prior_matches[match_id] = snapshot.matches[match_id]
+            elif snapshot is not None and snapshot.is_loaded(match.get('communityId')):
+                continue
+            else:
+                entity_id = match.get(LEVEL_ENTITY_FIELDS.get(match.get('tournamentLevel')) or 'communityId')
+                listed_ids = self.get_bracket_round_match_ids(tournament_id, entity_id, match.get('roundNumber'))
+                if listed_ids and match_id in listed_ids:
+                    unknown_ids.append(match_id)
+        
+        if unknown_ids:
+            for stored_match in self.get_matches_by_ids(tournament_id, unknown_ids):
+                prior_matches[stored_match['id']] = stored_match
+        return prior_matches
+    
+    def plan_match_writes(self, tournament_id: str, matches: List[Dict]) -> Tuple[List[Dict], Dict[str, List[str]], List[Dict]]:
+        """
+        Diff generated matches against their prior documents. New and re-paired matches are written whole
+        (sparse schema), existing ones only get their changed fields merged and unchanged ones are skipped.
+        Returns (matches to write, match_fields for storage.write_matches, resulting match documents,
+        IDs of already-stored matches that were changed)
+        """
+        prior_matches = self.get_prior_matches(tournament_id, matches)
+        to_write, match_fields, stored_matches, rewritten_ids = [], {}, [], []
+        for match in matches:
+            prior = prior_matches.get(match['id'])
+            if prior is None:
+                to_write.append(compact_match(match))
+                stored_matches.append(match)
+                continue
+            if any(prior.get(field) != match.get(field) for field in MATCH_PAIRING_FIELDS):
+                # New players: the prior result, points and schedule belong to the old pairing
+                to_write.append(compact_match(match))
+                stored_matches.append(match)
+                rewritten_ids.append(match['id'])
+                continue
+            fields = changed_match_fields(prior, match)
+            if fields:
+                to_write.append(dict(match))
+                match_fields[match['id']] = fields
+                rewritten_ids.append(match['id'])
+            stored_matches.append(merge_match_fields(prior, match, fields))
+        
+        if prior_matches:
+            repaired_count = len(rewritten_ids) - len(match_fields)
+            print(f"   ♻️ {len(prior_matches)} of {len(matches)} matches already stored: {repaired_count} re-paired, "
+                  f"{len(match_fields)} partially updated, {len(prior_matches) - len(rewritten_ids)} unchanged")
+        return to_write, match_fields, stored_matches, rewritten_ids
+    
+    # =================== REQUEST DOCUMENT IDENTITY MAP ===================
+    
+    def read_request_document(self, path: str, loader) -> Optional[Dict]:
+        """
+        Read a document at most once per API request: the first result for a path is kept in the
+        request's identity map and later reads get a copy of it. Outside a request, always loads.
+        """
+        context = get_request_context()
+        if not context.request_scoped:
+            return loader()
+        if path not in context.documents:
+            context.documents[path] = loader()
+        document = context.documents[path]
+        return copy.deepcopy(document) if document is not None else None
+    
+    def get_tournament_document(self, tournament_id: str) -> Optional[Dict]:
+        return self.read_request_document(f'tournaments/{tournament_id}',
+                                          lambda: self.storage.get_tournament(tournament_id))
+    
+    def get_bracket_document(self, tournament_id: str) -> Optional[Dict]:
+        return self.read_request_document(f'tournament_brackets/{tournament_id}',
+                                          lambda: self.storage.get_bracket(tournament_id))
+    
+    def remember_bracket_write(self, tournament_id: str, bracket: Dict = None, updates: Dict = None):
+        """Keep the request's copy of the bracket in line with a write it just made"""
+        documents = get_request_context().documents
+        path = f'tournament_brackets/{tournament_id}'
+        if bracket is not None:
+            documents[path] = resolve_server_timestamps(copy.deepcopy(bracket))
+        elif updates and documents.get(path) is not None:
+            apply_field_path_updates(documents[path], updates)
+    
+    def update_bracket_document(self, tournament_id: str, updates: Dict):
+        """Apply dotted-path bracket updates in storage and to the request's copy"""
+        try:
+            self.storage.update_bracket(tournament_id, updates)
+        except Exception:
+            get_request_context().documents.pop(f'tournament_brackets/{tournament_id}', None)
+            raise
+        self.remember_bracket_write(tournament_id, updates=updates)
+    
+    def watch_tournament(self, tournament_id: str) -> Dict:
+        """Keep a tournament resident in memory (live state mode only)"""
+        if not isinstance(self.storage, LiveStorageBackend):
+            return {'success': False, 'error': 'Live state mode is not enabled (set ALGORITHM_LIVE_STATE=1)'}
+        ready = self.storage.watch(tournament_id)
+        return {'success': ready, 'tournamentId': tournament_id, 'watching': self.storage.watched_tournaments()}
+    
+    def unwatch_tournament(self, tournament_id: str) -> Dict:
+        if not isinstance(self.storage, LiveStorageBackend):
+            return {'success': False, 'error': 'Live state mode is not enabled (set ALGORITHM_LIVE_STATE=1)'}
+        stopped = self.storage.unwatch(tournament_id)
+        return {'success': stopped, 'tournamentId': tournament_id, 'watching': self.storage.watched_tournaments()}
     
     # =================== INITIALIZATION (Called Once) ===================
     
@@ -40,6 +2021,19 @@ class TournamentProgressionAlgorithm:
         print(f"🌟 Special Mode: {special}")
         print(f"📅 Scheduling preference: {scheduling_preference}")
         
+        profile_loads = get_request_context().player_profile_loads
+        try:
+            return self._initialize_tournament(tournament_id, special, level, scheduling_preference)
+        finally:
+            # Profiles are only shared within one initialization run
+            profile_loads.pop(tournament_id, None)
+    
+    def _initialize_tournament(self, tournament_id: str, special: bool, level: str,
+                               scheduling_preference: str) -> Dict:
+        """Run initialization with registered player profiles loaded once and shared"""
+        # Load every registered player profile up front in batched reads
+        get_request_context().player_profile_loads[tournament_id] = self.load_registered_player_profiles(tournament_id)
+        
         # Get tournament configuration
         config = self.get_tournament_configuration(tournament_id)
         if not config:
@@ -166,7 +2160,7 @@ class TournamentProgressionAlgorithm:
             'initialMatches': len(initial_matches),
             'totalMatches': len(initial_matches),
             'roundsToCompletion': rounds_needed,
-            'matches': matches_with_scheduling  # Include the actual matches array for frontend
+            'matches': [dict(match) for match in matches_with_scheduling]  # Include the actual matches array for frontend
         }
     
     def initialize_level_based_tournament(self, tournament_id: str, config: Dict, 
@@ -233,7 +2227,7 @@ class TournamentProgressionAlgorithm:
             'initialMatches': len(initial_matches),
             'totalMatches': len(initial_matches),
             'bracketLevels': len(bracket.get('bracketLevels', {})),
-            'matches': matches_with_scheduling  # Include the actual matches array for frontend
+            'matches': [dict(match) for match in matches_with_scheduling]  # Include the actual matches array for frontend
         }
     
     def generate_all_initial_community_matches(self, tournament_id: str, config: Dict) -> List[Dict]:
@@ -404,14 +2398,9 @@ class TournamentProgressionAlgorithm:
         print(f"   Players available: {len(players)} (mixed communities)")
         
         matches = []
-        available_players = players.copy()
-        random.shuffle(available_players)  # Random pairing across all communities
+        pairing = PlayerPairing(players)  # Random pairing across all communities
         
-        match_number = 1
-        while len(available_players) >= 2:
-            player1 = available_players.pop(0)
-            player2 = available_players.pop(0)
-            
+        for match_number, player1, player2 in pairing.pairs():
             # Create predictable match ID for special tournament
             match_id = f"{round_number}_SPECIAL_mixed_match_{match_number}"
             
@@ -432,12 +2421,11 @@ class TournamentProgressionAlgorithm:
             
             matches.append(match)
             print(f"   Match {match_number}: {player1['name']} ({player1.get('communityId', 'N/A')}) vs {player2['name']} ({player2.get('communityId', 'N/A')})")
-            match_number += 1
         
         # Handle odd player (bye to next round)
-        if available_players:
-            bye_player = available_players[0]
-            bye_match = self.create_special_bye_match(tournament_id, round_number, bye_player, match_number)
+        if pairing.odd_player is not None:
+            bye_player = pairing.odd_player
+            bye_match = self.create_special_bye_match(tournament_id, round_number, bye_player, pairing.next_match_number)
             matches.append(bye_match)
             print(f"   Bye Match: {bye_player['name']} gets automatic advancement")
         
@@ -996,39 +2984,17 @@ class TournamentProgressionAlgorithm:
         try:
             print(f"🌟 Getting ALL players for special tournament: {tournament_id}")
             
-            # Get tournament document to access registeredPlayersIds
-            tournament_ref = self.db.collection('tournaments').document(tournament_id)
-            tournament_doc = tournament_ref.get()
-            
-            if not tournament_doc.exists:
+            registered_player_ids, profiles = self.load_registered_player_profiles(tournament_id)
+            if registered_player_ids is None:
                 print(f"❌ Tournament {tournament_id} not found")
                 return []
             
-            tournament_data = tournament_doc.to_dict()
-            print(f"🔍 DEBUG: Tournament document keys: {list(tournament_data.keys())}")
-            print(f"🔍 DEBUG: Tournament document data: {tournament_data}")
-            
-            # First try the expected field name (with 's')
-            registered_player_ids = tournament_data.get('registeredPlayersIds', [])
-            print(f"🔍 DEBUG: Found {len(registered_player_ids)} player IDs in 'registeredPlayersIds': {registered_player_ids}")
-            
-            # Check for common alternative field name (without 's')
-            if not registered_player_ids:
-                registered_player_ids = tournament_data.get('registeredPlayerIds', [])
-                if registered_player_ids:
-                    print(f"🔧 FIELD NAME FIX: Using 'registeredPlayerIds' (without 's') - found {len(registered_player_ids)} players")
-                    print(f"🔍 DEBUG: Player IDs from 'registeredPlayerIds': {registered_player_ids}")
-            
             all_players = []
             
             for player_id in registered_player_ids:
-                # Get user details
-                user_ref = self.db.collection('users').document(player_id)
-                user_doc = user_ref.get()
+                user_data = profiles.get(player_id)
                 
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    
+                if user_data is not None:
                     player_name = (user_data.get('playerName') or 
                                  user_data.get('displayName') or 
                                  user_data.get('fullName') or 
@@ -1226,6 +3192,11 @@ class TournamentProgressionAlgorithm:
                             'currentRound': 'R1'
                         }
             
+            # Precompute every community's full progression tree from its initial matches
+            bracket['progression'] = self.build_community_progression_plans(matches)
+            for community_id, plan in bracket['progression']['community'].items():
+                bracket['bracketLevels']['community'][community_id]['playersCount'] = plan['playersCount']
+            
             # Set round status based on what rounds we found
             rounds_found = set()
             for community_rounds in bracket['rounds'].values():
@@ -1238,8 +3209,7 @@ class TournamentProgressionAlgorithm:
                 bracket['roundStatus'] = {first_round: 'in_progress'}
                 
                 # Add all standard rounds including 4-player system
-                standard_rounds = ['R1', 'R2', 'R3', 'R4', 'R5', 'Community_SF', 'Community_WF', 'Community_LF', 'Community_Final']
-                for round_name in standard_rounds:
+                for round_name in COMMUNITY_STANDARD_ROUNDS:
                     if round_name != first_round:
                         bracket['roundStatus'][round_name] = 'pending'
                 
@@ -1380,21 +3350,26 @@ class TournamentProgressionAlgorithm:
                                 'playersCount': 0,  # Will be updated by actual player counting
                                 'currentRound': 'R1'
                             }
-            
+
+                # Precompute every community's full progression tree from its initial matches
+                bracket['progression'] = self.build_community_progression_plans(matches)
+                for community_id, plan in bracket['progression']['community'].items():
+                    if community_id in bracket['bracketLevels']['community']:
+                        bracket['bracketLevels']['community'][community_id]['playersCount'] = plan['playersCount']
+
             # Set round status based on what rounds we found
             rounds_found = set()
             for community_rounds in bracket['rounds'].values():
                 for round_number in community_rounds.keys():
                     rounds_found.add(round_number)
-            
-            # Set first round as in_progress, others as pending (including 4-player rounds)  
+
+            # Set first round as in_progress, others as pending (including 4-player rounds)
             if rounds_found:
                 first_round = min(rounds_found) if rounds_found else 'R1'
                 bracket['roundStatus'] = {first_round: 'in_progress'}
                 
                 # Add all standard rounds including 4-player system
-                standard_rounds = ['R1', 'R2', 'R3', 'R4', 'R5', 'Community_SF', 'Community_WF', 'Community_LF', 'Community_Final']
-                for round_name in standard_rounds:
+                for round_name in COMMUNITY_STANDARD_ROUNDS:
                     if round_name != first_round:
                         bracket['roundStatus'][round_name] = 'pending'
                 
@@ -1426,83 +3401,96 @@ class TournamentProgressionAlgorithm:
         """
         print(f"🏘️ Generating community next round for {community_id}, current round: {current_round}")
         
-        # Auto-detect the actual current round state
-        actual_current_round = self.detect_actual_current_round(tournament_id, community_id, current_round)
-        print(f"   Current round provided: {current_round}")
-        print(f"   Actual current round detected: {actual_current_round}")
-        
-        # Extract base round from bracket suffixes (R2_WB -> R2)
-        base_round = self.extract_base_round(actual_current_round)
-        print(f"   Base round extracted: {base_round} from actual_current_round: {actual_current_round}")
-        
-        # Check if this is a bracket scenario that needs completion
-        bracket_status = self.check_bracket_scenario_completion(tournament_id, community_id, base_round)
-        
-        if bracket_status['action'] == 'create_final':
-            # Create final positioning match for bracket scenario
-            print(f"🏁 Creating final positioning match for {bracket_status['scenario']} scenario")
-            final_matches = self.create_final_positioning_match_from_brackets(
-                tournament_id, community_id, base_round, bracket_status['scenario']
-            )
-            
-            if final_matches:
-                # Write final match and update bracket
-                write_success = self.write_community_round_data(
-                    tournament_id, community_id, final_matches[0]['roundNumber'], final_matches
+        # All round detection and validation below reads from one snapshot of the community's matches
+        with self.tournament_snapshot(tournament_id):
+            return self._generate_community_next_round(tournament_id, community_id, current_round)
+    
+    def _generate_community_next_round(self, tournament_id: str, community_id: str,
+                                       current_round: str) -> Dict:
+        """Community next-round generation body, run inside a tournament snapshot"""
+        # A precomputed progression plan answers directly once the round's results are recorded
+        planned_step = self.get_planned_community_step(tournament_id, community_id)
+        if planned_step:
+            base_round, next_round, current_round_winners = planned_step
+            print(f"   📐 Progression plan: {base_round} decided with {len(current_round_winners)} recorded winners → {next_round}")
+        else:
+            # Auto-detect the actual current round state
+            actual_current_round = self.detect_actual_current_round(tournament_id, community_id, current_round)
+            print(f"   Current round provided: {current_round}")
+            print(f"   Actual current round detected: {actual_current_round}")
+            
+            # Extract base round from bracket suffixes (R2_WB -> R2)
+            base_round = self.extract_base_round(actual_current_round)
+            print(f"   Base round extracted: {base_round} from actual_current_round: {actual_current_round}")
+            
+            # Check if this is a bracket scenario that needs completion
+            bracket_status = self.check_bracket_scenario_completion(tournament_id, community_id, base_round)
+            
+            if bracket_status['action'] == 'create_final':
+                # Create final positioning match for bracket scenario
+                print(f"🏁 Creating final positioning match for {bracket_status['scenario']} scenario")
+                final_matches = self.create_final_positioning_match_from_brackets(
+                    tournament_id, community_id, base_round, bracket_status['scenario']
                 )
                 
+                if final_matches:
+                    # Write final match and update bracket
+                    write_success = self.write_community_round_data(
+                        tournament_id, community_id, final_matches[0]['roundNumber'], final_matches
+                    )
+                    
+                    return {
+                        'success': write_success,
+                        'tournamentId': tournament_id,
+                        'communityId': community_id,
+                        'roundGenerated': final_matches[0]['roundNumber'],
+                        'matchesGenerated': len(final_matches),
+                        'action': 'final_positioning_match_created',
+                        'scenario': bracket_status['scenario'],
+                        'message': 'Final positioning match created. Complete this match to determine positions 2 and 3.'
+                    }
+                else:
+                    return {'success': False, 'error': 'Failed to create final positioning match'}
+            
+            elif bracket_status['action'] == 'tournament_complete':
+                # Tournament is already complete - return positions
+                positions = self.get_tournament_positions(tournament_id, community_id, 'community')
                 return {
-                    'success': write_success,
+                    'success': True,
                     'tournamentId': tournament_id,
                     'communityId': community_id,
-                    'roundGenerated': final_matches[0]['roundNumber'],
-                    'matchesGenerated': len(final_matches),
-                    'action': 'final_positioning_match_created',
-                    'scenario': bracket_status['scenario'],
-                    'message': 'Final positioning match created. Complete this match to determine positions 2 and 3.'
+                    'action': 'tournament_complete',
+                    'message': 'Community tournament is complete. All positions determined.',
+                    'positions': positions
                 }
+            
+            # Standard round validation and progression
+            validation_result = self.validate_round_completion(tournament_id, community_id, base_round, 'community')
+            if not validation_result['success']:
+                return validation_result
+            
+            # Get winners from current round for this specific community FIRST
+            # Handle bracket scenarios specially for winner collection
+            if bracket_status.get('scenario') in ['2match', '3match']:
+                # For bracket scenarios, we need to collect winners differently
+                current_round_winners = self.get_bracket_scenario_winners(
+                    tournament_id, community_id, base_round, bracket_status['scenario']
+                )
             else:
-                return {'success': False, 'error': 'Failed to create final positioning match'}
-        
-        elif bracket_status['action'] == 'tournament_complete':
-            # Tournament is already complete - return positions
-            positions = self.get_tournament_positions(tournament_id, community_id, 'community')
-            return {
-                'success': True,
-                'tournamentId': tournament_id,
-                'communityId': community_id,
-                'action': 'tournament_complete',
-                'message': 'Community tournament is complete. All positions determined.',
-                'positions': positions
-            }
-        
-        # Standard round validation and progression
-        validation_result = self.validate_round_completion(tournament_id, community_id, base_round, 'community')
-        if not validation_result['success']:
-            return validation_result
-        
-        # Get winners from current round for this specific community FIRST
-        # Handle bracket scenarios specially for winner collection
-        if bracket_status.get('scenario') in ['2match', '3match']:
-            # For bracket scenarios, we need to collect winners differently
-            current_round_winners = self.get_bracket_scenario_winners(
-                tournament_id, community_id, base_round, bracket_status['scenario']
-            )
-        else:
-            # Standard winner collection
-            current_round_winners = self.get_community_round_winners(
-                tournament_id, community_id, base_round
-            )
-        
-        if len(current_round_winners) < 1:
-            return {'error': 'No winners found from current round', 'success': False}
-        
-        # Determine next round based on number of winners
-        next_round = self.get_next_community_round_smart(base_round, len(current_round_winners))
-        
-        if not next_round:
-            return {'error': 'Community tournament completed', 'success': False}
-        
+                # Standard winner collection
+                current_round_winners = self.get_community_round_winners(
+                    tournament_id, community_id, base_round
+                )
+            
+            if len(current_round_winners) < 1:
+                return {'error': 'No winners found from current round', 'success': False}
+            
+            # Determine next round based on number of winners
+            next_round = self.get_next_community_round_smart(base_round, len(current_round_winners))
+            
+            if not next_round:
+                return {'error': 'Community tournament completed', 'success': False}
+            
         # Generate matches for next round using new 3-player and 4-player logic
         level = 'community'  # This will be generalized when this method is expanded for other levels
         
@@ -1595,14 +3583,9 @@ class TournamentProgressionAlgorithm:
         print(f"         Players available: {len(players)}")
         
         matches = []
-        available_players = players.copy()
-        random.shuffle(available_players)  # Random pairing within community
+        pairing = PlayerPairing(players)  # Random pairing within community
         
-        match_number = 1
-        while len(available_players) >= 2:
-            player1 = available_players.pop(0)
-            player2 = available_players.pop(0)
-            
+        for match_number, player1, player2 in pairing.pairs():
             # Create predictable match ID: {round}_{level}_{community}_{match_number}
             match_id = f"{round_number}_COMM_{community_id}_match_{match_number}"
             
@@ -1614,11 +3597,10 @@ class TournamentProgressionAlgorithm:
             
             matches.append(match)
             print(f"         Match {match_number}: {player1['name']} vs {player2['name']} (ID: {match_id})")
-            match_number += 1
         
         # Handle odd player - different logic for R1 vs subsequent rounds
-        if available_players:
-            odd_player = available_players[0]
+        if pairing.odd_player is not None:
+            odd_player = pairing.odd_player
             
             if round_number == "R1" and len(players) > 3:
                 # For first round with more than 3 players: random player plays twice
@@ -1630,9 +3612,9 @@ class TournamentProgressionAlgorithm:
                     double_duty_player = random.choice(paired_players)
                     
                     # Create additional match
-                    match_id = f"{round_number}_COMM_{community_id}_match_{match_number}"
+                    match_id = f"{round_number}_COMM_{community_id}_match_{pairing.next_match_number}"
                     extra_match = self.create_comprehensive_match(
-                        match_id, tournament_id, round_number, community_id, match_number,
+                        match_id, tournament_id, round_number, community_id, pairing.next_match_number,
                         odd_player, double_duty_player, 'community'
                     )
                     
@@ -1641,10 +3623,10 @@ class TournamentProgressionAlgorithm:
                     extra_match['specialMatch'] = True
                     
                     matches.append(extra_match)
-                    print(f"         Extra Match {match_number}: {odd_player['name']} vs {double_duty_player['name']} (playing twice)")
+                    print(f"         Extra Match {pairing.next_match_number}: {odd_player['name']} vs {double_duty_player['name']} (playing twice)")
             else:
                 # For subsequent rounds or small groups: give bye
-                bye_match = self.create_bye_match(tournament_id, community_id, round_number, odd_player, match_number)
+                bye_match = self.create_bye_match(tournament_id, community_id, round_number, odd_player, pairing.next_match_number)
                 matches.append(bye_match)
                 print(f"         Bye Match: {odd_player['name']} gets automatic advancement (ID: {bye_match['id']})")
         
@@ -1653,13 +3635,13 @@ class TournamentProgressionAlgorithm:
     
     def create_comprehensive_match(self, match_id: str, tournament_id: str, round_number: str, 
                                  community_id: str, match_number: int, player1: Dict, player2: Dict, 
-                                 level: str) -> Dict:
+                                 level: str) -> MatchRecord:
         """Create match structure with required fields"""
         
         # Create searchable text for easy searching
         searchable_text = f"{player1['name']} {player2['name']} {tournament_id} {community_id} {level}"
         
-        return {
+        return MatchRecord({
             # Core match identification
             'id': match_id,
             'tournamentId': tournament_id,
@@ -1727,7 +3709,7 @@ class TournamentProgressionAlgorithm:
             'createdAt': datetime.now().isoformat(),
             'updatedAt': datetime.now().isoformat(),
             'createdBy': 'algorithm_system'
-        }
+        })
     
     def create_bye_match(self, tournament_id: str, community_id: str, 
                         round_number: str, bye_player: Dict, match_number: int) -> Dict:
@@ -2216,34 +4198,22 @@ class TournamentProgressionAlgorithm:
             print(f"   Matches count: {len(matches)}")
             print(f"   Bracket rounds: {list(bracket.get('rounds', {}).keys())}")
             
-            # Write bracket structure to tournament_brackets collection
-            print(f"🔄 Writing bracket to tournament_brackets/{tournament_id}...")
-            bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
-            bracket_ref.set(bracket)
-            print(f"✅ Bracket structure written successfully")
-            
-            # Write matches to tournaments/{tournament_id}/matches subcollection
-            print(f"🔄 Writing matches to tournaments/{tournament_id}/matches subcollection...")
-            matches_collection = self.db.collection('tournaments').document(tournament_id).collection('matches')
+            # Matches go to tournaments/{tournament_id}/matches; the bracket is committed last so it
+            # never references matches that failed to write
+            print(f"🔄 Writing {len(matches)} matches and bracket in batched commits...")
+            write_report = self.storage.write_matches(
+                tournament_id, [compact_match(match) for match in matches], bracket=bracket, label='initialization writes'
+            )
             
-            # Write each match as a separate document in the subcollection
-            for match in matches:
-                match_id = match['id']
-                match_ref = matches_collection.document(match_id)
-                match_ref.set(match)
-                print(f"   ✅ Written match: {match_id}")
-            
-            print(f"✅ All {len(matches)} matches written to subcollection successfully")
-            
-            # Verify the write was successful by reading back
-            print(f"🔍 Verifying tournament bracket was created...")
-            bracket_verification = bracket_ref.get()
-            if bracket_verification.exists:
-                print(f"✅ Tournament bracket verified in database")
-            else:
-                print(f"❌ Tournament bracket not found in database after write")
+            if not write_report['success']:
+                print(f"❌ Initialization write failed after {len(write_report['chunks'])} chunk(s)")
                 return False
             
+            print(f"✅ Bracket and {len(matches)} matches committed in {len(write_report['chunks'])} batch(es)")
+            get_request_context().bracket_rounds.pop(tournament_id, None)
+            self.remember_bracket_write(tournament_id, bracket=bracket)
+            self.record_rounds_in_summaries(tournament_id, matches, covers_all_rounds=True)
+            
             print(f"✅ Successfully written to Firebase:")
             print(f"   📊 Bracket structure: tournament_brackets/{tournament_id}")
             print(f"   🎯 {len(matches)} matches: tournaments/{tournament_id}/matches subcollection")
@@ -2270,18 +4240,27 @@ class TournamentProgressionAlgorithm:
         try:
             print(f"💾 Writing {round_number} data to Firebase for community {community_id}...")
             
-            # Write matches to tournaments/{tournament_id}/matches subcollection
-            matches_collection = self.db.collection('tournaments').document(tournament_id).collection('matches')
+            # Matches (tournaments/{tournament_id}/matches) and the bracket rounds entry are committed together
+            bracket_update = self.build_bracket_round_update(community_id, round_number,
+                                                             [match['id'] for match in matches], 'community')
+            bracket_update.update(self.build_progression_round_updates(tournament_id, community_id, matches))
+            to_write, match_fields, stored_matches, rewritten_ids = self.plan_match_writes(tournament_id, matches)
+            write_report = self.storage.write_matches(
+                tournament_id, to_write, bracket_updates=bracket_update, label=f'{round_number} writes',
+                match_fields=match_fields
+            )
             
-            # Write/update each match as a separate document in the subcollection
-            for match in matches:
-                match_id = match['id']
-                match_ref = matches_collection.document(match_id)
-                match_ref.set(match)
-                print(f"   ✅ Written/updated match: {match_id}")
+            if not write_report['success']:
+                print(f"❌ Failed to write {round_number} for community {community_id}")
+                return False
+            self.record_matches_in_snapshot(tournament_id, stored_matches)
+            self.remember_bracket_write(tournament_id, updates=bracket_update)
+            self.record_bracket_round(tournament_id, 'community', community_id, round_number,
+                                      [match['id'] for match in matches])
+            self.record_rounds_in_summaries(tournament_id, stored_matches, rewritten_ids=rewritten_ids)
             
-            # Update bracket structure properly organized by community
-            self.update_community_bracket_structure(tournament_id, community_id, round_number, matches, 'firebase', 'community')
+            # Initialize or update position holders for this community
+            self.update_community_position_holders(tournament_id, community_id, round_number, 'community')
             
             print(f"✅ Successfully written {len(matches)} {round_number} matches to tournaments/{tournament_id}/matches subcollection")
             return True
@@ -2290,32 +4269,6 @@ class TournamentProgressionAlgorithm:
             print(f"❌ Error writing community round to Firebase: {e}")
             return False
     
-    def write_community_round_to_json(self, tournament_id: str, community_id: str, round_number: str, matches: List[Dict]) -> bool:
-        """Write community round to JSON files for testing"""
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            # Write new matches
-            round_filename = f"community_round_{community_id}_{round_number}_{timestamp}.json"
-            with open(round_filename, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'tournamentId': tournament_id,
-                    'communityId': community_id,
-                    'roundNumber': round_number,
-                    'matches': matches,
-                    'createdAt': datetime.now().isoformat()
-                }, f, indent=2, ensure_ascii=False, default=str)
-            
-            # Update bracket structure in JSON file
-            self.update_community_bracket_structure(tournament_id, community_id, round_number, matches, 'json', 'community')
-            
-            print(f"💾 TESTING MODE - {round_number} data written to: {round_filename}")
-            return True
-            
-        except Exception as e:
-            print(f"❌ Error writing community round to JSON: {e}")
-            return False
-    
     # =================== BRACKET STRUCTURE MANAGEMENT ===================
     
     def organize_matches_in_bracket(self, bracket: Dict, matches: List[Dict]):
@@ -2461,8 +4414,6 @@ class TournamentProgressionAlgorithm:
             
             if mode == 'firebase':
                 self.update_bracket_firebase(tournament_id, community_id, round_number, match_ids, level)
-            elif mode == 'json':
-                self.update_bracket_json(tournament_id, community_id, round_number, match_ids, level)
             
         except Exception as e:
             print(f"❌ Error updating community bracket structure: {e}")
@@ -2471,14 +4422,8 @@ class TournamentProgressionAlgorithm:
                               round_number: str, match_ids: List[str], level: str = 'community'):
         """Update bracket structure in Firebase using rounds -> level -> geographical_id -> round -> [match_ids]"""
         try:
-            bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
-            
-            # Update using the new level hierarchy: level -> geographical_id -> round -> match_ids
-            update_path = f'rounds.{level}.{community_id}.{round_number}'
-            bracket_ref.update({
-                update_path: match_ids,
-                'lastUpdated': firestore.SERVER_TIMESTAMP
-            })
+            self.update_bracket_document(tournament_id, self.build_bracket_round_update(community_id, round_number, match_ids, level))
+            self.record_bracket_round(tournament_id, level, community_id, round_number, match_ids)
             
             # Initialize or update position holders for this community
             self.update_community_position_holders(tournament_id, community_id, round_number, level)
@@ -2488,201 +4433,201 @@ class TournamentProgressionAlgorithm:
         except Exception as e:
             print(f"❌ Error updating Firebase bracket: {e}")
     
-    def update_bracket_json(self, tournament_id: str, community_id: str, 
-                          round_number: str, match_ids: List[str], level: str = 'community'):
-        """Update bracket structure in JSON file using rounds -> level -> geographical_id -> round -> [match_ids]"""
-        try:
-            # Find the latest bracket file
-            bracket_files = [f for f in os.listdir('.') if f.startswith(f'tournament_brackets_{tournament_id}')]
-            if not bracket_files:
-                print(f"❌ No bracket file found for {tournament_id}")
-                return
-            
-            # Sort by modification time to get the latest
-            bracket_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            bracket_file = bracket_files[0]
-            
-            # Read current bracket
-            with open(bracket_file, 'r', encoding='utf-8') as f:
-                bracket_data = json.load(f)
-            
-            # Ensure rounds structure exists with level hierarchy
-            if 'rounds' not in bracket_data:
-                bracket_data['rounds'] = {
-                    'community': {},
-                    'county': {},
-                    'regional': {},
-                    'national': {}
-                }
-            
-            # Ensure level exists in rounds
-            if level not in bracket_data['rounds']:
-                bracket_data['rounds'][level] = {}
-            
-            # Ensure geographical unit exists in this level
-            if community_id not in bracket_data['rounds'][level]:
-                bracket_data['rounds'][level][community_id] = {}
-            
-            # Update round matches for this geographical unit using new hierarchy
-            bracket_data['rounds'][level][community_id][round_number] = match_ids
-            
-            # Update last modified timestamp
-            bracket_data['lastUpdated'] = datetime.now().isoformat()
-            
-            # Also update current round in bracket level for tracking
-            if level in bracket_data.get('bracketLevels', {}) and community_id in bracket_data['bracketLevels'][level]:
-                bracket_data['bracketLevels'][level][community_id]['currentRound'] = round_number
-            
-            # Write updated bracket
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            new_bracket_file = f"tournament_brackets_{tournament_id}_{timestamp}.json"
-            
-            with open(new_bracket_file, 'w', encoding='utf-8') as f:
-                json.dump(bracket_data, f, indent=2, ensure_ascii=False, default=str)
-            
-            print(f"✅ JSON bracket updated: rounds/{level}/{community_id}/{round_number} with {len(match_ids)} matches")
-            print(f"   New bracket file: {new_bracket_file}")
-            
-        except Exception as e:
-            print(f"❌ Error updating JSON bracket: {e}")
+    def build_bracket_round_update(self, community_id: str, round_number: str,
+                                  match_ids: List[str], level: str = 'community') -> Dict:
+        """Bracket update for one round using the level hierarchy: level -> geographical_id -> round -> match_ids"""
+        return {
+            f'rounds.{level}.{community_id}.{round_number}': match_ids,
+            'lastUpdated': firestore.SERVER_TIMESTAMP
+        }
+    
+    # =================== COMMUNITY PROGRESSION PLANS ===================
+    
+    def build_community_progression_plans(self, matches: List[Dict]) -> Dict:
+        """Progression plans (level -> community_id -> plan) sized from the players in each community's initial matches"""
+        players_by_community = {}
+        for match in matches:
+            community_id = match.get('communityId')
+            if not community_id:
+                continue
+            player_ids = players_by_community.setdefault(community_id, set())
+            for field in ('player1Id', 'player2Id', 'player_c_id'):
+                if match.get(field) and match[field] not in ('BYE', 'AUTO_POS1'):
+                    player_ids.add(match[field])
+        
+        plans = {community_id: build_community_progression_plan(community_id, len(player_ids))
+                 for community_id, player_ids in players_by_community.items()}
+        
+        # Matches completed at creation (byes, automatic positions) fill their slots straight away
+        for match in matches:
+            if match.get('communityId') in plans and match.get('status') == 'completed':
+                plans[match['communityId']]['results'][match['id']] = self.build_progression_result(match)
+        
+        print(f"📐 Precomputed progression plans for {len(plans)} communities")
+        return {'community': plans, 'county': {}, 'regional': {}, 'national': {}}
+    
+    def build_progression_result(self, match: Dict) -> Optional[Dict]:
+        """Winner and loser a completed match sends on to the slots that reference it (None until decided)"""
+        winner = self.get_match_winner_data(match) if match.get('status') == 'completed' else None
+        if not winner:
+            return None
+        return {'winner': winner, 'loser': self.get_match_loser_data(match)}
+    
+    def get_community_progression_plan(self, tournament_id: str, community_id: str) -> Optional[Dict]:
+        """The community's precomputed progression plan, or None for brackets created before plans existed"""
+        bracket = self.get_bracket_document(tournament_id) or {}
+        return ((bracket.get('progression') or {}).get('community') or {}).get(community_id)
+    
+    def get_community_generated_rounds(self, tournament_id: str, community_id: str) -> Dict[str, List[str]]:
+        """Rounds generated so far for a community (round -> match_ids)"""
+        return self.get_bracket_rounds(tournament_id).get('community', {}).get(community_id) or {}
+    
+    def resolve_progression_positions(self, plan: Dict) -> Dict[str, Dict]:
+        """Players holding each position whose source match has a recorded result"""
+        results = plan.get('results') or {}
+        positions = {}
+        for position, ref in (plan.get('positions') or {}).items():
+            outcome, _, match_id = ref.partition(':')
+            player = (results.get(match_id) or {}).get(outcome)
+            if player:
+                positions[position] = player
+        return positions
+    
+    def derive_progression_state(self, plan: Dict, generated_rounds: Dict[str, List[str]],
+                                 finalized_positions: Dict = None) -> str:
+        """Progression state the plan's results show for the generated rounds and the bracket's finalized positions"""
+        positions = plan.get('positions') or {}
+        decided_positions = self.resolve_progression_positions(plan)
+        if positions and len(decided_positions) == len(positions):
+            finalized = bool(finalized_positions) and all(
+                (finalized_positions.get(position) or {}).get('id') == player['id']
+                for position, player in decided_positions.items())
+            return (ProgressionState.FINALIZED if finalized else ProgressionState.POSITIONS_DECIDED).value
+        
+        results = plan.get('results') or {}
+        index = current_plan_stage_index(plan, generated_rounds)
+        decided = index is not None and all(results.get(match_id)
+                                            for match_id in plan_stage_match_ids(plan, plan['stages'][index]))
+        return (ProgressionState.STAGE_DECIDED if decided else ProgressionState.AWAITING_RESULTS).value
+    
+    def get_community_progression_state(self, tournament_id: str, community_id: str,
+                                        plan: Dict = None) -> Optional[str]:
+        """The community's progression state, derived from the bracket as it is now (None without a plan)"""
+        plan = plan or self.get_community_progression_plan(tournament_id, community_id)
+        if not plan:
+            return None
+        bracket = self.get_bracket_document(tournament_id) or {}
+        finalized_positions = ((bracket.get('positions') or {}).get('community') or {}).get(community_id)
+        return self.derive_progression_state(plan, self.get_community_generated_rounds(tournament_id, community_id),
+                                             finalized_positions)
+    
+    def build_progression_round_updates(self, tournament_id: str, community_id: str, matches: List[Dict]) -> Dict:
+        """Plan updates for a round write: results the matches already carry (byes) or clear on re-generation"""
+        plan = self.get_community_progression_plan(tournament_id, community_id)
+        if not plan:
+            return {}
+        
+        path = f'progression.community.{community_id}'
+        results = plan.setdefault('results', {})
+        updates = {}
+        for match in matches:
+            result = self.build_progression_result(match)
+            # A re-generated match clears any result recorded for its earlier version
+            if result or results.get(match['id']):
+                results[match['id']] = updates[f'{path}.results.{match["id"]}'] = result
+        return updates
+    
+    def fill_progression_slots(self, tournament_id: str, community_id: str, match_id: str,
+                               match: Dict) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Record a match result in the community's progression plan; returns the slots it fills and the state
+        the plan is in afterwards. Only the match's own results entry is written, so results recorded
+        concurrently for other matches of the stage never overwrite each other.
+        """
+        plan = self.get_community_progression_plan(tournament_id, community_id)
+        if not plan:
+            return [], None
+        
+        result = self.build_progression_result(match)
+        previous = plan.setdefault('results', {}).get(match_id)
+        plan['results'][match_id] = result
+        if result != previous:
+            self.update_bracket_document(tournament_id, {
+                f'progression.community.{community_id}.results.{match_id}': result,
+                'lastUpdated': firestore.SERVER_TIMESTAMP
+            })
+        state = self.get_community_progression_state(tournament_id, community_id, plan)
+        if not result:
+            return [], state
+        
+        filled_slots = []
+        # Elimination stages redraw from a whole round's winners, so only positioning slots name a match
+        for stage in plan.get('stages', []):
+            for target_match_id, refs in (stage.get('slots') or {}).items():
+                for slot_number, ref in enumerate(refs, 1):
+                    outcome, _, source_match_id = ref.partition(':')
+                    if source_match_id == match_id and result.get(outcome):
+                        filled_slots.append({
+                            'matchId': target_match_id,
+                            'slot': slot_number,
+                            'playerId': result[outcome]['id'],
+                            'playerName': result[outcome]['name']
+                        })
+        return filled_slots, state
+    
+    def get_decided_community_positions(self, tournament_id: str, community_id: str) -> Optional[Tuple[Dict, Dict]]:
+        """(plan, positions) once the community's progression state has every position decided, otherwise None"""
+        plan = self.get_community_progression_plan(tournament_id, community_id)
+        decided_states = (ProgressionState.POSITIONS_DECIDED.value, ProgressionState.FINALIZED.value)
+        if not plan or self.get_community_progression_state(tournament_id, community_id, plan) not in decided_states:
+            return None
+        return plan, self.resolve_progression_positions(plan)
+    
+    def get_planned_community_step(self, tournament_id: str, community_id: str) -> Optional[Tuple[str, str, List[Dict]]]:
+        """
+        Next step read straight from the community's progression plan: (current round, next round, winners).
+        Returns None - leaving detection to the match reads - unless the plan's state is stage_decided and
+        the plan covers every generated round.
+        """
+        plan = self.get_community_progression_plan(tournament_id, community_id)
+        if not plan or plan.get('flow') != 'next_round':
+            return None
+        if self.get_community_progression_state(tournament_id, community_id, plan) != ProgressionState.STAGE_DECIDED.value:
+            return None
+        
+        stages = plan.get('stages') or []
+        generated_rounds = self.get_community_generated_rounds(tournament_id, community_id)
+        current_index = current_plan_stage_index(plan, generated_rounds)
+        if current_index is None or current_index + 1 >= len(stages):
+            return None
+        if set(generated_rounds) - {stage['round'] for stage in stages[:current_index + 1]}:
+            return None
+        
+        stage, next_stage = stages[current_index], stages[current_index + 1]
+        results = plan.get('results') or {}
+        outcomes = [results.get(match_id) for match_id in plan_stage_match_ids(plan, stage)]
+        if not all(outcomes):
+            return None
+        
+        winners = [outcome['winner'] for outcome in outcomes]
+        if next_community_round(stage['round'], len(winners)) != next_stage['round']:
+            return None
+        return stage['round'], next_stage['round'], winners
     
     # =================== VALIDATION AND DATA RETRIEVAL METHODS ===================
     
     def validate_round_completion(self, tournament_id: str, entity_id: str, round_number: str, level: str) -> Dict:
         """Validate that all matches in a round are completed before generating next round"""
         try:
-            print(f"🔍 Validating {round_number} completion for {level} {entity_id}")
-            
-            # Check match completion from Firebase database
-            
-            # Get tournament matches
-            tournament_ref = self.db.collection('tournaments').document(tournament_id)
-            tournament_doc = tournament_ref.get()
-            
-            if not tournament_doc.exists:
-                return {
-                    'status': 'error',
-                    'message': f'Tournament {tournament_id} not found',
-                    'completed': False
-                }
-            
-            tournament_data = tournament_doc.to_dict()
-            tournament_matches = tournament_data.get('matches', {})
-            
-            # Filter matches for this round and level
-            matches = []
-            for match_id, match_data in tournament_matches.items():
-                if (match_data.get('tournamentId') == tournament_id and 
-                    match_data.get('roundNumber') == round_number and 
-                    match_data.get('tournamentLevel') == level):
-                    
-                    # Filter by entity based on level
-                    if level == 'community' and match_data.get('communityId') == entity_id:
-                        matches.append(match_data)
-                    elif level == 'county' and match_data.get('countyId') == entity_id:
-                        matches.append(match_data)
-                    elif level == 'regional' and match_data.get('regionId') == entity_id:
-                        matches.append(match_data)
-                    elif level == 'national':
-                        matches.append(match_data)
-            
-            incomplete_matches = []
-            total_matches = 0
-            
-            for match_data in matches:
-                total_matches += 1
-                
-                # Check if match has results and proper completion
-                if match_data.get('status') != 'completed':
-                    incomplete_matches.append(match_data.get('id'))
-                    continue
-                
-                # Determine winner based on points if not already set
-                if not match_data.get('winnerId'):
-                    winner_id = self.determine_match_winner(match_data)
-                    if not winner_id:
-                        incomplete_matches.append(match_data.get('id'))
-            
-            if incomplete_matches:
-                return {
-                    'success': False,
-                    'error': f'Previous round {round_number} not completed',
-                    'incompleteMatches': incomplete_matches,
-                    'totalMatches': total_matches,
-                    'completedMatches': total_matches - len(incomplete_matches)
-                }
-            
-            print(f"✅ All {total_matches} matches in {round_number} are completed")
-            return {'success': True, 'completedMatches': total_matches}
-            
-        except Exception as e:
-            print(f"❌ Error validating round completion: {e}")
-            return {'success': False, 'error': f'Validation error: {str(e)}'}
-    
-    def validate_round_completion_json(self, tournament_id: str, entity_id: str, round_number: str, level: str) -> Dict:
-        """Validate round completion for testing mode using JSON files"""
-        try:
-            print(f"🧪 TESTING MODE: Validating {round_number} completion for {level} {entity_id}")
-            
-            # Find the latest matches collection file
-            matches_files = [f for f in os.listdir('.') if f.startswith(f'matches_collection_{tournament_id}')]
-            if not matches_files:
-                print(f"❌ No matches collection file found for tournament {tournament_id}")
-                return {'success': False, 'error': f'No matches file found for tournament {tournament_id}'}
-            
-            # Sort by modification time to get the latest
-            matches_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            matches_file = matches_files[0]
-            
-            with open(matches_file, 'r', encoding='utf-8') as f:
-                matches_data = json.load(f)
-            
-            # Find matches for this round, level, and entity
-            round_matches = []
-            for match_id, match_data in matches_data.items():
-                if (match_data.get('tournamentId') == tournament_id and
-                    match_data.get('roundNumber') == round_number and
-                    match_data.get('tournamentLevel') == level):
-                    
-                    # Check level-specific entity match
-                    if level == 'community' and match_data.get('communityId') == entity_id:
-                        round_matches.append((match_id, match_data))
-                    elif level == 'county' and match_data.get('countyId') == entity_id:
-                        round_matches.append((match_id, match_data))
-                    elif level == 'regional' and match_data.get('regionId') == entity_id:
-                        round_matches.append((match_id, match_data))
-                    elif level == 'special' and match_data.get('specialTournament'):
-                        round_matches.append((match_id, match_data))
-            
-            if not round_matches:
-                print(f"⚠️ No matches found for {level} {entity_id} round {round_number}")
-                return {'success': False, 'error': f'No matches found for {level} {entity_id} round {round_number}'}
-            
-            # Check completion status
-            incomplete_matches = []
-            total_matches = len(round_matches)
-            
-            for match_id, match_data in round_matches:
-                status = match_data.get('status')
-                winner_id = match_data.get('winnerId')
-                
-                # Check if match is completed
-                if status != 'completed':
-                    incomplete_matches.append(match_id)
-                    print(f"   ❌ Incomplete: {match_id} (status: {status})")
-                    continue
-                
-                # Determine winner based on points if not already set
-                if not winner_id:
-                    determined_winner = self.determine_match_winner(match_data)
-                    if not determined_winner:
-                        incomplete_matches.append(match_id)
-                        print(f"   ❌ No winner determined: {match_id}")
-                else:
-                    print(f"   ✅ Complete: {match_id}")
+            print(f"🔍 Validating {round_number} completion for {level} {entity_id}")
+            
+            # A match counts once it is completed with a winner (ties block progression)
+            round_summary = self.get_round_completion(tournament_id, level, entity_id, round_number)
+            decided_matches = set(round_summary['completedMatchIds']) - set(round_summary['tiedMatchIds'])
+            incomplete_matches = [match_id for match_id in round_summary['matchIds'] if match_id not in decided_matches]
+            total_matches = round_summary['total']
             
             if incomplete_matches:
-                print(f"❌ Found {len(incomplete_matches)} incomplete matches in {round_number}")
                 return {
                     'success': False,
                     'error': f'Previous round {round_number} not completed',
@@ -2695,25 +4640,20 @@ class TournamentProgressionAlgorithm:
             return {'success': True, 'completedMatches': total_matches}
             
         except Exception as e:
-            print(f"❌ Error validating round completion from JSON: {e}")
-            return {'success': False, 'error': f'JSON validation error: {str(e)}'}
+            print(f"❌ Error validating round completion: {e}")
+            return {'success': False, 'error': f'Validation error: {str(e)}'}
     
     def get_community_round_winners(self, tournament_id: str, community_id: str, round_number: str) -> List[Dict]:
         """Get winners from specific community round using subcollection"""
         
         try:
-            # Get matches from tournaments/{tournament_id}/matches subcollection
-            matches_collection = self.db.collection('tournaments').document(tournament_id).collection('matches')
-            
-            # Query for matches in this community and round that are completed
-            matches_query = matches_collection.where('communityId', '==', community_id).where('roundNumber', '==', round_number).where('status', '==', 'completed')
-            matches_docs = matches_query.get()
+            # Completed matches in this community and round (snapshot when open, otherwise one query)
+            completed_matches = self.query_matches(tournament_id, entity_id=community_id,
+                                                   round_number=round_number, status='completed',
+                                                   profile='winner_extraction')
             
             winners = []
-            for doc in matches_docs:
-                match_data = doc.to_dict()
-                match_data['id'] = doc.id  # Ensure match has ID
-                
+            for match_data in completed_matches:
                 # Determine winner from points instead of winnerId
                 winner_data = self.get_match_winner_data(match_data)
                 
@@ -2730,30 +4670,17 @@ class TournamentProgressionAlgorithm:
     def get_community_round_losers(self, tournament_id: str, community_id: str, round_number: str) -> List[Dict]:
         """Get losers from specific community round"""
         try:
-            # Get tournament matches
-            tournament_ref = self.db.collection('tournaments').document(tournament_id)
-            tournament_doc = tournament_ref.get()
-            
-            if not tournament_doc.exists:
-                print(f"❌ Tournament {tournament_id} not found")
-                return []
-            
-            tournament_data = tournament_doc.to_dict()
-            tournament_matches = tournament_data.get('matches', {})
+            completed_matches = self.query_matches(tournament_id, entity_id=community_id,
+                                                   round_number=round_number, status='completed',
+                                                   profile='winner_extraction')
             
-            # Filter matches for this community and round
             losers = []
-            for match_id, match_data in tournament_matches.items():
-                if (match_data.get('tournamentId') == tournament_id and 
-                    match_data.get('communityId') == community_id and 
-                    match_data.get('roundNumber') == round_number and 
-                    match_data.get('status') == 'completed'):
-                    
-                    # Determine loser from points instead of loserId
-                    loser_data = self.get_match_loser_data(match_data)
-                    
-                    if loser_data:
-                        losers.append(loser_data)
+            for match_data in completed_matches:
+                # Determine loser from points instead of loserId
+                loser_data = self.get_match_loser_data(match_data)
+                
+                if loser_data:
+                    losers.append(loser_data)
             
             print(f"   Found {len(losers)} losers from {round_number} in community {community_id}")
             return losers
@@ -2762,6 +4689,188 @@ class TournamentProgressionAlgorithm:
             print(f"❌ Error getting community round losers: {e}")
             return []
     
+    # =================== ROUND COMPLETION SUMMARIES ===================
+    
+    def round_summary_id(self, level: str, entity_id: str) -> str:
+        return f"{level}.{entity_id or level}"
+    
+    def classify_match_result(self, match: Dict) -> Tuple[bool, Optional[str]]:
+        """(completed, winner_id) for a match; completed matches without a winner are ties"""
+        if match.get('status') != 'completed':
+            return False, None
+        return True, match.get('winnerId') or self.get_match_winner_id(match)
+    
+    def summarize_round_matches(self, matches: List[Dict]) -> Dict:
+        """Round summary entry for a round's matches"""
+        round_summary = {'matchIds': [], 'completedMatchIds': [], 'winnerIds': [], 'tiedMatchIds': []}
+        for match in matches:
+            round_summary['matchIds'].append(match['id'])
+            completed, winner_id = self.classify_match_result(match)
+            if completed:
+                round_summary['completedMatchIds'].append(match['id'])
+                if winner_id:
+                    round_summary['winnerIds'].append(winner_id)
+                else:
+                    round_summary['tiedMatchIds'].append(match['id'])
+        round_summary['total'] = len(round_summary['matchIds'])
+        return round_summary
+    
+    def get_round_summary(self, tournament_id: str, level: str, entity_id: str) -> Optional[Dict]:
+        """Round summary document for a level/entity, read once per request"""
+        summaries = get_request_context().round_summaries
+        key = (tournament_id, self.round_summary_id(level, entity_id))
+        if key not in summaries:
+            summaries[key] = self.storage.get_round_summary(tournament_id, key[1])
+        return summaries[key]
+    
+    def update_round_summaries(self, tournament_id: str, updates: List[Dict]):
+        """Write round summary updates and mirror them into the request's cached documents"""
+        try:
+            self.storage.update_round_summaries(tournament_id, updates)
+        except Exception as e:
+            # Summaries only speed up reads; completion checks fall back to the matches
+            print(f"⚠️ Could not update round summaries: {e}")
+            get_request_context().round_summaries.clear()
+            return
+        
+        summaries = get_request_context().round_summaries
+        for update in updates:
+            key = (tournament_id, update['summaryId'])
+            if key in summaries:
+                summaries[key] = apply_round_summary_update(summaries[key], update)
+    
+    def record_rounds_in_summaries(self, tournament_id: str, matches: List[Dict], covers_all_rounds: bool = False,
+                                   rewritten_ids: List[str] = None):
+        """
+        Add freshly written matches to their round summaries. Rounds containing rewritten_ids (stored
+        matches a re-write changed) are recounted instead, so results the re-write reset are taken back.
+        """
+        rewritten_ids = set(rewritten_ids or [])
+        rounds = {}
+        for match in matches:
+            level = match.get('tournamentLevel') or 'community'
+            entity_field = LEVEL_ENTITY_FIELDS.get(level)
+            entity_id = match.get(entity_field) if entity_field else level
+            rounds.setdefault((level, entity_id, match.get('roundNumber')), []).append(match)
+        
+        updates = []
+        for (level, entity_id, round_number), round_matches in rounds.items():
+            round_summary = self.summarize_round_matches(round_matches)
+            if rewritten_ids.intersection(round_summary['matchIds']):
+                self.replace_round_summary(tournament_id, level, entity_id, round_number, round_summary)
+                continue
+            update = {
+                'summaryId': self.round_summary_id(level, entity_id),
+                'level': level,
+                'entityId': entity_id,
+                'roundNumber': round_number,
+                'add': {field: round_summary[field] for field in ROUND_SUMMARY_FIELDS}
+            }
+            if covers_all_rounds:
+                update['coversAllRounds'] = True
+            updates.append(update)
+        if updates:
+            self.update_round_summaries(tournament_id, updates)
+    
+    def replace_round_summary(self, tournament_id: str, level: str, entity_id: str, round_number: str,
+                              written_summary: Dict = None) -> Dict:
+        """
+        Replace a round's summary entry with a recount, removing IDs that are no longer true (reset or
+        taken-back results, changed winners). written_summary counts matches just written; it is used
+        as is when it covers every match of the stored entry, otherwise the round's matches are queried.
+        """
+        summary = self.get_round_summary(tournament_id, level, entity_id)
+        current = (summary or {}).get('rounds', {}).get(round_number) or {}
+        replacement = written_summary
+        if replacement is None or not set(current.get('matchIds', [])) <= set(replacement['matchIds']):
+            replacement = self.summarize_round_matches(self.query_matches(
+                tournament_id, level=level, entity_id=entity_id, round_number=round_number, profile='completion_check'))
+        
+        remove = {field: [value for value in current.get(field, []) if value not in replacement[field]]
+                  for field in ROUND_SUMMARY_FIELDS}
+        add = {field: [value for value in replacement[field] if value not in current.get(field, [])]
+               for field in ROUND_SUMMARY_FIELDS}
+        base = {'summaryId': self.round_summary_id(level, entity_id), 'level': level,
+                'entityId': entity_id, 'roundNumber': round_number}
+        # Removals and additions are separate updates since one write takes one array transform per field
+        updates = [dict(base, remove={field: ids for field, ids in remove.items() if ids})] if any(remove.values()) else []
+        if any(add.values()):
+            updates.append(dict(base, add={field: ids for field, ids in add.items() if ids}))
+        if updates:
+            print(f"   ♻️ Recounted {round_number} summary for {level} {entity_id}")
+            self.update_round_summaries(tournament_id, updates)
+        return replacement
+    
+    def get_round_completion(self, tournament_id: str, level: str, entity_id: str, round_number: str) -> Dict:
+        """
+        Round summary entry (matchIds, completedMatchIds, winnerIds, tiedMatchIds, total) for one round.
+        The entity's summary document lists the round's matches, which are re-read (status and winner
+        projection) and recounted; the summary is corrected where a result was added, changed or taken back.
+        """
+        if level == 'community' and self.get_tournament_snapshot(tournament_id) is not None:
+            # The request already holds this community's matches
+            return self.summarize_round_matches(self.query_matches(
+                tournament_id, level=level, entity_id=entity_id, round_number=round_number, profile='completion_check'))
+        
+        summary_id = self.round_summary_id(level, entity_id)
+        summary = self.get_round_summary(tournament_id, level, entity_id)
+        round_summary = (summary or {}).get('rounds', {}).get(round_number)
+        
+        if round_summary is None:
+            # Round written before summaries existed - count it from the matches once and keep the result
+            matches = self.query_matches(tournament_id, level=level, entity_id=entity_id, round_number=round_number,
+                                         profile='completion_check')
+            round_summary = self.summarize_round_matches(matches)
+            if matches:
+                self.update_round_summaries(tournament_id, [{
+                    'summaryId': summary_id, 'level': level, 'entityId': entity_id, 'roundNumber': round_number,
+                    'add': {field: round_summary[field] for field in ROUND_SUMMARY_FIELDS}
+                }])
+            return round_summary
+        
+        # Results are also written (and disputed or taken back) straight to the match documents, so every
+        # match of the round is re-read: a counted result can have changed without record_match_result
+        match_ids = list(round_summary.get('matchIds', []))
+        recount = self.summarize_round_matches(self.get_matches_by_ids(tournament_id, match_ids, 'completion_check'))
+        recount['matchIds'] = match_ids
+        round_summary = self.replace_round_summary(tournament_id, level, entity_id, round_number, recount)
+        round_summary['total'] = len(round_summary['matchIds'])
+        return round_summary
+    
+    def record_match_result(self, tournament_id: str, match_id: str) -> Dict:
+        """Fold a newly recorded match result into its round summary"""
+        try:
+            matches = self.get_matches_by_ids(tournament_id, [match_id], 'winner_extraction')
+            if not matches:
+                return {'success': False, 'error': f'Match {match_id} not found'}
+            
+            match = matches[0]
+            level = match.get('tournamentLevel') or 'community'
+            entity_field = LEVEL_ENTITY_FIELDS.get(level)
+            entity_id = match.get(entity_field) if entity_field else level
+            round_summary = self.get_round_completion(tournament_id, level, entity_id, match.get('roundNumber'))
+            
+            # Fill the precomputed slots this result feeds and advance the community's progression state
+            filled_slots, progression_state = [], None
+            if level == 'community':
+                filled_slots, progression_state = self.fill_progression_slots(tournament_id, entity_id, match_id, match)
+            
+            return {
+                'success': True,
+                'level': level,
+                'entityId': entity_id,
+                'roundNumber': match.get('roundNumber'),
+                'totalMatches': round_summary['total'],
+                'completedMatches': len(round_summary['completedMatchIds']),
+                'ties': len(round_summary['tiedMatchIds']),
+                'winners': round_summary['winnerIds'],
+                'filledSlots': filled_slots,
+                'progressionState': progression_state
+            }
+        except Exception as e:
+            print(f"❌ Error recording match result: {e}")
+            return {'success': False, 'error': str(e)}
+    
     # =================== MISSING UTILITY METHODS ===================
     
     def get_tournament_configuration(self, tournament_id: str) -> Dict:
@@ -2769,11 +4878,9 @@ class TournamentProgressionAlgorithm:
         try:
             print(f"🔍 Getting tournament configuration for: {tournament_id}")
             
-            tournament_ref = self.db.collection('tournaments').document(tournament_id)
-            tournament_doc = tournament_ref.get()
+            config = self.get_tournament_document(tournament_id)
             
-            if tournament_doc.exists:
-                config = tournament_doc.to_dict()
+            if config is not None:
                 print(f"✅ Tournament found: {config.get('tournamentName', 'Unknown')}")
                 print(f"   Hierarchy Level: {config.get('hierarchicalLevel', 'community')}")
                 print(f"   Status: {config.get('status', 'unknown')}")
@@ -2798,29 +4905,11 @@ class TournamentProgressionAlgorithm:
             print("   🔍 Auto-detecting participant scope from registrations...")
             print("   🔐 NOTE: This is for configuration purposes only, does NOT determine tournament type")
             
-            # Get tournament document to access registeredPlayersIds
-            tournament_ref = self.db.collection('tournaments').document(tournament_id)
-            tournament_doc = tournament_ref.get()
-            
-            if not tournament_doc.exists:
+            registered_player_ids, profiles = self.load_registered_player_profiles(tournament_id)
+            if registered_player_ids is None:
                 print(f"❌ Tournament {tournament_id} not found")
                 return {}
             
-            tournament_data = tournament_doc.to_dict()
-            print(f"🔍 DEBUG: Tournament document keys: {list(tournament_data.keys())}")
-            print(f"🔍 DEBUG: Tournament document data: {tournament_data}")
-            
-            # First try the expected field name (with 's')
-            registered_player_ids = tournament_data.get('registeredPlayersIds', [])
-            print(f"🔍 DEBUG: Found {len(registered_player_ids)} player IDs in 'registeredPlayersIds': {registered_player_ids}")
-            
-            # Check for common alternative field name (without 's')
-            if not registered_player_ids:
-                registered_player_ids = tournament_data.get('registeredPlayerIds', [])
-                if registered_player_ids:
-                    print(f"🔧 FIELD NAME FIX: Using 'registeredPlayerIds' (without 's') - found {len(registered_player_ids)} players")
-                    print(f"🔍 DEBUG: Player IDs from 'registeredPlayerIds': {registered_player_ids}")
-            
             print(f"🔍 DEBUG: Final registered_player_ids to process: {registered_player_ids}")
             print(f"🔍 DEBUG: Number of players to process: {len(registered_player_ids)}")
             
@@ -2832,11 +4921,9 @@ class TournamentProgressionAlgorithm:
                 print(f"🔍 DEBUG: Processing player {i}/{len(registered_player_ids)}: {player_id}")
                 
                 # Get user's geographical data
-                user_ref = self.db.collection('users').document(player_id)
-                user_doc = user_ref.get()
+                user_data = profiles.get(player_id)
                 
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
+                if user_data is not None:
                     community_id = user_data.get('communityId')
                     print(f"   ✅ User document found, communityId: {community_id}")
                     
@@ -2884,18 +4971,50 @@ class TournamentProgressionAlgorithm:
                 'scopeType': 'error'
             }
     
+    def get_registered_player_ids(self, tournament_data: Dict) -> List[str]:
+        """Get registered player IDs from tournament data (try both field names)"""
+        registered_player_ids = tournament_data.get('registeredPlayersIds', [])
+        if not registered_player_ids:
+            registered_player_ids = tournament_data.get('registeredPlayerIds', [])
+            if registered_player_ids:
+                print(f"🔧 FIELD NAME FIX: Using 'registeredPlayerIds' (without 's') - found {len(registered_player_ids)} players")
+        return list(registered_player_ids or [])
+    
+    def load_registered_player_profiles(self, tournament_id: str) -> Tuple[Optional[List[str]], Dict[str, Dict]]:
+        """
+        Load user profiles for every registered player in chunked multi-document reads.
+        Returns (registered_player_ids, profiles_by_id); player IDs are None if the tournament is missing.
+        Reuses the load made at the start of initialize_tournament when one is in progress.
+        """
+        profile_loads = get_request_context().player_profile_loads
+        if tournament_id in profile_loads:
+            return profile_loads[tournament_id]
+        
+        tournament_data = self.get_tournament_document(tournament_id)
+        if tournament_data is None:
+            return None, {}
+        
+        registered_player_ids = self.get_registered_player_ids(tournament_data)
+        unique_player_ids = list(dict.fromkeys(registered_player_ids))
+        profiles = self.storage.get_users(unique_player_ids)
+        
+        missing = len(unique_player_ids) - len(profiles)
+        print(f"👥 Loaded {len(profiles)} player profiles in "
+              f"{math.ceil(len(unique_player_ids) / PLAYER_PROFILE_BATCH_SIZE)} batched reads"
+              f"{f' ({missing} missing)' if missing else ''}")
+        
+        return registered_player_ids, profiles
+    
     def get_geographical_context(self, community_id: str) -> Dict:
         """Get geographical context for community"""
         try:
             if community_id in ['N/A', 'UNKNOWN', 'ERROR']:
                 return {'countyId': 'N/A', 'regionId': 'N/A'}
             
-            # Try geographical_units first
-            geo_ref = self.db.collection('geographical_units').document(community_id)
-            geo_doc = geo_ref.get()
+            # Try geographical_units first (process-wide cache)
+            geo_data = self.geographical_cache.get(self.storage, community_id)
             
-            if geo_doc.exists:
-                geo_data = geo_doc.to_dict()
+            if geo_data is not None:
                 return {
                     'communityName': geo_data.get('communityName') or geo_data.get('name', 'Unknown'),
                     'countyId': geo_data.get('countyId', 'N/A'),
@@ -2921,21 +5040,11 @@ class TournamentProgressionAlgorithm:
         try:
             print(f"🔍 SIMPLIFIED: Getting ALL registered players and grouping by community...")
             
-            # Get tournament document
-            tournament_ref = self.db.collection('tournaments').document(tournament_id)
-            tournament_doc = tournament_ref.get()
-            
-            if not tournament_doc.exists:
+            registered_player_ids, profiles = self.load_registered_player_profiles(tournament_id)
+            if registered_player_ids is None:
                 print(f"❌ Tournament {tournament_id} not found")
                 return {}
             
-            tournament_data = tournament_doc.to_dict()
-            
-            # Get registered players (try both field names)
-            registered_player_ids = tournament_data.get('registeredPlayersIds', [])
-            if not registered_player_ids:
-                registered_player_ids = tournament_data.get('registeredPlayerIds', [])
-            
             print(f"   📊 Found {len(registered_player_ids)} registered players total")
             
             if not registered_player_ids:
@@ -2948,11 +5057,9 @@ class TournamentProgressionAlgorithm:
             for i, player_id in enumerate(registered_player_ids, 1):
                 print(f"   🔍 Processing player {i}/{len(registered_player_ids)}: {player_id}")
                 
-                user_ref = self.db.collection('users').document(player_id)
-                user_doc = user_ref.get()
+                user_data = profiles.get(player_id)
                 
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
+                if user_data is not None:
                     community_id = user_data.get('communityId', 'UNKNOWN_COMMUNITY')
                     
                     player_name = (user_data.get('playerName') or 
@@ -3123,74 +5230,24 @@ class TournamentProgressionAlgorithm:
         """Get next community round name based on current round and winner count"""
         print(f"   🎯 Determining next round: current={current_round}, winners={winners_count}")
         
-        # If already at final, return None (tournament complete - use finalize endpoint)
-        if current_round == 'Community_Final':
-            print(f"   🏁 Community_Final completed → Tournament finished, use finalize endpoint")
-            return None
-        
-        # Handle SF progression - need to determine if 3-player or 4-player scenario
-        if current_round == 'Community_SF':
-            # For now, determine by winner count since we can't pass tournament_id here
-            # Will be improved in the calling method to pass proper context
-            if winners_count == 1:
-                # 3-player scenario: SF (1 match) had 1 winner → Final
-                print(f"   ✅ 3-player Community_SF completed → Community_Final")
-                return 'Community_Final'
-            elif winners_count == 2:
-                # 4-player scenario: SF (2 matches) had 2 winners → WF
-                print(f"   ✅ 4-player Community_SF completed → Community_WF")
-                return 'Community_WF'
-            else:
-                print(f"   ⚠️ Unexpected winner count {winners_count} for Community_SF")
-                return 'Community_Final'
-        
-        if current_round == 'Community_WF':
-            # 4-player WF completed → Final
-            print(f"   ✅ Community_WF completed → Community_Final")
-            return 'Community_Final'
-        
-        # Smart logic: determine scenario based on winner count
-        if winners_count == 3:
-            print(f"   ✅ {winners_count} winners → Community_SF (3-player scenario)")
-            return 'Community_SF'
-        
-        if winners_count == 4:
-            print(f"   ✅ {winners_count} winners → Community_SF (4-player scenario)")
-            return 'Community_SF'
-        
-        # 2 or fewer winners: go directly to Community_Final (if needed)
-        if winners_count <= 2:
-            print(f"   ✅ {winners_count} winners → Community_Final")
-            return 'Community_Final'
-        
-        # Otherwise continue standard progression until we get to 3 or 4 winners
-        round_progression = {
-            'R1': 'R2',
-            'R2': 'R3', 
-            'R3': 'R4',
-            'R4': 'R5',
-            'R5': 'Community_Final'
-        }
+        if current_round == 'Community_SF' and winners_count not in (1, 2):
+            print(f"   ⚠️ Unexpected winner count {winners_count} for Community_SF")
         
-        next_round = round_progression.get(current_round, 'Community_Final')
-        print(f"   ✅ {winners_count} winners → {next_round}")
+        next_round = next_community_round(current_round, winners_count)
+        if next_round is None:
+            # Tournament complete - use finalize endpoint
+            print(f"   🏁 Community_Final completed → Tournament finished, use finalize endpoint")
+        else:
+            print(f"   ✅ {current_round} with {winners_count} winners → {next_round}")
         return next_round
     
     def get_next_community_round(self, current_round: str) -> Optional[str]:
         """Get next community round name"""
-        round_progression = {
-            'R1': 'R2',
-            'R2': 'R3',
-            'R3': 'R4',
-            'R4': 'R5',
-            'R5': 'Community_Final'
-        }
-        
         # If already at final, return None (tournament complete)
         if current_round == 'Community_Final':
             return None
         
-        return round_progression.get(current_round, 'Community_Final')
+        return round_descriptor(current_round).next or 'Community_Final'
     
     def get_winner_player_data(self, match_data: Dict, winner_id: str) -> Dict:
         """
@@ -3436,22 +5493,29 @@ class TournamentProgressionAlgorithm:
             
             return self.generate_community_round_matches(tournament_id, community_id, next_round, players)
     
-    def get_round_matches(self, tournament_id: str, community_id: str, round_number: str) -> List[Dict]:
+    def get_round_matches(self, tournament_id: str, community_id: str, round_number: str,
+                          profile: str = 'full') -> List[Dict]:
         """Get all matches for a specific round using subcollection"""
         
         try:
-            # Get matches from tournaments/{tournament_id}/matches subcollection
-            matches_collection = self.db.collection('tournaments').document(tournament_id).collection('matches')
-            
-            # Query for matches in this community and round
-            matches_query = matches_collection.where('communityId', '==', community_id).where('roundNumber', '==', round_number)
-            matches_docs = matches_query.get()
-            
-            matches = []
-            for doc in matches_docs:
-                match_data = doc.to_dict()
-                match_data['id'] = doc.id  # Ensure match has ID
-                matches.append(match_data)
+            snapshot = self.get_snapshot_entity(tournament_id, community_id)
+            if snapshot is not None:
+                matches = snapshot.round_matches(community_id, round_number)
+                print(f"   Found {len(matches)} matches for {community_id} round {round_number} (snapshot)")
+                return matches
+            
+            # Resolve deterministic match IDs from the bracket and fetch them directly
+            match_ids = self.get_bracket_round_match_ids(tournament_id, community_id, round_number)
+            if match_ids:
+                matches = [match for match in self.get_matches_by_ids(tournament_id, match_ids, profile)
+                           if match.get('communityId') == community_id and match.get('roundNumber') == round_number]
+                if matches:
+                    print(f"   Found {len(matches)} matches for {community_id} round {round_number} (bracket IDs)")
+                    return matches
+            
+            # Fall back to querying tournaments/{tournament_id}/matches subcollection
+            matches = self.query_matches(tournament_id, entity_id=community_id, round_number=round_number,
+                                         profile=profile)
             
             print(f"   Found {len(matches)} matches for {community_id} round {round_number}")
             return matches
@@ -3459,31 +5523,6 @@ class TournamentProgressionAlgorithm:
             print(f"❌ Error getting round matches: {e}")
             return []
     
-    def get_round_matches_from_json(self, tournament_id: str, community_id: str, round_number: str) -> List[Dict]:
-        """Get round matches from JSON files for testing"""
-        try:
-            matches_files = [f for f in os.listdir('.') if f.startswith(f'matches_collection_{tournament_id}')]
-            if not matches_files:
-                return []
-            
-            matches_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            matches_file = matches_files[0]
-            
-            with open(matches_file, 'r', encoding='utf-8') as f:
-                matches_data = json.load(f)
-            
-            round_matches = []
-            for match_id, match_data in matches_data.items():
-                if (match_data.get('tournamentId') == tournament_id and
-                    match_data.get('communityId') == community_id and
-                    match_data.get('roundNumber') == round_number):
-                    round_matches.append(match_data)
-            
-            return round_matches
-        except Exception as e:
-            print(f"❌ Error getting round matches from JSON: {e}")
-            return []
-    
     def complete_bracket_scenario_final(self, tournament_id: str, community_id: str, current_round: str) -> Dict:
         """
         Complete the final positioning for 2-match or 3-match bracket scenarios
@@ -3509,7 +5548,7 @@ class TournamentProgressionAlgorithm:
         print(f"🏆 Completing 2-match bracket final")
         
         # Get winners bracket match
-        base_round = current_round.replace("_WB", "").replace("_LB", "")
+        base_round = self.extract_base_round(current_round)
         wb_matches = self.get_matches_by_round_pattern(tournament_id, community_id, f"{base_round}_WB")
         lb_matches = self.get_matches_by_round_pattern(tournament_id, community_id, f"{base_round}_LB")
         
@@ -3560,7 +5599,7 @@ class TournamentProgressionAlgorithm:
         print(f"🏆 Completing 3-match bracket final")
         
         # Get the completed 3-way semi match
-        base_round = current_round.replace("_3WS", "")
+        base_round = self.extract_base_round(current_round)
         semi_matches = self.get_matches_by_round_pattern(tournament_id, community_id, f"{base_round}_3WS")
         
         if not semi_matches:
@@ -3615,27 +5654,16 @@ class TournamentProgressionAlgorithm:
     
     def get_previous_round(self, current_round: str) -> str:
         """Get the previous round name"""
-        if current_round == "R2":
-            return "R1"
-        elif current_round == "R3":
-            return "R2"
-        elif current_round == "R4":
-            return "R3"
-        elif current_round == "R5":
-            return "R4"
-        else:
-            return "R1"  # Default fallback
+        return round_descriptor(current_round).previous or "R1"  # Default fallback
+    
+    def is_community_elimination_round(self, round_name: str) -> bool:
+        """R1, R2, ... (not bracket, stage or other-level rounds)"""
+        descriptor = round_descriptor(round_name)
+        return descriptor.is_elimination and descriptor.level == 'community'
     
     def extract_base_round(self, round_name: str) -> str:
         """Extract base round from bracket suffixes (R2_WB -> R2, R3_3WS -> R3)"""
-        if '_WB' in round_name:
-            return round_name.replace('_WB', '')
-        elif '_LB' in round_name:
-            return round_name.replace('_LB', '')
-        elif '_3WS' in round_name:
-            return round_name.replace('_3WS', '')
-        else:
-            return round_name
+        return round_descriptor(round_name).base
     
     def finalize_tournament_positions(self, tournament_id: str, entity_id: str, level: str) -> Dict:
         """
@@ -3645,6 +5673,12 @@ class TournamentProgressionAlgorithm:
         print(f"🏁 Finalizing {level} tournament positions for {entity_id}")
         
         try:
+            # A community whose progression state has every position decided needs no match scan
+            if level == 'community':
+                decided = self.get_decided_community_positions(tournament_id, entity_id)
+                if decided:
+                    return self.finalize_planned_positions(tournament_id, entity_id, *decided)
+            
             # Get all final/positioning matches for this entity
             if level == 'community':
                 # For 4-player system, collect matches from all rounds
@@ -3953,6 +5987,33 @@ class TournamentProgressionAlgorithm:
             'message': '2-player positioning completed'
         }
     
+    def finalize_planned_positions(self, tournament_id: str, community_id: str, plan: Dict,
+                                   planned_positions: Dict[str, Dict]) -> Dict:
+        """Finalize positions read from the community's progression plan"""
+        scenario = plan.get('scenario', 'unknown')
+        state = self.get_community_progression_state(tournament_id, community_id, plan)
+        print(f"   Progression state {state}: {scenario} positions read from the plan")
+        
+        positions = {position: planned_positions.get(position) for position in ('1', '2', '3')}
+        update_success = self.update_bracket_with_community_winners(
+            tournament_id, community_id, [positions['1'], positions['2'], positions['3']]
+        )
+        
+        if not update_success:
+            print(f"❌ Failed to save positions to bracket, but returning calculated positions")
+        else:
+            print(f"✅ Successfully saved positions to tournament bracket")
+        
+        return {
+            'success': True,
+            'positions': positions,
+            'scenario': scenario,
+            'finalizedMatches': sum(len(plan_stage_match_ids(plan, stage)) for stage in plan.get('stages', [])
+                                    if stage.get('phase') == 'positioning'),
+            'message': f"{scenario.replace('_', '-')} positioning completed",
+            'bracketUpdated': update_success
+        }
+    
     def finalize_1_player_positions(self, tournament_id: str, entity_id: str, level: str, final_matches: List[Dict]) -> Dict:
         """Finalize 1-player positioning: automatic position 1"""
         final_match = final_matches[0]
@@ -4151,18 +6212,31 @@ class TournamentProgressionAlgorithm:
             'tournament_complete': False
         }
         
+        # A community whose progression state has every position decided reads them from its plan
+        if level == 'community':
+            decided = self.get_decided_community_positions(tournament_id, entity_id)
+            if decided:
+                planned_positions = decided[1]
+                for position in ('1', '2', '3'):
+                    positions[f'position_{position}'] = planned_positions.get(position)
+                positions['tournament_complete'] = True
+                return positions
+        
+        # Every candidate round is fetched once and resolved in memory
+        round_matches = self.load_position_round_matches(tournament_id, entity_id)
+        
         # Check different completion scenarios
         
         # 1. Check for 2-match bracket final positioning match completion
-        final_positioning_matches = self.get_round_matches(tournament_id, entity_id, "Community_Final_POSITIONING")
+        final_positioning_matches = round_matches.get("Community_Final_POSITIONING", [])
         if final_positioning_matches:
             final_match = final_positioning_matches[0]
             if final_match.get('status') == 'completed':
                 # Get bracket matches to determine positions
-                base_round = self.find_base_round_for_brackets(tournament_id, entity_id)
+                base_round = self.find_base_round_for_brackets(tournament_id, entity_id, round_matches)
                 if base_round:
-                    wb_matches = self.get_round_matches(tournament_id, entity_id, f"{base_round}_WB")
-                    lb_matches = self.get_round_matches(tournament_id, entity_id, f"{base_round}_LB")
+                    wb_matches = round_matches.get(f"{base_round}_WB", [])
+                    lb_matches = round_matches.get(f"{base_round}_LB", [])
                     
                     if wb_matches and lb_matches:
                         wb_match = wb_matches[0]
@@ -4185,14 +6259,14 @@ class TournamentProgressionAlgorithm:
                         return positions
         
         # 2. Check for 3-way final positioning match completion
-        three_way_final_matches = self.get_round_matches(tournament_id, entity_id, "Community_Final_3WAY_FINAL")
+        three_way_final_matches = round_matches.get("Community_Final_3WAY_FINAL", [])
         if three_way_final_matches:
             three_way_final = three_way_final_matches[0]
             if three_way_final.get('status') == 'completed':
                 # Get semi match to determine position 1
-                base_round = self.find_base_round_for_brackets(tournament_id, entity_id)
+                base_round = self.find_base_round_for_brackets(tournament_id, entity_id, round_matches)
                 if base_round:
-                    semi_matches = self.get_round_matches(tournament_id, entity_id, f"{base_round}_3WS")
+                    semi_matches = round_matches.get(f"{base_round}_3WS", [])
                     
                     if semi_matches:
                         semi_match = semi_matches[0]
@@ -4210,7 +6284,7 @@ class TournamentProgressionAlgorithm:
                         return positions
         
         # 3. Check for standard Community_Final completion
-        community_final_matches = self.get_round_matches(tournament_id, entity_id, "Community_Final")
+        community_final_matches = round_matches.get("Community_Final", [])
         if community_final_matches:
             completed_finals = [m for m in community_final_matches if m.get('status') == 'completed']
             if len(completed_finals) >= 1:
@@ -4219,10 +6293,10 @@ class TournamentProgressionAlgorithm:
                 pass
         
         # 4. Check for partial completion (position 1 determined but not final match)
-        base_round = self.find_base_round_for_brackets(tournament_id, entity_id)
+        base_round = self.find_base_round_for_brackets(tournament_id, entity_id, round_matches)
         if base_round:
-            wb_matches = self.get_round_matches(tournament_id, entity_id, f"{base_round}_WB")
-            semi_matches = self.get_round_matches(tournament_id, entity_id, f"{base_round}_3WS")
+            wb_matches = round_matches.get(f"{base_round}_WB", [])
+            semi_matches = round_matches.get(f"{base_round}_3WS", [])
             
             if wb_matches and wb_matches[0].get('status') == 'completed':
                 # Position 1 from winners bracket
@@ -4233,19 +6307,46 @@ class TournamentProgressionAlgorithm:
         
         return positions
     
-    def find_base_round_for_brackets(self, tournament_id: str, entity_id: str) -> str:
+    def find_base_round_for_brackets(self, tournament_id: str, entity_id: str,
+                                     round_matches: Dict[str, List[Dict]] = None) -> str:
         """Find the base round that has bracket matches"""
+        if round_matches is None:
+            round_matches = self.load_position_round_matches(tournament_id, entity_id)
+        
         # Check common rounds for bracket matches
-        for round_num in ['R2', 'R3', 'R4', 'R5']:
-            wb_matches = self.get_round_matches(tournament_id, entity_id, f"{round_num}_WB")
-            lb_matches = self.get_round_matches(tournament_id, entity_id, f"{round_num}_LB")  
-            semi_matches = self.get_round_matches(tournament_id, entity_id, f"{round_num}_3WS")
-            
-            if wb_matches or lb_matches or semi_matches:
+        for round_num in POSITION_BRACKET_BASE_ROUNDS:
+            if any(round_matches.get(f"{round_num}{suffix}") for suffix in POSITION_BRACKET_SUFFIXES):
                 return round_num
         
         return None
     
+    def load_position_round_matches(self, tournament_id: str, entity_id: str) -> Dict[str, List[Dict]]:
+        """
+        Fetch every round that can determine positions for an entity in one read
+        (from the open snapshot, or one roundNumber 'in' query) and group them by round
+        """
+        candidate_rounds = [f"{round_num}{suffix}" for round_num in POSITION_BRACKET_BASE_ROUNDS
+                            for suffix in POSITION_BRACKET_SUFFIXES] + POSITION_FINAL_ROUNDS
+        round_matches = {}
+        
+        try:
+            snapshot = self.get_snapshot_entity(tournament_id, entity_id)
+            if snapshot is not None:
+                for round_name in candidate_rounds:
+                    matches = snapshot.round_matches(entity_id, round_name)
+                    if matches:
+                        round_matches[round_name] = matches
+                return round_matches
+            
+            for match_data in self.query_matches(tournament_id, entity_id=entity_id, round_number=candidate_rounds):
+                round_matches.setdefault(match_data.get('roundNumber'), []).append(match_data)
+            
+            print(f"   Found position rounds for {entity_id}: {sorted(round_matches.keys())}")
+        except Exception as e:
+            print(f"❌ Error loading position round matches: {e}")
+        
+        return round_matches
+    
     def get_community_rounds_from_bracket(self, tournament_id: str, community_id: str) -> Dict:
         """Get all rounds that exist in the bracket for a specific community"""
         try:
@@ -4257,17 +6358,12 @@ class TournamentProgressionAlgorithm:
     def get_community_rounds_from_bracket_firebase(self, tournament_id: str, community_id: str) -> Dict:
         """Get community rounds from Firebase bracket using new level hierarchy"""
         try:
-            bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
-            bracket_doc = bracket_ref.get()
-            
-            if not bracket_doc.exists:
-                print(f"   No bracket document found for tournament {tournament_id}")
+            rounds_data = self.get_bracket_rounds(tournament_id)
+            if not rounds_data:
+                print(f"   No bracket rounds found for tournament {tournament_id}")
                 return {}
             
-            bracket_data = bracket_doc.to_dict()
-            
             # Navigate the new level hierarchy: rounds -> community -> community_id
-            rounds_data = bracket_data.get('rounds', {})
             community_level = rounds_data.get('community', {})
             community_rounds = community_level.get(community_id, {})
             
@@ -4278,50 +6374,18 @@ class TournamentProgressionAlgorithm:
             print(f"❌ Error getting community rounds from Firebase bracket: {e}")
             return {}
     
-    def get_community_rounds_from_bracket_json(self, tournament_id: str, community_id: str) -> Dict:
-        """Get community rounds from JSON bracket file using new level hierarchy"""
-        try:
-            # Find the latest bracket file
-            bracket_files = [f for f in os.listdir('.') if f.startswith(f'tournament_brackets_{tournament_id}')]
-            if not bracket_files:
-                print(f"   No bracket file found for {tournament_id}")
-                return {}
-            
-            bracket_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            bracket_file = bracket_files[0]
-            
-            with open(bracket_file, 'r', encoding='utf-8') as f:
-                bracket_data = json.load(f)
-            
-            # Navigate the new level hierarchy: rounds -> community -> community_id
-            rounds_data = bracket_data.get('rounds', {})
-            community_level = rounds_data.get('community', {})
-            community_rounds = community_level.get(community_id, {})
-            
-            print(f"   Found {len(community_rounds)} rounds in bracket for {community_id}")
-            return community_rounds
-            
-        except Exception as e:
-            print(f"❌ Error getting community rounds from JSON bracket: {e}")
-            return {}
-    
     def validate_round_fully_completed(self, tournament_id: str, community_id: str, round_name: str) -> bool:
         """Check if ALL matches in a specific round are completed (not just some)"""
         try:
-            # Get all matches in this round
-            round_matches = self.get_round_matches(tournament_id, community_id, round_name)
+            round_summary = self.get_round_completion(tournament_id, 'community', community_id, round_name)
             
-            if not round_matches:
+            if not round_summary['total']:
                 print(f"     No matches found for round {round_name}")
                 return False
             
             # Check that ALL matches are completed
-            total_matches = len(round_matches)
-            completed_matches = 0
-            
-            for match in round_matches:
-                if match.get('status') == 'completed':
-                    completed_matches += 1
+            total_matches = round_summary['total']
+            completed_matches = len(round_summary['completedMatchIds'])
             
             is_fully_complete = completed_matches == total_matches
             print(f"     Round {round_name}: {completed_matches}/{total_matches} matches completed")
@@ -4337,24 +6401,35 @@ class TournamentProgressionAlgorithm:
         try:
             print(f"   Fallback: Analyzing matches directly for {community_id}")
             
-            # Get all matches for this community
-            all_matches = self.get_all_community_matches_from_firebase(tournament_id, community_id)
+            rounds_completion = {}
+            summary = None
+            if self.get_tournament_snapshot(tournament_id) is None:
+                summary = self.get_round_summary(tournament_id, 'community', community_id)
+            
+            if summary and summary.get('coversAllRounds'):
+                # The community's summary tracks every round it has played
+                for round_name in summary.get('rounds', {}):
+                    round_summary = self.get_round_completion(tournament_id, 'community', community_id, round_name)
+                    rounds_completion[round_name] = {'total': round_summary['total'],
+                                                     'completed': len(round_summary['completedMatchIds'])}
+            else:
+                # Get all matches for this community
+                all_matches = self.get_all_community_matches_from_firebase(tournament_id, community_id)
+                
+                # Group matches by round and check completion
+                for match in all_matches:
+                    round_name = match.get('roundNumber', '')
+                    if round_name not in rounds_completion:
+                        rounds_completion[round_name] = {'total': 0, 'completed': 0}
+                    
+                    rounds_completion[round_name]['total'] += 1
+                    if match.get('status') == 'completed':
+                        rounds_completion[round_name]['completed'] += 1
             
-            if not all_matches:
+            if not rounds_completion:
                 print(f"   No matches found, using provided round: {provided_round}")
                 return provided_round
             
-            # Group matches by round and check completion
-            rounds_completion = {}
-            for match in all_matches:
-                round_name = match.get('roundNumber', '')
-                if round_name not in rounds_completion:
-                    rounds_completion[round_name] = {'total': 0, 'completed': 0}
-                
-                rounds_completion[round_name]['total'] += 1
-                if match.get('status') == 'completed':
-                    rounds_completion[round_name]['completed'] += 1
-            
             # Find highest fully completed round
             completed_rounds = []
             for round_name, stats in rounds_completion.items():
@@ -4366,9 +6441,9 @@ class TournamentProgressionAlgorithm:
             
             if completed_rounds:
                 # Return highest completed round
-                regular_completed = [r for r in completed_rounds if r.startswith('R') and '_' not in r]
+                regular_completed = [r for r in completed_rounds if self.is_community_elimination_round(r)]
                 if regular_completed:
-                    regular_completed.sort(key=lambda x: int(x[1:]) if x[1:].isdigit() else 0, reverse=True)
+                    regular_completed.sort(key=lambda x: round_descriptor(x).ordinal, reverse=True)
                     return regular_completed[0]
                 else:
                     return completed_rounds[0]
@@ -4398,41 +6473,32 @@ class TournamentProgressionAlgorithm:
             print(f"   Found rounds in bracket: {sorted(bracket_rounds.keys())}")
             
             # Check completion status - SPECIAL ROUNDS FIRST (SF, WF, Final), then regular rounds
-            regular_rounds = [r for r in bracket_rounds.keys() if r.startswith('R') and '_' not in r]
-            special_rounds = [r for r in bracket_rounds.keys() if not r.startswith('R') or '_' in r]
+            regular_rounds = [r for r in bracket_rounds.keys() if self.is_community_elimination_round(r)]
+            special_rounds = [r for r in bracket_rounds.keys() if not self.is_community_elimination_round(r)]
             
             # Sort special rounds by priority (Final > WF > SF)
-            special_round_priority = {
-                'Community_Final': 30, 'County_Final': 30, 'Regional_Final': 30, 'National_Final': 30, 'Special_Final': 30,
-                'Community_WF': 20, 'County_WF': 20, 'Regional_WF': 20, 'National_WF': 20, 'Special_WF': 20,
-                'Community_SF': 10, 'County_SF': 10, 'Regional_SF': 10, 'National_SF': 10, 'Special_SF': 10
-            }
-            special_rounds.sort(key=lambda x: special_round_priority.get(x, 0), reverse=True)
+            special_rounds.sort(key=lambda x: round_descriptor(x).priority, reverse=True)
             
             # Sort regular rounds by number (R1, R2, R3, etc.)
-            regular_rounds.sort(key=lambda x: int(x[1:]) if x[1:].isdigit() else 0, reverse=True)
-            
-            # Check special rounds FIRST (highest priority)
-            for round_name in special_rounds:
-                is_fully_complete = self.validate_round_fully_completed(tournament_id, community_id, round_name)
-                print(f"   Special Round {round_name}: {'FULLY COMPLETE' if is_fully_complete else 'INCOMPLETE'}")
-                
-                if is_fully_complete:
-                    print(f"   ✅ Found highest fully completed special round: {round_name}")
-                    return round_name
+            regular_rounds.sort(key=lambda x: round_descriptor(x).ordinal, reverse=True)
             
-            # Check regular rounds only if no special rounds are complete
-            for round_name in regular_rounds:
+            def round_fully_completed(round_name):
                 is_fully_complete = self.validate_round_fully_completed(tournament_id, community_id, round_name)
-                print(f"   Regular Round {round_name}: {'FULLY COMPLETE' if is_fully_complete else 'INCOMPLETE'}")
-                
-                if is_fully_complete:
-                    print(f"   ✅ Found highest fully completed regular round: {round_name}")
-                    return round_name
+                round_kind = 'Special' if round_name in special_rounds else 'Regular'
+                print(f"   {round_kind} Round {round_name}: {'FULLY COMPLETE' if is_fully_complete else 'INCOMPLETE'}")
+                return is_fully_complete
+            
+            # Special rounds FIRST (highest priority), regular rounds only if no special round is complete
+            completed_round = next((round_name for round_name in special_rounds + regular_rounds
+                                    if round_fully_completed(round_name)), None)
+            if completed_round:
+                round_kind = 'special' if completed_round in special_rounds else 'regular'
+                print(f"   ✅ Found highest fully completed {round_kind} round: {completed_round}")
+                return completed_round
             
             # If no rounds are fully complete, return the first round
             if regular_rounds:
-                first_round = sorted([r for r in regular_rounds], key=lambda x: int(x[1:]) if x[1:].isdigit() else 0)[0]
+                first_round = min(regular_rounds, key=lambda x: round_descriptor(x).ordinal)
                 print(f"   No fully completed rounds found, starting from: {first_round}")
                 return first_round
             
@@ -4447,16 +6513,11 @@ class TournamentProgressionAlgorithm:
     def get_all_community_matches_from_firebase(self, tournament_id: str, community_id: str) -> List[Dict]:
         """Get all matches for a community from Firebase subcollection"""
         try:
-            # Get matches from tournaments/{tournament_id}/matches subcollection
-            matches_collection = self.db.collection('tournaments').document(tournament_id).collection('matches')
-            matches_query = matches_collection.where('communityId', '==', community_id)
-            matches_docs = matches_query.get()
-            
-            matches = []
-            for doc in matches_docs:
-                match_data = doc.to_dict()
-                match_data['id'] = doc.id  # Ensure match has ID
-                matches.append(match_data)
+            snapshot = self.get_snapshot_entity(tournament_id, community_id)
+            if snapshot is not None:
+                matches = snapshot.entity_matches(community_id)
+            else:
+                matches = self.query_entity_matches(tournament_id, community_id)
             
             print(f"   Found {len(matches)} matches for community {community_id} in subcollection")
             return matches
@@ -4464,29 +6525,46 @@ class TournamentProgressionAlgorithm:
             print(f"❌ Error getting community matches from Firebase subcollection: {e}")
             return []
     
-    def get_all_community_matches_from_json(self, tournament_id: str, community_id: str) -> List[Dict]:
-        """Get all matches for a community from JSON files"""
-        try:
-            matches_files = [f for f in os.listdir('.') if f.startswith(f'matches_collection_{tournament_id}')]
-            if not matches_files:
-                return []
-            
-            matches_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            matches_file = matches_files[0]
-            
-            with open(matches_file, 'r', encoding='utf-8') as f:
-                matches_data = json.load(f)
-            
-            community_matches = []
-            for match_id, match_data in matches_data.items():
-                if (match_data.get('tournamentId') == tournament_id and
-                    match_data.get('communityId') == community_id):
-                    community_matches.append(match_data)
-            
-            return community_matches
-        except Exception as e:
-            print(f"❌ Error getting community matches from JSON: {e}")
-            return []
+    def query_entity_matches(self, tournament_id: str, community_id: str) -> List[Dict]:
+        """Query every match for a community from tournaments/{tournament_id}/matches"""
+        return self.query_matches(tournament_id, entity_id=community_id, use_snapshot=False)
+    
+    def query_matches(self, tournament_id: str, level: str = None, entity_id: str = None,
+                      round_number=None, status: str = None, profile: str = 'full',
+                      use_snapshot: bool = True) -> List[Dict]:
+        """
+        Filtered query over tournaments/{tournament_id}/matches.
+        level filters tournamentLevel and picks the entity field (communityId when level is None);
+        round_number may be a single round or a list of rounds ('in' query).
+        profile names a MATCH_FIELD_PROFILES projection applied with select().
+        Community reads are served from the request snapshot when one is open.
+        """
+        entity_field = LEVEL_ENTITY_FIELDS.get(level or 'community')
+        round_numbers = round_number if isinstance(round_number, (list, tuple)) else None
+        
+        if use_snapshot and entity_field == 'communityId' and entity_id:
+            snapshot = self.get_snapshot_entity(tournament_id, entity_id)
+            if snapshot is not None:
+                matches = snapshot.entity_matches(entity_id)
+                return [match for match in matches
+                        if (level is None or match.get('tournamentLevel') == level)
+                        and (round_number is None or (match.get('roundNumber') in round_numbers if round_numbers is not None
+                                                      else match.get('roundNumber') == round_number))
+                        and (status is None or match.get('status') == status)]
+        
+        filters = {}
+        if level:
+            filters['tournamentLevel'] = level
+        if entity_field and entity_id is not None:
+            filters[entity_field] = entity_id
+        if round_numbers is None and round_number is not None:
+            filters['roundNumber'] = round_number
+        if status:
+            filters['status'] = status
+        
+        fields = MATCH_FIELD_PROFILES[profile]
+        return [expand_match(match, fields)
+                for match in self.storage.query_matches(tournament_id, filters, round_numbers, fields)]
     
     def get_bracket_scenario_winners(self, tournament_id: str, community_id: str, base_round: str, scenario: str) -> List[Dict]:
         """
@@ -4569,8 +6647,6 @@ class TournamentProgressionAlgorithm:
     def update_position_holders_firebase(self, tournament_id: str, entity_id: str, round_number: str, level: str = 'community'):
         """Update position holders in Firebase for any level"""
         try:
-            bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
-            
             # Determine the correct path based on level
             if level == 'national':
                 positions_path = 'positions.national'
@@ -4578,11 +6654,10 @@ class TournamentProgressionAlgorithm:
                 positions_path = f'positions.{level}.{entity_id}'
             
             # Get current positions to avoid overwriting filled positions
-            current_bracket = bracket_ref.get()
+            bracket_data = self.get_bracket_document(tournament_id)
             current_positions = {}
             
-            if current_bracket.exists:
-                bracket_data = current_bracket.to_dict()
+            if bracket_data is not None:
                 if level == 'national':
                     current_positions = bracket_data.get('positions', {}).get('national', {})
                 else:
@@ -4604,7 +6679,7 @@ class TournamentProgressionAlgorithm:
             self.fill_positions_from_current_state(tournament_id, entity_id, position_structure, level)
             
             # Update Firebase
-            bracket_ref.update({
+            self.update_bracket_document(tournament_id, {
                 positions_path: position_structure,
                 'lastUpdated': firestore.SERVER_TIMESTAMP
             })
@@ -4614,69 +6689,22 @@ class TournamentProgressionAlgorithm:
         except Exception as e:
             print(f"❌ Error updating position holders in Firebase: {e}")
     
-    def update_position_holders_json(self, tournament_id: str, community_id: str, round_number: str):
-        """Update position holders in JSON files for testing"""
-        try:
-            # Find the latest bracket file
-            bracket_files = [f for f in os.listdir('.') if f.startswith(f'tournament_bracket_{tournament_id}')]
-            if not bracket_files:
-                print(f"❌ No bracket file found for tournament {tournament_id}")
-                return
-            
-            bracket_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            bracket_file = bracket_files[0]
-            
-            # Read current bracket
-            with open(bracket_file, 'r', encoding='utf-8') as f:
-                bracket_data = json.load(f)
-            
-            # Initialize positions structure
-            if 'positions' not in bracket_data:
-                bracket_data['positions'] = {}
-            
-            if community_id not in bracket_data['positions']:
-                bracket_data['positions'][community_id] = {}
-            
-            current_positions = bracket_data['positions'][community_id]
-            
-            position_structure = {
-                'position_1': current_positions.get('position_1', {'player': None, 'round_determined': None, 'status': 'pending'}),
-                'position_2': current_positions.get('position_2', {'player': None, 'round_determined': None, 'status': 'pending'}),
-                'position_3': current_positions.get('position_3', {'player': None, 'round_determined': None, 'status': 'pending'}),
-                'tournament_complete': current_positions.get('tournament_complete', False),
-                'last_round_played': round_number,
-                'eliminated_players': current_positions.get('eliminated_players', [])
-            }
-            
-            # Check if we can fill any positions based on current state
-            self.fill_positions_from_current_state(tournament_id, community_id, position_structure)
-            
-            # Update bracket data
-            bracket_data['positions'][community_id] = position_structure
-            bracket_data['lastUpdated'] = datetime.now().isoformat()
-            
-            # Write updated bracket
-            with open(bracket_file, 'w', encoding='utf-8') as f:
-                json.dump(bracket_data, f, indent=2, ensure_ascii=False)
-            
-            print(f"✅ Position holders updated in JSON for community {community_id}")
-            
-        except Exception as e:
-            print(f"❌ Error updating position holders in JSON: {e}")
-    
     def fill_positions_from_current_state(self, tournament_id: str, entity_id: str, position_structure: Dict, level: str = 'community'):
         """
         Fill position holders based on current tournament state
         """
         try:
+            # Every candidate round is fetched once and resolved in memory
+            round_matches = self.load_position_round_matches(tournament_id, entity_id)
+            
             # Handle special cases for small communities first
             if level == 'community':
-                self.handle_small_community_positions(tournament_id, entity_id, position_structure)
+                self.handle_small_community_positions(tournament_id, entity_id, position_structure, round_matches)
             
             # Check for winners bracket completion (position 1)
-            base_round = self.find_base_round_for_brackets(tournament_id, entity_id)
+            base_round = self.find_base_round_for_brackets(tournament_id, entity_id, round_matches)
             if base_round:
-                wb_matches = self.get_round_matches(tournament_id, entity_id, f"{base_round}_WB")
+                wb_matches = round_matches.get(f"{base_round}_WB", [])
                 if wb_matches and wb_matches[0].get('status') == 'completed':
                     winner = self.get_winner_player_data(wb_matches[0], wb_matches[0].get('winnerId'))
                     if position_structure['position_1']['player'] is None:
@@ -4688,7 +6716,7 @@ class TournamentProgressionAlgorithm:
                         print(f"   🏆 Position 1 determined: {winner['name']}")
             
             # Check for 4-player Winners Final completion (position 1)
-            wf_matches = self.get_round_matches(tournament_id, entity_id, "Community_WF")
+            wf_matches = round_matches.get("Community_WF", [])
             if wf_matches and wf_matches[0].get('status') == 'completed':
                 winner = self.get_winner_player_data(wf_matches[0], wf_matches[0].get('winnerId'))
                 if position_structure['position_1']['player'] is None:
@@ -4701,7 +6729,7 @@ class TournamentProgressionAlgorithm:
             
             # Check for 3-way semi completion (position 1)
             if base_round:
-                semi_matches = self.get_round_matches(tournament_id, entity_id, f"{base_round}_3WS")
+                semi_matches = round_matches.get(f"{base_round}_3WS", [])
                 if semi_matches and semi_matches[0].get('status') == 'completed':
                     winner = self.get_winner_player_data(semi_matches[0], semi_matches[0].get('winnerId'))
                     if position_structure['position_1']['player'] is None:
@@ -4713,7 +6741,7 @@ class TournamentProgressionAlgorithm:
                         print(f"   🏆 Position 1 determined: {winner['name']}")
             
             # Check for final positioning match completion (positions 2 & 3)
-            final_matches = self.get_round_matches(tournament_id, entity_id, "Community_Final_POSITIONING")
+            final_matches = round_matches.get("Community_Final_POSITIONING", [])
             if final_matches and final_matches[0].get('status') == 'completed':
                 final_match = final_matches[0]
                 winner = self.get_winner_player_data(final_match, final_match.get('winnerId'))
@@ -4737,7 +6765,7 @@ class TournamentProgressionAlgorithm:
                 
                 # Track eliminated player from losers bracket
                 if base_round:
-                    lb_matches = self.get_round_matches(tournament_id, entity_id, f"{base_round}_LB")
+                    lb_matches = round_matches.get(f"{base_round}_LB", [])
                     if lb_matches and lb_matches[0].get('status') == 'completed':
                         lb_match = lb_matches[0]
                         eliminated_player = self.get_winner_player_data(lb_match, lb_match.get('loserId'))
@@ -4746,7 +6774,7 @@ class TournamentProgressionAlgorithm:
                             print(f"   ❌ Player eliminated: {eliminated_player['name']}")
             
             # Check for 3-way final completion (positions 2 & 3)
-            three_way_final = self.get_round_matches(tournament_id, entity_id, "Community_Final_3WAY_FINAL")
+            three_way_final = round_matches.get("Community_Final_3WAY_FINAL", [])
             if three_way_final and three_way_final[0].get('status') == 'completed':
                 final_match = three_way_final[0]
                 winner = self.get_winner_player_data(final_match, final_match.get('winnerId'))
@@ -4800,13 +6828,17 @@ class TournamentProgressionAlgorithm:
         except Exception as e:
             print(f"❌ Error filling positions from current state: {e}")
     
-    def handle_small_community_positions(self, tournament_id: str, community_id: str, position_structure: Dict):
+    def handle_small_community_positions(self, tournament_id: str, community_id: str, position_structure: Dict,
+                                         round_matches: Dict[str, List[Dict]] = None):
         """
         Handle position filling for small communities (1, 2, or 3 players)
         """
         try:
+            if round_matches is None:
+                round_matches = self.load_position_round_matches(tournament_id, community_id)
+            
             # Check for single player automatic advancement
-            auto_matches = self.get_round_matches(tournament_id, community_id, "Community_Final")
+            auto_matches = round_matches.get("Community_Final", [])
             for match in auto_matches:
                 if (match.get('isAutoAdvancement') == True and 
                     match.get('status') == 'completed' and
@@ -4857,85 +6889,7 @@ class TournamentProgressionAlgorithm:
         except Exception as e:
             print(f"❌ Error handling small community positions: {e}")
     
-    # =================== TESTING MODE METHODS ===================
-    
-    def get_community_round_winners_from_json(self, tournament_id: str, community_id: str, round_number: str) -> List[Dict]:
-        """Get winners from JSON files for testing"""
-        try:
-            print(f"📁 TESTING MODE: Reading {round_number} winners for {community_id} from JSON files")
-            
-            # Find the latest matches collection file
-            matches_files = [f for f in os.listdir('.') if f.startswith(f'matches_collection_{tournament_id}')]
-            if not matches_files:
-                print(f"❌ No matches collection file found for tournament {tournament_id}")
-                return []
-            
-            # Sort by modification time to get the latest
-            matches_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            matches_file = matches_files[0]
-            
-            with open(matches_file, 'r', encoding='utf-8') as f:
-                matches_data = json.load(f)
-            
-            # Find completed matches for this round and community
-            winners = []
-            for match_id, match_data in matches_data.items():
-                if (match_data.get('tournamentId') == tournament_id and
-                    match_data.get('communityId') == community_id and
-                    match_data.get('roundNumber') == round_number and
-                    match_data.get('status') == 'completed'):
-                    
-                    # Determine winner from points instead of winnerId
-                    winner_data = self.get_match_winner_data(match_data)
-                    if winner_data:
-                        winners.append(winner_data)
-                        print(f"   Found winner: {winner_data['name']} from match {match_id}")
-            
-            print(f"   ✅ Found {len(winners)} winners from {round_number} in community {community_id}")
-            return winners
-            
-        except Exception as e:
-            print(f"❌ Error reading winners from JSON: {e}")
-            return []
-    
-    def get_community_round_losers_from_json(self, tournament_id: str, community_id: str, round_number: str) -> List[Dict]:
-        """Get losers from JSON files for testing"""
-        try:
-            print(f"📁 TESTING MODE: Reading {round_number} losers for {community_id} from JSON files")
-            
-            # Find the latest matches collection file
-            matches_files = [f for f in os.listdir('.') if f.startswith(f'matches_collection_{tournament_id}')]
-            if not matches_files:
-                print(f"❌ No matches collection file found for tournament {tournament_id}")
-                return []
-            
-            # Sort by modification time to get the latest
-            matches_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            matches_file = matches_files[0]
-            
-            with open(matches_file, 'r', encoding='utf-8') as f:
-                matches_data = json.load(f)
-            
-            # Find completed matches for this round and community
-            losers = []
-            for match_id, match_data in matches_data.items():
-                if (match_data.get('tournamentId') == tournament_id and
-                    match_data.get('communityId') == community_id and
-                    match_data.get('roundNumber') == round_number and
-                    match_data.get('status') == 'completed'):
-                    
-                    # Determine loser from points instead of loserId
-                    loser_data = self.get_match_loser_data(match_data)
-                    if loser_data:
-                        losers.append(loser_data)
-                        print(f"   Found loser: {loser_data['name']} from match {match_id}")
-            
-            print(f"   ✅ Found {len(losers)} losers from {round_number} in community {community_id}")
-            return losers
-            
-        except Exception as e:
-            print(f"❌ Error reading losers from JSON: {e}")
-            return []
+    # =================== COMMUNITY FINALIZATION ===================
     
     def finalize_community_winners(self, tournament_id: str, community_id: str) -> Dict:
         """
@@ -4946,45 +6900,54 @@ class TournamentProgressionAlgorithm:
             print(f"🏁 Finalizing winners for community {community_id}")
             print(f"🔍 POSITION LOGGING: Starting finalization process for tournament {tournament_id}, community {community_id}")
             
-            # Get all Community_Final matches
-            final_matches = self.get_community_final_matches(tournament_id, community_id)
-            
-            # Log the number of matches found
-            print(f"🔍 POSITION LOGGING: Found {len(final_matches)} Community_Final matches")
-            
-            if not final_matches:
-                print(f"🔍 POSITION LOGGING: No Community_Final matches found for community {community_id}")
-                return {'success': False, 'error': 'No Community_Final matches found'}
-            
-            # Determine player count scenario based on number of matches
-            player_count = 0
-            if len(final_matches) == 1:
-                player_count = 2  # Single match = 2 players
-            elif len(final_matches) == 2:
-                player_count = 3  # Two matches = 3 players
-            elif len(final_matches) >= 3 and len(final_matches) <= 5:
-                player_count = 4  # 3-5 matches = 4 players
+            # The community's progression state says directly whether every position is decided
+            decided = self.get_decided_community_positions(tournament_id, community_id)
+            if decided:
+                plan, planned_positions = decided
+                player_count = plan.get('playersCount')
+                positions = [planned_positions[position] for position in ('1', '2', '3') if position in planned_positions]
+                state = self.get_community_progression_state(tournament_id, community_id, plan)
+                print(f"🔍 POSITION LOGGING: Progression state {state} - {len(positions)} positions read from the plan")
             else:
-                player_count = "many"  # More than 5 matches = many players
-            
-            print(f"🔍 POSITION LOGGING: Detected {player_count}-player community scenario based on {len(final_matches)} matches")
-            
-            # Check if all positioning matches are complete
-            incomplete_matches = [m for m in final_matches if m.get('status') != 'completed']
-            if incomplete_matches:
-                print(f"🔍 POSITION LOGGING: Found {len(incomplete_matches)} incomplete matches: {[m['id'] for m in incomplete_matches]}")
-                return {
-                    'success': False,
-                    'error': f'{len(incomplete_matches)} positioning matches still incomplete',
-                    'incompleteMatches': [m['id'] for m in incomplete_matches]
-                }
-            
-            print(f"🔍 POSITION LOGGING: All {len(final_matches)} matches are complete, proceeding to determine positions")
-            
-            # Determine final positions based on match results
-            positions = self.determine_final_positions(final_matches)
-            
-            print(f"🔍 POSITION LOGGING: Determined {len(positions)} positions from match results")
+                # Get all Community_Final matches
+                final_matches = self.get_community_final_matches(tournament_id, community_id)
+                
+                # Log the number of matches found
+                print(f"🔍 POSITION LOGGING: Found {len(final_matches)} Community_Final matches")
+                
+                if not final_matches:
+                    print(f"🔍 POSITION LOGGING: No Community_Final matches found for community {community_id}")
+                    return {'success': False, 'error': 'No Community_Final matches found'}
+                
+                # Determine player count scenario based on number of matches
+                player_count = 0
+                if len(final_matches) == 1:
+                    player_count = 2  # Single match = 2 players
+                elif len(final_matches) == 2:
+                    player_count = 3  # Two matches = 3 players
+                elif len(final_matches) >= 3 and len(final_matches) <= 5:
+                    player_count = 4  # 3-5 matches = 4 players
+                else:
+                    player_count = "many"  # More than 5 matches = many players
+                
+                print(f"🔍 POSITION LOGGING: Detected {player_count}-player community scenario based on {len(final_matches)} matches")
+                
+                # Check if all positioning matches are complete
+                incomplete_matches = [m for m in final_matches if m.get('status') != 'completed']
+                if incomplete_matches:
+                    print(f"🔍 POSITION LOGGING: Found {len(incomplete_matches)} incomplete matches: {[m['id'] for m in incomplete_matches]}")
+                    return {
+                        'success': False,
+                        'error': f'{len(incomplete_matches)} positioning matches still incomplete',
+                        'incompleteMatches': [m['id'] for m in incomplete_matches]
+                    }
+                
+                print(f"🔍 POSITION LOGGING: All {len(final_matches)} matches are complete, proceeding to determine positions")
+                
+                # Determine final positions based on match results
+                positions = self.determine_final_positions(final_matches)
+                
+                print(f"🔍 POSITION LOGGING: Determined {len(positions)} positions from match results")
             
             if not positions:
                 print(f"🔍 POSITION LOGGING: No positions determined from matches")
@@ -5040,79 +7003,23 @@ class TournamentProgressionAlgorithm:
         try:
             print(f"🔍 POSITION LOGGING: Retrieving Community_Final matches for tournament {tournament_id}, community {community_id}")
             
-            if self.testing_mode:
-                print(f"🔍 POSITION LOGGING: Using testing mode - retrieving matches from JSON files")
-                matches_files = [f for f in os.listdir('.') if f.startswith(f'matches_collection_{tournament_id}')]
-                
-                if not matches_files:
-                    print(f"🔍 POSITION LOGGING: No matches files found for tournament {tournament_id}")
-                    return []
-                
-                matches_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                matches_file = matches_files[0]
-                print(f"🔍 POSITION LOGGING: Using most recent matches file: {matches_file}")
-                
-                with open(matches_file, 'r', encoding='utf-8') as f:
-                    matches_data = json.load(f)
-                
-                print(f"🔍 POSITION LOGGING: Loaded {len(matches_data)} total matches from file")
-                
-                final_matches = []
-                for match_id, match_data in matches_data.items():
-                    if (match_data.get('tournamentId') == tournament_id and
-                        match_data.get('communityId') == community_id and
-                        match_data.get('roundNumber') == 'Community_Final'):
-                        final_matches.append(match_data)
-                        print(f"🔍 POSITION LOGGING: Found Community_Final match: ID={match_id}, Type={match_data.get('matchType')}, Status={match_data.get('status')}")
-                
-                print(f"🔍 POSITION LOGGING: Found {len(final_matches)} Community_Final matches in JSON file")
-                
-                # Log match types for debugging
-                match_types = {}
-                for match in final_matches:
-                    match_type = match.get('matchType', 'unknown')
-                    if match_type not in match_types:
-                        match_types[match_type] = 0
-                    match_types[match_type] += 1
-                
-                print(f"🔍 POSITION LOGGING: Match types found: {match_types}")
-                
-                return final_matches
-            else:
-                # Firebase implementation
-                print(f"🔍 POSITION LOGGING: Using Firestore - querying tournament matches")
-                tournament_ref = self.db.collection('tournaments').document(tournament_id)
-                tournament_doc = tournament_ref.get()
+            print(f"🔍 POSITION LOGGING: Using Firestore - querying Community_Final matches")
+            final_matches = self.query_matches(tournament_id, entity_id=community_id, round_number='Community_Final')
                 
-                if not tournament_doc.exists:
-                    print(f"❌ Tournament {tournament_id} not found")
-                    return []
-                
-                tournament_data = tournament_doc.to_dict()
-                tournament_matches = tournament_data.get('matches', {})
-                
-                print(f"🔍 POSITION LOGGING: Filtering Community_Final matches from tournament matches")
-                final_matches = []
-                for match_id, match_data in tournament_matches.items():
-                    if (match_data.get('tournamentId') == tournament_id and
-                        match_data.get('communityId') == community_id and
-                        match_data.get('roundNumber') == 'Community_Final'):
-                        final_matches.append(match_data)
-                
-                print(f"🔍 POSITION LOGGING: Found {len(final_matches)} Community_Final matches in tournament")
+            print(f"🔍 POSITION LOGGING: Found {len(final_matches)} Community_Final matches in tournament")
                 
-                # Log match types for debugging
-                match_types = {}
-                for match in final_matches:
-                    match_type = match.get('matchType', 'unknown')
-                    if match_type not in match_types:
-                        match_types[match_type] = 0
-                    match_types[match_type] += 1
-                    print(f"🔍 POSITION LOGGING: Found Community_Final match: ID={match.get('id')}, Type={match.get('matchType')}, Status={match.get('status')}")
+            # Log match types for debugging
+            match_types = {}
+            for match in final_matches:
+                match_type = match.get('matchType', 'unknown')
+                if match_type not in match_types:
+                    match_types[match_type] = 0
+                match_types[match_type] += 1
+                print(f"🔍 POSITION LOGGING: Found Community_Final match: ID={match.get('id')}, Type={match.get('matchType')}, Status={match.get('status')}")
                 
-                print(f"🔍 POSITION LOGGING: Match types found: {match_types}")
+            print(f"🔍 POSITION LOGGING: Match types found: {match_types}")
                 
-                return final_matches
+            return final_matches
                 
         except Exception as e:
             print(f"❌ Error getting community final matches: {e}")
@@ -5333,16 +7240,14 @@ class TournamentProgressionAlgorithm:
             print(f"🔍 POSITION LOGGING: position 3 included: {'3' in positions_data}")
             
             # Perform the update
-            bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
             try:
-                bracket_ref.update(update_data)
+                self.update_bracket_document(tournament_id, update_data)
                 print(f"🔍 POSITION LOGGING: Firestore update operation completed successfully")
                 
                 # Verify the update by reading back the data
                 try:
-                    bracket_doc = bracket_ref.get()
-                    if bracket_doc.exists:
-                        bracket_data = bracket_doc.to_dict()
+                    bracket_data = self.get_bracket_document(tournament_id)
+                    if bracket_data is not None:
                         positions_read_back = bracket_data.get('positions', {}).get('community', {}).get(community_id, {})
                         print(f"🔍 POSITION LOGGING: Verification - Read back data from Firestore:")
                         print(f"🔍 POSITION LOGGING: position 1 exists: {positions_read_back.get('1') is not None}")
@@ -5368,60 +7273,26 @@ class TournamentProgressionAlgorithm:
         try:
             print(f"🏛️ Organizing community winners by county")
             
-            if self.testing_mode:
-                bracket_files = [f for f in os.listdir('.') if f.startswith(f'tournament_brackets_{tournament_id}')]
-                if not bracket_files:
-                    return {}
+            bracket_data = self.get_bracket_document(tournament_id)
                 
-                bracket_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                bracket_file = bracket_files[0]
-                
-                with open(bracket_file, 'r', encoding='utf-8') as f:
-                    bracket_data = json.load(f)
-                
-                county_players = {}
-                community_winners = bracket_data.get('winners', {}).get('community', {})
-                
-                for community_id, positions in community_winners.items():
-                    # Get all three positions from each community
-                    for position, player in positions.items():
-                        if player and position.startswith('position'):
-                            county_id = player.get('countyId')
-                            if county_id:
-                                if county_id not in county_players:
-                                    county_players[county_id] = []
-                                
-                                # Add position info to player
-                                player_with_position = player.copy()
-                                player_with_position['communityPosition'] = int(position[-1])
-                                county_players[county_id].append(player_with_position)
-                
-                return county_players
-                
-            else:
-                # Firebase implementation
-                bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
-                bracket_doc = bracket_ref.get()
-                
-                if not bracket_doc.exists:
-                    return {}
+            if bracket_data is None:
+                return {}
                 
-                bracket_data = bracket_doc.to_dict()
-                county_players = {}
+            county_players = {}
                 
-                community_winners = bracket_data.get('winners', {}).get('community', {})
-                for community_id, positions in community_winners.items():
-                    for position, player in positions.items():
-                        if player and position.startswith('position'):
-                            county_id = player.get('countyId')
-                            if county_id:
-                                if county_id not in county_players:
-                                    county_players[county_id] = []
-                                player_with_position = player.copy()
-                                player_with_position['communityPosition'] = int(position[-1])
-                                county_players[county_id].append(player_with_position)
+            community_winners = bracket_data.get('winners', {}).get('community', {})
+            for community_id, positions in community_winners.items():
+                for position, player in positions.items():
+                    if player and position.startswith('position'):
+                        county_id = player.get('countyId')
+                        if county_id:
+                            if county_id not in county_players:
+                                county_players[county_id] = []
+                            player_with_position = player.copy()
+                            player_with_position['communityPosition'] = int(position[-1])
+                            county_players[county_id].append(player_with_position)
                 
-                return county_players
+            return county_players
                 
         except Exception as e:
             print(f"❌ Error getting county data: {e}")
@@ -5460,9 +7331,11 @@ class TournamentProgressionAlgorithm:
                 
                 all_matches.extend(county_matches)
                 counties_initialized.append(county_id)
-                
-                # Update bracket with county initialization
-                self.update_bracket_county_status(tournament_id, county_id, 'active', len(players))
+            
+            # Update bracket with every county's initialization in one write
+            self.update_bracket_county_status(
+                tournament_id, {county_id: len(players) for county_id, players in county_players.items()}, 'active'
+            )
             
             # Write matches to collection
             write_success = self.write_level_matches(tournament_id, all_matches, 'county')
@@ -5565,17 +7438,11 @@ class TournamentProgressionAlgorithm:
             position_groups[pos].append(player)
         
         # First pair position 1s, then 2s, then 3s
-        available_players = []
-        for pos in [1, 2, 3]:
-            available_players.extend(position_groups[pos])
+        pairing = PlayerPairing([player for pos in [1, 2, 3] for player in position_groups[pos]], shuffle=False)
         
-        match_number = 1
         round_number = "County_R1"
         
-        while len(available_players) >= 2:
-            player1 = available_players.pop(0)
-            player2 = available_players.pop(0)
-            
+        for match_number, player1, player2 in pairing.pairs():
             match_id = f"{round_number}_COUNTY_{county_id}_match_{match_number}"
             
             match = self.create_comprehensive_match(
@@ -5589,12 +7456,11 @@ class TournamentProgressionAlgorithm:
             
             matches.append(match)
             print(f"         Match {match_number}: {player1['name']} (pos {player1.get('communityPosition', 0)}) vs {player2['name']} (pos {player2.get('communityPosition', 0)})")
-            match_number += 1
         
         # Handle odd player with bye
-        if available_players:
-            bye_player = available_players[0]
-            bye_match = self.create_county_bye_match(tournament_id, county_id, round_number, bye_player, match_number)
+        if pairing.odd_player is not None:
+            bye_player = pairing.odd_player
+            bye_match = self.create_county_bye_match(tournament_id, county_id, round_number, bye_player, pairing.next_match_number)
             matches.append(bye_match)
             print(f"         Bye Match: {bye_player['name']} (pos {bye_player.get('communityPosition', 0)}) gets automatic advancement")
         
@@ -5604,14 +7470,9 @@ class TournamentProgressionAlgorithm:
                                     round_number: str, players: List[Dict]) -> List[Dict]:
         """Generate matches for county round"""
         matches = []
-        available_players = players.copy()
-        random.shuffle(available_players)
+        pairing = PlayerPairing(players)
         
-        match_number = 1
-        while len(available_players) >= 2:
-            player1 = available_players.pop(0)
-            player2 = available_players.pop(0)
-            
+        for match_number, player1, player2 in pairing.pairs():
             match_id = f"{round_number}_COUNTY_{county_id}_match_{match_number}"
             
             match = self.create_comprehensive_match(
@@ -5621,12 +7482,11 @@ class TournamentProgressionAlgorithm:
             
             match['countyId'] = county_id
             matches.append(match)
-            match_number += 1
         
         # Handle odd player
-        if available_players:
-            bye_player = available_players[0]
-            bye_match = self.create_county_bye_match(tournament_id, county_id, round_number, bye_player, match_number)
+        if pairing.odd_player is not None:
+            bye_player = pairing.odd_player
+            bye_match = self.create_county_bye_match(tournament_id, county_id, round_number, bye_player, pairing.next_match_number)
             matches.append(bye_match)
         
         return matches
@@ -5795,50 +7655,22 @@ class TournamentProgressionAlgorithm:
         
         return bye_match
     
-    def update_bracket_county_status(self, tournament_id: str, county_id: str, 
-                                   status: str, player_count: int) -> bool:
-        """Update county status in bracket"""
+    def update_bracket_county_status(self, tournament_id: str, player_counts: Dict[str, int],
+                                   status: str) -> bool:
+        """Update the status of counties (county_id -> player count) in the bracket with one write"""
+        if not player_counts:
+            return True
         try:
-            if self.testing_mode:
-                bracket_files = [f for f in os.listdir('.') if f.startswith(f'tournament_brackets_{tournament_id}')]
-                if not bracket_files:
-                    return False
-                
-                bracket_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                bracket_file = bracket_files[0]
-                
-                with open(bracket_file, 'r', encoding='utf-8') as f:
-                    bracket_data = json.load(f)
-                
-                if county_id not in bracket_data['bracketLevels']['county']:
-                    bracket_data['bracketLevels']['county'][county_id] = {}
-                
-                bracket_data['bracketLevels']['county'][county_id].update({
+            self.update_bracket_document(tournament_id, {
+                f'bracketLevels.county.{county_id}': {
                     'status': status,
                     'playerCount': player_count,
                     'currentRound': 'County_R1',
-                    'lastUpdated': datetime.now().isoformat()
-                })
-                
-                # Save updated bracket
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                new_bracket_file = f'tournament_brackets_{tournament_id}_{timestamp}.json'
-                with open(new_bracket_file, 'w', encoding='utf-8') as f:
-                    json.dump(bracket_data, f, indent=2, ensure_ascii=False)
-                
-                return True
-            else:
-                # Firebase implementation
-                bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
-                bracket_ref.update({
-                    f'bracketLevels.county.{county_id}': {
-                        'status': status,
-                        'playerCount': player_count,
-                        'currentRound': 'County_R1',
-                        'lastUpdated': firestore.SERVER_TIMESTAMP
-                    }
-                })
-                return True
+                    'lastUpdated': firestore.SERVER_TIMESTAMP
+                }
+                for county_id, player_count in player_counts.items()
+            })
+            return True
                 
         except Exception as e:
             print(f"❌ Error updating county status: {e}")
@@ -5857,96 +7689,38 @@ class TournamentProgressionAlgorithm:
                 player_name = winner.get('name', 'Unknown')
                 print(f"🔍 POSITION LOGGING: Position {i} data - Player ID: {player_id}, Name: {player_name}")
             
-            if self.testing_mode:
-                print(f"🔍 POSITION LOGGING: Running in testing mode, updating JSON file")
-                bracket_files = [f for f in os.listdir('.') if f.startswith(f'tournament_brackets_{tournament_id}')]
-                if not bracket_files:
-                    print(f"🔍 POSITION LOGGING: No bracket files found for tournament {tournament_id}")
-                    return False
+            print(f"🔍 POSITION LOGGING: Updating bracket through {type(self.storage).__name__}")
                 
-                bracket_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                bracket_file = bracket_files[0]
-                print(f"🔍 POSITION LOGGING: Using bracket file: {bracket_file}")
-                
-                with open(bracket_file, 'r', encoding='utf-8') as f:
-                    bracket_data = json.load(f)
-                
-                if 'winners' not in bracket_data:
-                    bracket_data['winners'] = {}
-                if 'county' not in bracket_data['winners']:
-                    bracket_data['winners']['county'] = {}
-                
-                # Create the data structure to save
-                county_data = {
-                    'position1': winners[0] if len(winners) > 0 else None,
-                    'position2': winners[1] if len(winners) > 1 else None,
-                    'position3': winners[2] if len(winners) > 2 else None,
-                    'completedAt': datetime.now().isoformat()
-                }
-                print(f"🔍 POSITION LOGGING: County data structure being saved: {county_data}")
-                
-                bracket_data['winners']['county'][county_id] = county_data
-                
-                # Get region ID for these winners
-                if winners and winners[0].get('regionId'):
-                    region_id = winners[0]['regionId']
-                    print(f"🔍 POSITION LOGGING: Region ID for these winners: {region_id}")
-                    if region_id not in bracket_data['bracketLevels']['regional']:
-                        print(f"🔍 POSITION LOGGING: Creating new region entry in bracket data")
-                        bracket_data['bracketLevels']['regional'][region_id] = {
-                            'regionId': region_id,
-                            'counties': [],
-                            'status': 'pending'
-                        }
-                    
-                    if county_id not in bracket_data['bracketLevels']['regional'][region_id]['counties']:
-                        print(f"🔍 POSITION LOGGING: Adding county {county_id} to region {region_id}")
-                        bracket_data['bracketLevels']['regional'][region_id]['counties'].append(county_id)
-                
-                # Save updated bracket
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                new_bracket_file = f'tournament_brackets_{tournament_id}_{timestamp}.json'
-                print(f"🔍 POSITION LOGGING: Saving updated bracket to {new_bracket_file}")
-                with open(new_bracket_file, 'w', encoding='utf-8') as f:
-                    json.dump(bracket_data, f, indent=2, ensure_ascii=False)
-                
-                print(f"🔍 POSITION LOGGING: Successfully updated bracket with county winners in testing mode")
-                return True
-            else:
-                # Firebase implementation
-                print(f"🔍 POSITION LOGGING: Running in production mode, updating Firestore")
-                bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
-                
-                # Create the positions data structure  
-                positions_data = {}
-                if len(winners) > 0 and winners[0]:
-                    positions_data['1'] = winners[0]
-                if len(winners) > 1 and winners[1]:
-                    positions_data['2'] = winners[1]
-                if len(winners) > 2 and winners[2]:
-                    positions_data['3'] = winners[2]
-                
-                print(f"🔍 POSITION LOGGING: County positions structure being saved to Firestore: {positions_data}")
-                
-                # Update Firestore with positions structure
-                bracket_ref.update({
-                    f'positions.county.{county_id}': positions_data,
-                    'lastUpdated': firestore.SERVER_TIMESTAMP
-                })
+            # Create the positions data structure  
+            positions_data = {}
+            if len(winners) > 0 and winners[0]:
+                positions_data['1'] = winners[0]
+            if len(winners) > 1 and winners[1]:
+                positions_data['2'] = winners[1]
+            if len(winners) > 2 and winners[2]:
+                positions_data['3'] = winners[2]
+                
+            print(f"🔍 POSITION LOGGING: County positions structure being saved to Firestore: {positions_data}")
+                
+            # Update Firestore with positions structure
+            self.update_bracket_document(tournament_id, {
+                f'positions.county.{county_id}': positions_data,
+                'lastUpdated': firestore.SERVER_TIMESTAMP
+            })
                 
-                # Verify the update by reading back the data
-                try:
-                    print(f"🔍 POSITION LOGGING: Verifying Firestore update for county winners")
-                    updated_doc = bracket_ref.get().to_dict()
-                    if updated_doc and 'positions' in updated_doc and 'county' in updated_doc['positions'] and county_id in updated_doc['positions']['county']:
-                        print(f"🔍 POSITION LOGGING: Firestore update verified for county {county_id}")
-                    else:
-                        print(f"🔍 POSITION LOGGING: Warning - Could not verify Firestore update for county {county_id}")
-                except Exception as verify_error:
-                    print(f"🔍 POSITION LOGGING: Error verifying Firestore update: {verify_error}")
+            # Verify the update by reading back the data
+            try:
+                print(f"🔍 POSITION LOGGING: Verifying Firestore update for county winners")
+                updated_doc = self.get_bracket_document(tournament_id)
+                if updated_doc and 'positions' in updated_doc and 'county' in updated_doc['positions'] and county_id in updated_doc['positions']['county']:
+                    print(f"🔍 POSITION LOGGING: Firestore update verified for county {county_id}")
+                else:
+                    print(f"🔍 POSITION LOGGING: Warning - Could not verify Firestore update for county {county_id}")
+            except Exception as verify_error:
+                print(f"🔍 POSITION LOGGING: Error verifying Firestore update: {verify_error}")
                 
-                print(f"🔍 POSITION LOGGING: Successfully updated bracket with county winners in Firestore")
-                return True
+            print(f"🔍 POSITION LOGGING: Successfully updated bracket with county winners in Firestore")
+            return True
                 
         except Exception as e:
             print(f"❌ Error updating bracket with county winners: {e}")
@@ -5957,73 +7731,19 @@ class TournamentProgressionAlgorithm:
                               round_number: str, level: str) -> List[Dict]:
         """Get winners from specific level and round"""
         try:
-            if self.testing_mode:
-                matches_files = [f for f in os.listdir('.') if f.startswith(f'matches_collection_{tournament_id}')]
-                if not matches_files:
-                    return []
-                
-                matches_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                matches_file = matches_files[0]
-                
-                with open(matches_file, 'r', encoding='utf-8') as f:
-                    matches_data = json.load(f)
-                
-                winners = []
-                for match_id, match_data in matches_data.items():
-                    if (match_data.get('tournamentId') == tournament_id and
-                        match_data.get('roundNumber') == round_number and
-                        match_data.get('tournamentLevel') == level and
-                        match_data.get('status') == 'completed'):
-                        
-                        # Check entity match
-                        entity_match = False
-                        if level == 'county' and match_data.get('countyId') == entity_id:
-                            entity_match = True
-                        elif level == 'regional' and match_data.get('regionId') == entity_id:
-                            entity_match = True
-                        elif level == 'national':
-                            entity_match = True
-                        
-                        if entity_match and match_data.get('winnerId'):
-                            winner_data = self.get_winner_player_data(match_data, match_data['winnerId'])
-                            winners.append(winner_data)
+            # Completed matches for this level, entity and round
+            completed_matches = self.query_matches(tournament_id, level=level, entity_id=entity_id,
+                                                   round_number=round_number, status='completed',
+                                                   profile='winner_extraction')
                 
-                return winners
-            else:
-                # Firebase implementation
-                tournament_ref = self.db.collection('tournaments').document(tournament_id)
-                tournament_doc = tournament_ref.get()
-                
-                if not tournament_doc.exists:
-                    print(f"❌ Tournament {tournament_id} not found")
-                    return []
-                
-                tournament_data = tournament_doc.to_dict()
-                tournament_matches = tournament_data.get('matches', {})
-                
-                winners = []
-                for match_id, match_data in tournament_matches.items():
-                    if (match_data.get('tournamentId') == tournament_id and
-                        match_data.get('roundNumber') == round_number and
-                        match_data.get('tournamentLevel') == level and
-                        match_data.get('status') == 'completed'):
-                        
-                        # Check entity match
-                        entity_match = False
-                        if level == 'county' and match_data.get('countyId') == entity_id:
-                            entity_match = True
-                        elif level == 'regional' and match_data.get('regionId') == entity_id:
-                            entity_match = True
-                        elif level == 'national':
-                            entity_match = True
-                        
-                        if entity_match:
-                            winner_id = match_data.get('winnerId')
-                            if winner_id:
-                                winner_data = self.get_winner_player_data(match_data, winner_id)
-                                winners.append(winner_data)
+            winners = []
+            for match_data in completed_matches:
+                winner_id = match_data.get('winnerId')
+                if winner_id:
+                    winner_data = self.get_winner_player_data(match_data, winner_id)
+                    winners.append(winner_data)
                 
-                return winners
+            return winners
                 
         except Exception as e:
             print(f"❌ Error getting level round winners: {e}")
@@ -6033,73 +7753,19 @@ class TournamentProgressionAlgorithm:
                              round_number: str, level: str) -> List[Dict]:
         """Get losers from specific level and round"""
         try:
-            if self.testing_mode:
-                matches_files = [f for f in os.listdir('.') if f.startswith(f'matches_collection_{tournament_id}')]
-                if not matches_files:
-                    return []
-                
-                matches_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                matches_file = matches_files[0]
-                
-                with open(matches_file, 'r', encoding='utf-8') as f:
-                    matches_data = json.load(f)
-                
-                losers = []
-                for match_id, match_data in matches_data.items():
-                    if (match_data.get('tournamentId') == tournament_id and
-                        match_data.get('roundNumber') == round_number and
-                        match_data.get('tournamentLevel') == level and
-                        match_data.get('status') == 'completed'):
-                        
-                        # Check entity match
-                        entity_match = False
-                        if level == 'county' and match_data.get('countyId') == entity_id:
-                            entity_match = True
-                        elif level == 'regional' and match_data.get('regionId') == entity_id:
-                            entity_match = True
-                        elif level == 'national':
-                            entity_match = True
-                        
-                        if entity_match and match_data.get('loserId'):
-                            loser_data = self.get_winner_player_data(match_data, match_data['loserId'])
-                            losers.append(loser_data)
-                
-                return losers
-            else:
-                # Firebase implementation
-                tournament_ref = self.db.collection('tournaments').document(tournament_id)
-                tournament_doc = tournament_ref.get()
-                
-                if not tournament_doc.exists:
-                    print(f"❌ Tournament {tournament_id} not found")
-                    return []
+            # Completed matches for this level, entity and round
+            completed_matches = self.query_matches(tournament_id, level=level, entity_id=entity_id,
+                                                   round_number=round_number, status='completed',
+                                                   profile='winner_extraction')
                 
-                tournament_data = tournament_doc.to_dict()
-                tournament_matches = tournament_data.get('matches', {})
-                
-                losers = []
-                for match_id, match_data in tournament_matches.items():
-                    if (match_data.get('tournamentId') == tournament_id and
-                        match_data.get('roundNumber') == round_number and
-                        match_data.get('tournamentLevel') == level and
-                        match_data.get('status') == 'completed'):
-                        
-                        # Check entity match
-                        entity_match = False
-                        if level == 'county' and match_data.get('countyId') == entity_id:
-                            entity_match = True
-                        elif level == 'regional' and match_data.get('regionId') == entity_id:
-                            entity_match = True
-                        elif level == 'national':
-                            entity_match = True
-                        
-                        if entity_match:
-                            loser_id = match_data.get('loserId')
-                            if loser_id:
-                                loser_data = self.get_winner_player_data(match_data, loser_id)
-                                losers.append(loser_data)
+            losers = []
+            for match_data in completed_matches:
+                loser_id = match_data.get('loserId')
+                if loser_id:
+                    loser_data = self.get_winner_player_data(match_data, loser_id)
+                    losers.append(loser_data)
                 
-                return losers
+            return losers
                 
         except Exception as e:
             print(f"❌ Error getting level round losers: {e}")
@@ -6108,40 +7774,20 @@ class TournamentProgressionAlgorithm:
     def write_level_matches(self, tournament_id: str, matches: List[Dict], level: str) -> bool:
         """Write matches for any level"""
         try:
-            if self.testing_mode:
-                # Read existing matches
-                matches_files = [f for f in os.listdir('.') if f.startswith(f'matches_collection_{tournament_id}')]
-                existing_matches = {}
-                
-                if matches_files:
-                    matches_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                    with open(matches_files[0], 'r', encoding='utf-8') as f:
-                        existing_matches = json.load(f)
-                
-                # Add new matches
-                for match in matches:
-                    existing_matches[match['id']] = match
-                
-                # Save updated collection
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                new_matches_file = f'matches_collection_{tournament_id}_{timestamp}.json'
-                with open(new_matches_file, 'w', encoding='utf-8') as f:
-                    json.dump(existing_matches, f, indent=2, ensure_ascii=False)
-                
-                print(f"✅ Wrote {len(matches)} {level} matches to {new_matches_file}")
-                return True
-            else:
-                # Firebase implementation - write to tournaments/{tournament_id}/matches subcollection
-                matches_collection = self.db.collection('tournaments').document(tournament_id).collection('matches')
-                
-                # Write/update each match as a separate document in the subcollection
-                for match in matches:
-                    match_id = match['id']
-                    match_ref = matches_collection.document(match_id)
-                    match_ref.set(match)
+            # Write to tournaments/{tournament_id}/matches subcollection, sending only what changed
+            to_write, match_fields, stored_matches, rewritten_ids = self.plan_match_writes(tournament_id, matches)
+            if to_write:
+                write_report = self.storage.write_matches(tournament_id, to_write, label=f'{level} matches',
+                                                          match_fields=match_fields)
+                
+                if not write_report['success']:
+                    print(f"❌ Failed to write {level} matches to tournaments/{tournament_id}/matches subcollection")
+                    return False
+            self.record_matches_in_snapshot(tournament_id, stored_matches)
+            self.record_rounds_in_summaries(tournament_id, stored_matches, rewritten_ids=rewritten_ids)
                 
-                print(f"✅ Wrote {len(matches)} {level} matches to tournaments/{tournament_id}/matches subcollection")
-                return True
+            print(f"✅ Wrote {len(matches)} {level} matches to tournaments/{tournament_id}/matches subcollection")
+            return True
                 
         except Exception as e:
             print(f"❌ Error writing {level} matches: {e}")
@@ -6149,11 +7795,9 @@ class TournamentProgressionAlgorithm:
     
     def get_next_round_name(self, current_round: str) -> str:
         #"\"\"Get next round name for any level\"\"\"
-        if '_R' in current_round:
-            parts = current_round.split('_R')
-            prefix = parts[0]
-            round_num = int(parts[1])
-            return f"{prefix}_R{round_num + 1}"
+        descriptor = round_descriptor(current_round)
+        if descriptor.is_elimination:
+            return descriptor.next
         else:
             # Already at final
             return None
@@ -6163,57 +7807,26 @@ class TournamentProgressionAlgorithm:
         try:
             print(f"🌍 Organizing county winners by region")
             
-            if self.testing_mode:
-                bracket_files = [f for f in os.listdir('.') if f.startswith(f'tournament_brackets_{tournament_id}')]
-                if not bracket_files:
-                    return {}
-                
-                bracket_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                bracket_file = bracket_files[0]
-                
-                with open(bracket_file, 'r', encoding='utf-8') as f:
-                    bracket_data = json.load(f)
-                
-                regional_players = {}
-                county_winners = bracket_data.get('winners', {}).get('county', {})
-                
-                for county_id, positions in county_winners.items():
-                    for position, player in positions.items():
-                        if player and position.startswith('position'):
-                            region_id = player.get('regionId')
-                            if region_id:
-                                if region_id not in regional_players:
-                                    regional_players[region_id] = []
-                                
-                                player_with_position = player.copy()
-                                player_with_position['countyPosition'] = int(position[-1])
-                                regional_players[region_id].append(player_with_position)
-                
-                return regional_players
-            else:
-                # Firebase implementation
-                bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
-                bracket_doc = bracket_ref.get()
+            bracket_data = self.get_bracket_document(tournament_id)
                 
-                if not bracket_doc.exists:
-                    return {}
+            if bracket_data is None:
+                return {}
                 
-                bracket_data = bracket_doc.to_dict()
-                regional_players = {}
+            regional_players = {}
                 
-                county_winners = bracket_data.get('winners', {}).get('county', {})
-                for county_id, positions in county_winners.items():
-                    for position, player in positions.items():
-                        if player and position.startswith('position'):
-                            region_id = player.get('regionId')
-                            if region_id:
-                                if region_id not in regional_players:
-                                    regional_players[region_id] = []
-                                player_with_position = player.copy()
-                                player_with_position['countyPosition'] = int(position[-1])
-                                regional_players[region_id].append(player_with_position)
+            county_winners = bracket_data.get('winners', {}).get('county', {})
+            for county_id, positions in county_winners.items():
+                for position, player in positions.items():
+                    if player and position.startswith('position'):
+                        region_id = player.get('regionId')
+                        if region_id:
+                            if region_id not in regional_players:
+                                regional_players[region_id] = []
+                            player_with_position = player.copy()
+                            player_with_position['countyPosition'] = int(position[-1])
+                            regional_players[region_id].append(player_with_position)
                 
-                return regional_players
+            return regional_players
                 
         except Exception as e:
             print(f"❌ Error getting regional data: {e}")
@@ -6250,9 +7863,11 @@ class TournamentProgressionAlgorithm:
                 
                 all_matches.extend(regional_matches)
                 regions_initialized.append(region_id)
-                
-                # Update bracket with regional initialization
-                self.update_bracket_regional_status(tournament_id, region_id, 'active', len(players))
+            
+            # Update bracket with every region's initialization in one write
+            self.update_bracket_regional_status(
+                tournament_id, {region_id: len(players) for region_id, players in regional_players.items()}, 'active'
+            )
             
             # Write matches to collection
             write_success = self.write_level_matches(tournament_id, all_matches, 'regional')
@@ -6355,17 +7970,11 @@ class TournamentProgressionAlgorithm:
             position_groups[pos].append(player)
         
         # First pair position 1s, then 2s, then 3s
-        available_players = []
-        for pos in [1, 2, 3]:
-            available_players.extend(position_groups[pos])
+        pairing = PlayerPairing([player for pos in [1, 2, 3] for player in position_groups[pos]], shuffle=False)
         
-        match_number = 1
         round_number = "Regional_R1"
         
-        while len(available_players) >= 2:
-            player1 = available_players.pop(0)
-            player2 = available_players.pop(0)
-            
+        for match_number, player1, player2 in pairing.pairs():
             match_id = f"{round_number}_REGIONAL_{region_id}_match_{match_number}"
             
             match = self.create_comprehensive_match(
@@ -6379,12 +7988,11 @@ class TournamentProgressionAlgorithm:
             
             matches.append(match)
             print(f"         Match {match_number}: {player1['name']} (pos {player1.get('countyPosition', 0)}) vs {player2['name']} (pos {player2.get('countyPosition', 0)})")
-            match_number += 1
         
         # Handle odd player with bye
-        if available_players:
-            bye_player = available_players[0]
-            bye_match = self.create_regional_bye_match(tournament_id, region_id, round_number, bye_player, match_number)
+        if pairing.odd_player is not None:
+            bye_player = pairing.odd_player
+            bye_match = self.create_regional_bye_match(tournament_id, region_id, round_number, bye_player, pairing.next_match_number)
             matches.append(bye_match)
             print(f"         Bye Match: {bye_player['name']} (pos {bye_player.get('countyPosition', 0)}) gets automatic advancement")
         
@@ -6394,14 +8002,9 @@ class TournamentProgressionAlgorithm:
                                       round_number: str, players: List[Dict]) -> List[Dict]:
         """Generate matches for regional round"""
         matches = []
-        available_players = players.copy()
-        random.shuffle(available_players)
+        pairing = PlayerPairing(players)
         
-        match_number = 1
-        while len(available_players) >= 2:
-            player1 = available_players.pop(0)
-            player2 = available_players.pop(0)
-            
+        for match_number, player1, player2 in pairing.pairs():
             match_id = f"{round_number}_REGIONAL_{region_id}_match_{match_number}"
             
             match = self.create_comprehensive_match(
@@ -6411,12 +8014,11 @@ class TournamentProgressionAlgorithm:
             
             match['regionId'] = region_id
             matches.append(match)
-            match_number += 1
         
         # Handle odd player
-        if available_players:
-            bye_player = available_players[0]
-            bye_match = self.create_regional_bye_match(tournament_id, region_id, round_number, bye_player, match_number)
+        if pairing.odd_player is not None:
+            bye_player = pairing.odd_player
+            bye_match = self.create_regional_bye_match(tournament_id, region_id, round_number, bye_player, pairing.next_match_number)
             matches.append(bye_match)
         
         return matches
@@ -6585,50 +8187,22 @@ class TournamentProgressionAlgorithm:
         
         return bye_match
     
-    def update_bracket_regional_status(self, tournament_id: str, region_id: str,
-                                     status: str, player_count: int) -> bool:
-        """Update regional status in bracket"""
+    def update_bracket_regional_status(self, tournament_id: str, player_counts: Dict[str, int],
+                                     status: str) -> bool:
+        """Update the status of regions (region_id -> player count) in the bracket with one write"""
+        if not player_counts:
+            return True
         try:
-            if self.testing_mode:
-                bracket_files = [f for f in os.listdir('.') if f.startswith(f'tournament_brackets_{tournament_id}')]
-                if not bracket_files:
-                    return False
-                
-                bracket_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                bracket_file = bracket_files[0]
-                
-                with open(bracket_file, 'r', encoding='utf-8') as f:
-                    bracket_data = json.load(f)
-                
-                if region_id not in bracket_data['bracketLevels']['regional']:
-                    bracket_data['bracketLevels']['regional'][region_id] = {}
-                
-                bracket_data['bracketLevels']['regional'][region_id].update({
+            self.update_bracket_document(tournament_id, {
+                f'bracketLevels.regional.{region_id}': {
                     'status': status,
                     'playerCount': player_count,
                     'currentRound': 'Regional_R1',
-                    'lastUpdated': datetime.now().isoformat()
-                })
-                
-                # Save updated bracket
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                new_bracket_file = f'tournament_brackets_{tournament_id}_{timestamp}.json'
-                with open(new_bracket_file, 'w', encoding='utf-8') as f:
-                    json.dump(bracket_data, f, indent=2, ensure_ascii=False)
-                
-                return True
-            else:
-                # Firebase implementation
-                bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
-                bracket_ref.update({
-                    f'bracketLevels.regional.{region_id}': {
-                        'status': status,
-                        'playerCount': player_count,
-                        'currentRound': 'Regional_R1',
-                        'lastUpdated': firestore.SERVER_TIMESTAMP
-                    }
-                })
-                return True
+                    'lastUpdated': firestore.SERVER_TIMESTAMP
+                }
+                for region_id, player_count in player_counts.items()
+            })
+            return True
                 
         except Exception as e:
             print(f"❌ Error updating regional status: {e}")
@@ -6647,87 +8221,41 @@ class TournamentProgressionAlgorithm:
                 player_name = winner.get('name', 'Unknown')
                 print(f"🔍 POSITION LOGGING: Position {i} data - Player ID: {player_id}, Name: {player_name}")
             
-            if self.testing_mode:
-                print(f"🔍 POSITION LOGGING: Running in testing mode, updating JSON file")
-                bracket_files = [f for f in os.listdir('.') if f.startswith(f'tournament_brackets_{tournament_id}')]
-                if not bracket_files:
-                    print(f"🔍 POSITION LOGGING: No bracket files found for tournament {tournament_id}")
-                    return False
-                
-                bracket_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                bracket_file = bracket_files[0]
-                print(f"🔍 POSITION LOGGING: Using bracket file: {bracket_file}")
-                
-                with open(bracket_file, 'r', encoding='utf-8') as f:
-                    bracket_data = json.load(f)
-                
-                if 'winners' not in bracket_data:
-                    bracket_data['winners'] = {}
-                if 'regional' not in bracket_data['winners']:
-                    bracket_data['winners']['regional'] = {}
+            print(f"🔍 POSITION LOGGING: Updating bracket through {type(self.storage).__name__}")
                 
-                # Create the data structure to save
-                regional_data = {
-                    'position1': winners[0] if len(winners) > 0 else None,
-                    'position2': winners[1] if len(winners) > 1 else None,
-                    'position3': winners[2] if len(winners) > 2 else None,
-                    'completedAt': datetime.now().isoformat()
-                }
-                print(f"🔍 POSITION LOGGING: Regional data structure being saved: {regional_data}")
-                
-                bracket_data['winners']['regional'][region_id] = regional_data
-                
-                # Mark national level as ready if all regions complete
-                bracket_data['bracketLevels']['national']['status'] = 'pending'
-                print(f"🔍 POSITION LOGGING: Setting national level status to 'pending'")
+            # Create the positions data structure
+            positions_data = {}
+            if len(winners) > 0 and winners[0]:
+                positions_data['1'] = winners[0]
+            if len(winners) > 1 and winners[1]:
+                positions_data['2'] = winners[1]
+            if len(winners) > 2 and winners[2]:
+                positions_data['3'] = winners[2]
                 
-                # Save updated bracket
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                new_bracket_file = f'tournament_brackets_{tournament_id}_{timestamp}.json'
-                print(f"🔍 POSITION LOGGING: Saving updated bracket to {new_bracket_file}")
-                with open(new_bracket_file, 'w', encoding='utf-8') as f:
-                    json.dump(bracket_data, f, indent=2, ensure_ascii=False)
+            print(f"🔍 POSITION LOGGING: Regional positions structure being saved to Firestore: {positions_data}")
                 
-                print(f"🔍 POSITION LOGGING: Successfully updated bracket with regional winners in testing mode")
-                return True
-            else:
-                # Firebase implementation
-                print(f"🔍 POSITION LOGGING: Running in production mode, updating Firestore")
-                bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
-                
-                # Create the positions data structure
-                positions_data = {}
-                if len(winners) > 0 and winners[0]:
-                    positions_data['1'] = winners[0]
-                if len(winners) > 1 and winners[1]:
-                    positions_data['2'] = winners[1]
-                if len(winners) > 2 and winners[2]:
-                    positions_data['3'] = winners[2]
-                
-                print(f"🔍 POSITION LOGGING: Regional positions structure being saved to Firestore: {positions_data}")
-                
-                # Update Firestore with positions structure
-                update_data = {
-                    f'positions.regional.{region_id}': positions_data,
-                    'bracketLevels.national.status': 'pending',
-                    'lastUpdated': firestore.SERVER_TIMESTAMP
-                }
-                print(f"🔍 POSITION LOGGING: Setting national level status to 'pending' in Firestore")
-                bracket_ref.update(update_data)
+            # Update Firestore with positions structure
+            update_data = {
+                f'positions.regional.{region_id}': positions_data,
+                'bracketLevels.national.status': 'pending',
+                'lastUpdated': firestore.SERVER_TIMESTAMP
+            }
+            print(f"🔍 POSITION LOGGING: Setting national level status to 'pending' in Firestore")
+            self.update_bracket_document(tournament_id, update_data)
                 
-                # Verify the update by reading back the data
-                try:
-                    print(f"🔍 POSITION LOGGING: Verifying Firestore update for regional winners")
-                    updated_doc = bracket_ref.get().to_dict()
-                    if updated_doc and 'positions' in updated_doc and 'regional' in updated_doc['positions'] and region_id in updated_doc['positions']['regional']:
-                        print(f"🔍 POSITION LOGGING: Firestore update verified for region {region_id}")
-                    else:
-                        print(f"🔍 POSITION LOGGING: Warning - Could not verify Firestore update for region {region_id}")
-                except Exception as verify_error:
-                    print(f"🔍 POSITION LOGGING: Error verifying Firestore update: {verify_error}")
+            # Verify the update by reading back the data
+            try:
+                print(f"🔍 POSITION LOGGING: Verifying Firestore update for regional winners")
+                updated_doc = self.get_bracket_document(tournament_id)
+                if updated_doc and 'positions' in updated_doc and 'regional' in updated_doc['positions'] and region_id in updated_doc['positions']['regional']:
+                    print(f"🔍 POSITION LOGGING: Firestore update verified for region {region_id}")
+                else:
+                    print(f"🔍 POSITION LOGGING: Warning - Could not verify Firestore update for region {region_id}")
+            except Exception as verify_error:
+                print(f"🔍 POSITION LOGGING: Error verifying Firestore update: {verify_error}")
                 
-                print(f"🔍 POSITION LOGGING: Successfully updated bracket with regional winners in Firestore")
-                return True
+            print(f"🔍 POSITION LOGGING: Successfully updated bracket with regional winners in Firestore")
+            return True
                 
         except Exception as e:
             print(f"❌ Error updating bracket with regional winners: {e}")
@@ -6850,50 +8378,23 @@ class TournamentProgressionAlgorithm:
         try:
             print(f"🇰🇪 Collecting regional winners for national level")
             
-            if self.testing_mode:
-                bracket_files = [f for f in os.listdir('.') if f.startswith(f'tournament_brackets_{tournament_id}')]
-                if not bracket_files:
-                    return []
-                
-                bracket_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                bracket_file = bracket_files[0]
-                
-                with open(bracket_file, 'r', encoding='utf-8') as f:
-                    bracket_data = json.load(f)
-                
-                national_players = []
-                regional_winners = bracket_data.get('winners', {}).get('regional', {})
-                
-                for region_id, positions in regional_winners.items():
-                    for position, player in positions.items():
-                        if player and position.startswith('position'):
-                            player_with_position = player.copy()
-                            player_with_position['regionalPosition'] = int(position[-1])
-                            player_with_position['regionId'] = region_id
-                            national_players.append(player_with_position)
-                
-                return national_players
-            else:
-                # Firebase implementation
-                bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
-                bracket_doc = bracket_ref.get()
+            bracket_data = self.get_bracket_document(tournament_id)
                 
-                if not bracket_doc.exists:
-                    return []
+            if bracket_data is None:
+                return []
                 
-                bracket_data = bracket_doc.to_dict()
-                national_players = []
+            national_players = []
                 
-                regional_winners = bracket_data.get('winners', {}).get('regional', {})
-                for region_id, positions in regional_winners.items():
-                    for position, player in positions.items():
-                        if player and position.startswith('position'):
-                            player_with_position = player.copy()
-                            player_with_position['regionalPosition'] = int(position[-1])
-                            player_with_position['regionId'] = region_id
-                            national_players.append(player_with_position)
+            regional_winners = bracket_data.get('winners', {}).get('regional', {})
+            for region_id, positions in regional_winners.items():
+                for position, player in positions.items():
+                    if player and position.startswith('position'):
+                        player_with_position = player.copy()
+                        player_with_position['regionalPosition'] = int(position[-1])
+                        player_with_position['regionId'] = region_id
+                        national_players.append(player_with_position)
                 
-                return national_players
+            return national_players
                 
         except Exception as e:
             print(f"❌ Error getting national data: {e}")
@@ -6911,17 +8412,11 @@ class TournamentProgressionAlgorithm:
             position_groups[pos].append(player)
         
         # First pair position 1s, then 2s, then 3s
-        available_players = []
-        for pos in [1, 2, 3]:
-            available_players.extend(position_groups[pos])
+        pairing = PlayerPairing([player for pos in [1, 2, 3] for player in position_groups[pos]], shuffle=False)
         
-        match_number = 1
         round_number = "National_R1"
         
-        while len(available_players) >= 2:
-            player1 = available_players.pop(0)
-            player2 = available_players.pop(0)
-            
+        for match_number, player1, player2 in pairing.pairs():
             match_id = f"{round_number}_NATIONAL_match_{match_number}"
             
             match = self.create_comprehensive_match(
@@ -6936,12 +8431,11 @@ class TournamentProgressionAlgorithm:
             
             matches.append(match)
             print(f"         Match {match_number}: {player1['name']} (pos {player1.get('regionalPosition', 0)}, region {player1.get('regionId', 'Unknown')}) vs {player2['name']} (pos {player2.get('regionalPosition', 0)}, region {player2.get('regionId', 'Unknown')})")
-            match_number += 1
         
         # Handle odd player with bye
-        if available_players:
-            bye_player = available_players[0]
-            bye_match = self.create_national_bye_match(tournament_id, round_number, bye_player, match_number)
+        if pairing.odd_player is not None:
+            bye_player = pairing.odd_player
+            bye_match = self.create_national_bye_match(tournament_id, round_number, bye_player, pairing.next_match_number)
             matches.append(bye_match)
             print(f"         Bye Match: {bye_player['name']} (pos {bye_player.get('regionalPosition', 0)}) gets automatic advancement")
         
@@ -6951,14 +8445,9 @@ class TournamentProgressionAlgorithm:
                                       players: List[Dict]) -> List[Dict]:
         """Generate matches for national round"""
         matches = []
-        available_players = players.copy()
-        random.shuffle(available_players)
+        pairing = PlayerPairing(players)
         
-        match_number = 1
-        while len(available_players) >= 2:
-            player1 = available_players.pop(0)
-            player2 = available_players.pop(0)
-            
+        for match_number, player1, player2 in pairing.pairs():
             match_id = f"{round_number}_NATIONAL_match_{match_number}"
             
             match = self.create_comprehensive_match(
@@ -6967,12 +8456,11 @@ class TournamentProgressionAlgorithm:
             )
             
             matches.append(match)
-            match_number += 1
         
         # Handle odd player
-        if available_players:
-            bye_player = available_players[0]
-            bye_match = self.create_national_bye_match(tournament_id, round_number, bye_player, match_number)
+        if pairing.odd_player is not None:
+            bye_player = pairing.odd_player
+            bye_match = self.create_national_bye_match(tournament_id, round_number, bye_player, pairing.next_match_number)
             matches.append(bye_match)
         
         return matches
@@ -7134,43 +8622,15 @@ class TournamentProgressionAlgorithm:
     def update_bracket_national_status(self, tournament_id: str, status: str, player_count: int) -> bool:
         """Update national status in bracket"""
         try:
-            if self.testing_mode:
-                bracket_files = [f for f in os.listdir('.') if f.startswith(f'tournament_brackets_{tournament_id}')]
-                if not bracket_files:
-                    return False
-                
-                bracket_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                bracket_file = bracket_files[0]
-                
-                with open(bracket_file, 'r', encoding='utf-8') as f:
-                    bracket_data = json.load(f)
-                
-                bracket_data['bracketLevels']['national'].update({
+            self.update_bracket_document(tournament_id, {
+                'bracketLevels.national': {
                     'status': status,
                     'playerCount': player_count,
                     'currentRound': 'National_R1',
-                    'lastUpdated': datetime.now().isoformat()
-                })
-                
-                # Save updated bracket
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                new_bracket_file = f'tournament_brackets_{tournament_id}_{timestamp}.json'
-                with open(new_bracket_file, 'w', encoding='utf-8') as f:
-                    json.dump(bracket_data, f, indent=2, ensure_ascii=False)
-                
-                return True
-            else:
-                # Firebase implementation
-                bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
-                bracket_ref.update({
-                    'bracketLevels.national': {
-                        'status': status,
-                        'playerCount': player_count,
-                        'currentRound': 'National_R1',
-                        'lastUpdated': firestore.SERVER_TIMESTAMP
-                    }
-                })
-                return True
+                    'lastUpdated': firestore.SERVER_TIMESTAMP
+                }
+            })
+            return True
                 
         except Exception as e:
             print(f"❌ Error updating national status: {e}")
@@ -7179,62 +8639,21 @@ class TournamentProgressionAlgorithm:
     def update_bracket_with_national_winners(self, tournament_id: str, winners: List[Dict]) -> bool:
         """Store national winners in bracket - tournament complete"""
         try:
-            if self.testing_mode:
-                bracket_files = [f for f in os.listdir('.') if f.startswith(f'tournament_brackets_{tournament_id}')]
-                if not bracket_files:
-                    return False
-                
-                bracket_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                bracket_file = bracket_files[0]
-                
-                with open(bracket_file, 'r', encoding='utf-8') as f:
-                    bracket_data = json.load(f)
-                
-                if 'winners' not in bracket_data:
-                    bracket_data['winners'] = {}
-                if 'national' not in bracket_data['winners']:
-                    bracket_data['winners']['national'] = {}
-                
-                bracket_data['winners']['national'] = {
-                    'position1': winners[0] if len(winners) > 0 else None,
-                    'position2': winners[1] if len(winners) > 1 else None,
-                    'position3': winners[2] if len(winners) > 2 else None,
-                    'completedAt': datetime.now().isoformat()
-                }
-                
-                # Mark tournament as complete
-                bracket_data['tournamentComplete'] = True
-                bracket_data['completedAt'] = datetime.now().isoformat()
-                
-                # Save updated bracket
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                new_bracket_file = f'tournament_brackets_{tournament_id}_{timestamp}.json'
-                with open(new_bracket_file, 'w', encoding='utf-8') as f:
-                    json.dump(bracket_data, f, indent=2, ensure_ascii=False)
-                
-                print(f"🏆 Tournament {tournament_id} complete!")
-                print(f"   Position 1: {winners[0]['name'] if winners else 'Unknown'}")
-                print(f"   Position 2: {winners[1]['name'] if len(winners) > 1 else 'Unknown'}")
-                print(f"   Position 3: {winners[2]['name'] if len(winners) > 2 else 'Unknown'}")
-                
-                return True
-            else:
-                # Firebase implementation - use positions structure for national
-                positions_data = {}
-                if len(winners) > 0 and winners[0]:
-                    positions_data['1'] = winners[0]
-                if len(winners) > 1 and winners[1]:
-                    positions_data['2'] = winners[1]
-                if len(winners) > 2 and winners[2]:
-                    positions_data['3'] = winners[2]
-                
-                bracket_ref = self.db.collection('tournament_brackets').document(tournament_id)
-                bracket_ref.update({
-                    'positions.national': positions_data,
-                    'tournamentComplete': True,
-                    'completedAt': firestore.SERVER_TIMESTAMP
-                })
-                return True
+            # Use positions structure for national
+            positions_data = {}
+            if len(winners) > 0 and winners[0]:
+                positions_data['1'] = winners[0]
+            if len(winners) > 1 and winners[1]:
+                positions_data['2'] = winners[1]
+            if len(winners) > 2 and winners[2]:
+                positions_data['3'] = winners[2]
+                
+            self.update_bracket_document(tournament_id, {
+                'positions.national': positions_data,
+                'tournamentComplete': True,
+                'completedAt': firestore.SERVER_TIMESTAMP
+            })
+            return True
                 
         except Exception as e:
             print(f"❌ Error updating bracket with national winners: {e}")
@@ -7304,7 +8723,57 @@ class TournamentProgressionAlgorithm:
         return best_loser
 
 # Initialize algorithm instance
-algorithm = TournamentProgressionAlgorithm()
+# =================== SERVICE CONTAINER ===================
+
+class AlgorithmServiceContainer:
+    """
+    Process-wide owner of the Firestore client and the algorithm engine.
+    Both are created once and shared by every request; the client keeps its
+    gRPC channels open so requests do not pay for setup again.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._db = None
+        self._storage = None
+        self._algorithm = None
+    
+    @property
+    def db(self):
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self._db = get_firestore_client()
+        return self._db
+    
+    @property
+    def storage(self) -> StorageBackend:
+        if self._storage is None:
+            db = self.db
+            with self._lock:
+                if self._storage is None:
+                    self._storage = create_firestore_storage(db)
+        return self._storage
+    
+    @property
+    def algorithm(self) -> TournamentProgressionAlgorithm:
+        if self._algorithm is None:
+            storage = self.storage
+            with self._lock:
+                if self._algorithm is None:
+                    self._algorithm = TournamentProgressionAlgorithm(storage=storage)
+        return self._algorithm
+
+services = AlgorithmServiceContainer()
+
+@bp.before_request
+def open_algorithm_request_context():
+    """Give every API request its own state on top of the shared engine"""
+    begin_request_context()
+
+@bp.teardown_request
+def close_algorithm_request_context(exc=None):
+    end_request_context()
 
 # =================== API ENDPOINTS ===================
 from flask import render_template
@@ -7336,7 +8805,7 @@ def api_initialize_tournament():
         print(f"🏆 Tournament Level: {level}")
         print(f"🌟 Special Mode: {special}")
         
-        result = algorithm.initialize_tournament(tournament_id, special, level, scheduling_preference)
+        result = services.algorithm.initialize_tournament(tournament_id, special, level, scheduling_preference)
         
         print(f"✅ API Response: {result}")
         return jsonify(result)
@@ -7364,7 +8833,7 @@ def api_finalize_community_winners():
         
         # Get final positioning match results and determine winners
         print(f"🔍 POSITION LOGGING: Calling algorithm.finalize_community_winners method")
-        result = algorithm.finalize_community_winners(tournament_id, community_id)
+        result = services.algorithm.finalize_community_winners(tournament_id, community_id)
         
         # Log detailed result information
         success = result.get('success', False)
@@ -7418,7 +8887,7 @@ def api_community_next_round():
         print(f"📝 Request data: {data}")
         print(f"🤖 Algorithm will auto-detect current round state")
         
-        result = algorithm.generate_community_next_round(tournament_id, community_id, current_round)
+        result = services.algorithm.generate_community_next_round(tournament_id, community_id, current_round)
         
         print(f"✅ API Response: {result}")
         return jsonify(result)
@@ -7435,7 +8904,7 @@ def api_initialize_county():
     tournament_id = data.get('tournamentId')
     county_ids = data.get('countyIds')
     
-    result = algorithm.initialize_county_level(tournament_id, county_ids)
+    result = services.algorithm.initialize_county_level(tournament_id, county_ids)
     return jsonify(result)
 
 @bp.route('/county/next-round', methods=['POST'])
@@ -7446,7 +8915,7 @@ def api_county_next_round():
     county_id = data.get('countyId')
     current_round = data.get('currentRound')
     
-    result = algorithm.generate_county_next_round(tournament_id, county_id, current_round)
+    result = services.algorithm.generate_county_next_round(tournament_id, county_id, current_round)
     return jsonify(result)
 
 @bp.route('/regional/initialize', methods=['POST'])
@@ -7456,7 +8925,7 @@ def api_initialize_regional():
     tournament_id = data.get('tournamentId')
     region_ids = data.get('regionIds')
     
-    result = algorithm.initialize_regional_level(tournament_id, region_ids)
+    result = services.algorithm.initialize_regional_level(tournament_id, region_ids)
     return jsonify(result)
 
 @bp.route('/regional/next-round', methods=['POST'])
@@ -7467,7 +8936,7 @@ def api_regional_next_round():
     region_id = data.get('regionId')
     current_round = data.get('currentRound')
     
-    result = algorithm.generate_regional_next_round(tournament_id, region_id, current_round)
+    result = services.algorithm.generate_regional_next_round(tournament_id, region_id, current_round)
     return jsonify(result)
 
 @bp.route('/national/initialize', methods=['POST'])
@@ -7476,7 +8945,7 @@ def api_initialize_national():
     data = request.json
     tournament_id = data.get('tournamentId')
     
-    result = algorithm.initialize_national_level(tournament_id)
+    result = services.algorithm.initialize_national_level(tournament_id)
     return jsonify(result)
 
 @bp.route('/national/next-round', methods=['POST'])
@@ -7486,7 +8955,7 @@ def api_national_next_round():
     tournament_id = data.get('tournamentId')
     current_round = data.get('currentRound')
     
-    result = algorithm.generate_national_next_round(tournament_id, current_round)
+    result = services.algorithm.generate_national_next_round(tournament_id, current_round)
     return jsonify(result)
 
 @bp.route('/tournament/positions', methods=['POST'])
@@ -7521,8 +8990,7 @@ def api_get_tournament_positions():
         
         print(f"🏆 API: Getting tournament positions for {level} {entity_id}")
         
-        algorithm = TournamentProgressionAlgorithm()
-        positions = algorithm.get_tournament_positions(tournament_id, entity_id, level)
+        positions = services.algorithm.get_tournament_positions(tournament_id, entity_id, level)
         
         return jsonify({
             'success': True,
@@ -7590,8 +9058,7 @@ def finalize_tournament_positions():
         print(f"   Tournament ID: {tournament_id}")
         print(f"   Entity ID: {entity_id}")
         
-        algorithm = TournamentProgressionAlgorithm()
-        result = algorithm.finalize_tournament_positions(tournament_id, entity_id, level)
+        result = services.algorithm.finalize_tournament_positions(tournament_id, entity_id, level)
         
         if result.get('success'):
             return jsonify({
@@ -7618,12 +9085,93 @@ def finalize_tournament_positions():
             'message': 'Failed to finalize tournament positions'
         }), 500
 
+@bp.route('/match/result-recorded', methods=['POST'])
+def api_match_result_recorded():
+    """
+    Update the round summary after a match result is saved
+    POST /api/algorithm/match/result-recorded
+    Body: {
+        "tournamentId": "string",
+        "matchId": "string"
+    }
+    """
+    try:
+        data = request.json or {}
+        tournament_id = data.get('tournamentId')
+        match_id = data.get('matchId')
+        
+        if not all([tournament_id, match_id]):
+            return jsonify({'success': False, 'error': 'Missing required parameters: tournamentId, matchId'}), 400
+        
+        result = services.algorithm.record_match_result(tournament_id, match_id)
+        return jsonify(result)
+        
+    except Exception as e:
+        error_msg = f"API Error in match_result_recorded: {str(e)}"
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
+
+@bp.route('/live-state/watch', methods=['POST'])
+def api_watch_tournament():
+    """
+    Keep a tournament's matches and bracket resident in memory (requires ALGORITHM_LIVE_STATE=1)
+    POST /api/algorithm/live-state/watch
+    Body: {"tournamentId": "string"}
+    """
+    try:
+        data = request.json or {}
+        tournament_id = data.get('tournamentId')
+        if not tournament_id:
+            return jsonify({'success': False, 'error': 'Missing required parameter: tournamentId'}), 400
+        
+        return jsonify(services.algorithm.watch_tournament(tournament_id))
+    except Exception as e:
+        error_msg = f"API Error in watch_tournament: {str(e)}"
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
+
+@bp.route('/live-state/unwatch', methods=['POST'])
+def api_unwatch_tournament():
+    """
+    Stop keeping a tournament resident in memory
+    POST /api/algorithm/live-state/unwatch
+    Body: {"tournamentId": "string"}
+    """
+    try:
+        data = request.json or {}
+        tournament_id = data.get('tournamentId')
+        if not tournament_id:
+            return jsonify({'success': False, 'error': 'Missing required parameter: tournamentId'}), 400
+        
+        return jsonify(services.algorithm.unwatch_tournament(tournament_id))
+    except Exception as e:
+        error_msg = f"API Error in unwatch_tournament: {str(e)}"
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
+
+@bp.route('/cache/geographical-units/invalidate', methods=['POST'])
+def api_invalidate_geographical_units():
+    """Invalidate cached geographical units after they are edited"""
+    try:
+        data = request.json or {}
+        community_id = data.get('communityId')
+        
+        geographical_unit_cache.invalidate(community_id)
+        
+        return jsonify({
+            'success': True,
+            'invalidated': community_id or 'all'
+        })
+    except Exception as e:
+        error_msg = f"API Error in invalidate_geographical_units: {str(e)}"
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
+
 @bp.route('/test-connection', methods=['GET'])
 def test_connection():
     """Test Firebase connection"""
     try:
-        db = get_firestore_client()
-        test_ref = db.collection('test').document('connection')
+        test_ref = services.db.collection('test').document('connection')
         test_ref.set({'timestamp': firestore.SERVER_TIMESTAMP, 'status': 'connected'})
         
         return jsonify({
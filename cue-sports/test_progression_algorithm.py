@@ -0,0 +1,432 @@
+"""
+Offline tests for the progression engine (routes.py) against the in-process storage backends
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from google.cloud.firestore_v1.bulk_writer import BulkWriteFailure, BulkWriterSetOperation
+
+import routes
+
+class StubBulkWriter:
+    """BulkWriter that fails every write, retrying through the error callback like the real one"""
+    
+    def __init__(self):
+        self.operations = []
+        self.on_error = None
+    
+    def on_write_error(self, callback):
+        self.on_error = callback
+    
+    def set(self, reference, document_data, merge=False):
+        self.operations.append(BulkWriterSetOperation(reference=reference, document_data=document_data, merge=merge))
+    
+    def flush(self):
+        for operation in self.operations:
+            while True:
+                operation.attempts += 1
+                failure = BulkWriteFailure(operation=operation, code=14, message='unavailable')
+                if not self.on_error(failure, self):
+                    break
+        self.operations = []
+    
+    def close(self):
+        self.flush()
+
+class StubBulkWriterDb:
+    def __init__(self):
+        self.writer = StubBulkWriter()
+    
+    def bulk_writer(self):
+        return self.writer
+
+def test_bulk_writer_failures_are_reported():
+    storage = routes.FirestoreStorageBackend(StubBulkWriterDb())
+    writes = [('set', SimpleNamespace(id=f'match_{number}'), {}) for number in range(routes.BULK_WRITER_THRESHOLD + 1)]
+    
+    report = storage.commit_writes_in_batches(writes, label='matches')
+    
+    assert report['success'] is False
+    assert report['chunks'] and not any(chunk['success'] for chunk in report['chunks'])
+    assert report['chunks'][0]['errors'][0] == 'match_0: unavailable'
+    assert sum(len(chunk['errors']) for chunk in report['chunks']) == len(writes)
+
+class CountingUnitStorage(routes.InMemoryStorageBackend):
+    """In-memory storage counting geographical unit scans; fail makes every scan raise"""
+    
+    def __init__(self, fail=False, delay=0):
+        super().__init__()
+        self.fail = fail
+        self.delay = delay
+        self.scans = 0
+        for unit_id in ('C0', 'C1', 'C2'):
+            self.put_geographical_unit(unit_id, {'name': unit_id, 'countyId': 'K0'})
+    
+    def list_geographical_units(self):
+        self.scans += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError('scan failed')
+        return super().list_geographical_units()
+
+def test_geographical_cache_backs_off_after_failed_warm():
+    storage = CountingUnitStorage(fail=True)
+    cache = routes.GeographicalUnitCache()
+    
+    assert cache.get(storage, 'C0')['name'] == 'C0'
+    assert cache.get(storage, 'C1')['name'] == 'C1'
+    assert cache.get(storage, 'C2')['name'] == 'C2'
+    assert storage.scans == 1
+
+def test_geographical_cache_concurrent_misses_share_one_warm():
+    storage = CountingUnitStorage(delay=0.05)
+    cache = routes.GeographicalUnitCache()
+    
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        units = list(executor.map(lambda unit_id: cache.get(storage, unit_id), ['C0', 'C1', 'C2'] * 2))
+    
+    assert [unit['name'] for unit in units] == ['C0', 'C1', 'C2'] * 2
+    assert storage.scans == 1
+
+def test_incomplete_storage_backend_fails_at_construction():
+    class PartialBackend(routes.StorageBackend):
+        def get_tournament(self, tournament_id):
+            return None
+    
+    with pytest.raises(TypeError):
+        PartialBackend()
+    routes.InMemoryStorageBackend()
+    routes.SQLiteStorageBackend(':memory:')
+
+# In-memory tournaments
+
+TOURNAMENT_ID = 'T1'
+COMMUNITY_ID = 'C0'
+
+def create_engine(player_count):
+    """Engine on in-memory storage seeded with one community of player_count registered players"""
+    storage = routes.InMemoryStorageBackend()
+    storage.put_geographical_unit(COMMUNITY_ID, {'name': 'Community 0', 'countyId': 'K0', 'regionId': 'R0'})
+    player_ids = [f'player_{number}' for number in range(player_count)]
+    for player_id in player_ids:
+        storage.put_user(player_id, {'displayName': player_id, 'communityId': COMMUNITY_ID,
+                                     'countyId': 'K0', 'regionId': 'R0'})
+    storage.put_tournament(TOURNAMENT_ID, {'tournamentName': 'Test', 'registeredPlayersIds': player_ids,
+                                           'hierarchicalLevel': 'community'})
+    return routes.TournamentProgressionAlgorithm(storage=storage)
+
+def in_request(function, *args, **kwargs):
+    """Run an engine call in its own request context, as the blueprint does"""
+    routes.begin_request_context()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        routes.end_request_context()
+
+def stored_round(engine, round_number):
+    matches = engine.storage.matches[TOURNAMENT_ID].values()
+    return sorted((match for match in matches if match['roundNumber'] == round_number), key=lambda match: match['id'])
+
+def submit_result(engine, match, winner_slot=1, status='completed'):
+    """Store a result on a match (as the admin app does) and report it to the engine"""
+    stored = engine.storage.matches[TOURNAMENT_ID][match['id']]
+    loser_slot = 2 if winner_slot == 1 else 1
+    stored.update({
+        'status': status,
+        f'player{winner_slot}Points': 3, f'player{loser_slot}Points': 1,
+        'winnerId': stored[f'player{winner_slot}Id'], 'winnerName': stored.get(f'player{winner_slot}Name'),
+        'loserId': stored.get(f'player{loser_slot}Id'), 'loserName': stored.get(f'player{loser_slot}Name')
+    })
+    return in_request(engine.record_match_result, TOURNAMENT_ID, match['id'])
+
+def test_reverted_and_changed_results_leave_the_round_summary():
+    engine = create_engine(6)
+    assert in_request(engine.initialize_tournament, TOURNAMENT_ID)['success']
+    first_round = stored_round(engine, 'R1')
+    for match in first_round:
+        result = submit_result(engine, match)
+    assert result['completedMatches'] == 3
+    
+    disputed = submit_result(engine, first_round[0], status='disputed')
+    assert disputed['completedMatches'] == 2
+    assert first_round[0]['player1Id'] not in disputed['winners']
+    assert not in_request(engine.validate_round_completion, TOURNAMENT_ID, COMMUNITY_ID, 'R1', 'community')['success']
+    assert not in_request(engine.generate_community_next_round, TOURNAMENT_ID, COMMUNITY_ID, 'R1')['success']
+    
+    changed = submit_result(engine, first_round[1], winner_slot=2)
+    assert first_round[1]['player2Id'] in changed['winners']
+    assert first_round[1]['player1Id'] not in changed['winners']
+    
+    restored = submit_result(engine, first_round[0])
+    assert restored['completedMatches'] == 3 and len(restored['winners']) == 3
+    assert in_request(engine.validate_round_completion, TOURNAMENT_ID, COMMUNITY_ID, 'R1', 'community')['success']
+
+def test_result_disputed_directly_in_storage_leaves_the_round_summary():
+    engine = create_engine(6)
+    assert in_request(engine.initialize_tournament, TOURNAMENT_ID)['success']
+    first_round = stored_round(engine, 'R1')
+    for match in first_round:
+        submit_result(engine, match)
+    assert in_request(engine.validate_round_completion, TOURNAMENT_ID, COMMUNITY_ID, 'R1', 'community')['success']
+    
+    # The admin app disputes the result on the match document without reporting it to the engine
+    engine.storage.matches[TOURNAMENT_ID][first_round[0]['id']]['status'] = 'disputed'
+    
+    validation = in_request(engine.validate_round_completion, TOURNAMENT_ID, COMMUNITY_ID, 'R1', 'community')
+    assert not validation['success'] and validation['incompleteMatches'] == [first_round[0]['id']]
+    summary = in_request(engine.get_round_summary, TOURNAMENT_ID, 'community', COMMUNITY_ID)['rounds']['R1']
+    assert first_round[0]['id'] not in summary['completedMatchIds']
+    assert first_round[0]['player1Id'] not in summary['winnerIds']
+
+def regenerate_round(engine, matches, round_number='R1'):
+    """Fresh match documents for the given pairings, as a round re-generation produces them"""
+    return [engine.create_comprehensive_match(
+                match['id'], TOURNAMENT_ID, round_number, COMMUNITY_ID, match['matchNumber'],
+                {'id': match['player1Id'], 'name': match['player1Name'], 'communityId': COMMUNITY_ID},
+                {'id': match['player2Id'], 'name': match['player2Name'], 'communityId': COMMUNITY_ID}, 'community')
+            for match in matches]
+
+def test_repaired_match_drops_the_old_pairing_result():
+    engine = create_engine(8)
+    assert in_request(engine.initialize_tournament, TOURNAMENT_ID)['success']
+    first_round = stored_round(engine, 'R1')
+    submit_result(engine, first_round[0])
+    
+    pairings = [dict(match) for match in first_round]
+    pairings[0]['player1Id'], pairings[1]['player1Id'] = first_round[1]['player1Id'], first_round[0]['player1Id']
+    pairings[0]['player1Name'], pairings[1]['player1Name'] = first_round[1]['player1Name'], first_round[0]['player1Name']
+    assert in_request(engine.write_community_round_to_firebase, TOURNAMENT_ID, COMMUNITY_ID, 'R1',
+                      regenerate_round(engine, pairings))
+    
+    repaired = stored_round(engine, 'R1')[0]
+    assert repaired['player1Id'] == first_round[1]['player1Id']
+    assert repaired['status'] == 'scheduled' and repaired.get('winnerId') is None
+    assert repaired['player1Points'] == 0 and repaired['player2Points'] == 0
+    summary = in_request(engine.get_round_summary, TOURNAMENT_ID, 'community', COMMUNITY_ID)
+    assert summary['rounds']['R1']['completedMatchIds'] == []
+    assert summary['rounds']['R1']['winnerIds'] == []
+
+@pytest.mark.parametrize('player_count', [5, 7, 9])
+def test_elimination_plan_stages_name_the_generated_matches(player_count):
+    engine = create_engine(player_count)
+    assert in_request(engine.initialize_tournament, TOURNAMENT_ID)['success']
+    plan = engine.storage.get_bracket(TOURNAMENT_ID)['progression']['community'][COMMUNITY_ID]
+    
+    first_stage = plan['stages'][0]
+    assert first_stage['phase'] == 'elimination' and 'slots' not in first_stage
+    assert routes.plan_stage_match_ids(plan, first_stage) == [match['id'] for match in stored_round(engine, 'R1')]
+
+def progression_state(engine):
+    return in_request(engine.get_community_progression_state, TOURNAMENT_ID, COMMUNITY_ID)
+
+def test_progression_state_is_derived_from_recorded_results():
+    engine = create_engine(4)
+    assert in_request(engine.initialize_tournament, TOURNAMENT_ID)['success']
+    semi_finals = stored_round(engine, 'Community_SF')
+    
+    assert submit_result(engine, semi_finals[0])['progressionState'] == 'awaiting_results'
+    assert submit_result(engine, semi_finals[1])['progressionState'] == 'stage_decided'
+    plan = engine.storage.get_bracket(TOURNAMENT_ID)['progression']['community'][COMMUNITY_ID]
+    assert 'state' not in plan
+    
+    submit_result(engine, semi_finals[1], status='disputed')
+    assert progression_state(engine) == 'awaiting_results'
+
+class CountingMatchStorage(routes.InMemoryStorageBackend):
+    def __init__(self):
+        super().__init__()
+        self.match_writes = []
+    
+    def write_matches(self, tournament_id, matches, bracket=None, bracket_updates=None, label='matches',
+                      match_fields=None):
+        self.match_writes.append(([match['id'] for match in matches], dict(match_fields or {})))
+        return super().write_matches(tournament_id, matches, bracket=bracket, bracket_updates=bracket_updates,
+                                     label=label, match_fields=match_fields)
+
+def test_round_rewrite_only_writes_changed_fields():
+    engine = create_engine(8)
+    storage = CountingMatchStorage()
+    for attribute in ('tournaments', 'users', 'geographical_units'):
+        setattr(storage, attribute, getattr(engine.storage, attribute))
+    engine = routes.TournamentProgressionAlgorithm(storage=storage)
+    assert in_request(engine.initialize_tournament, TOURNAMENT_ID)['success']
+    first_round = stored_round(engine, 'R1')
+    submit_result(engine, first_round[0])
+    storage.matches[TOURNAMENT_ID][first_round[1]['id']]['venueName'] = 'Hall A'
+    
+    regenerated = regenerate_round(engine, first_round)
+    regenerated[2]['player2Name'] = 'Renamed'
+    storage.match_writes = []
+    assert in_request(engine.write_community_round_to_firebase, TOURNAMENT_ID, COMMUNITY_ID, 'R1', regenerated)
+    
+    written_ids, match_fields = storage.match_writes[0]
+    assert written_ids == [first_round[2]['id']]
+    assert match_fields == {first_round[2]['id']: ['player2Name', 'updatedAt']}
+    stored = {match['id']: match for match in stored_round(engine, 'R1')}
+    assert stored[first_round[0]['id']]['status'] == 'completed'
+    assert stored[first_round[1]['id']]['venueName'] == 'Hall A'
+    assert stored[first_round[2]['id']]['player2Name'] == 'Renamed'
+    
+    storage.match_writes = []
+    assert in_request(engine.write_community_round_to_firebase, TOURNAMENT_ID, COMMUNITY_ID, 'R1', regenerated)
+    assert storage.match_writes[0] == ([], {})
+
+def complete_open_matches(engine):
+    for match in list(engine.storage.matches[TOURNAMENT_ID].values()):
+        if match.get('status') != 'completed':
+            submit_result(engine, match)
+
+@pytest.mark.parametrize('player_count', [4, 5, 7, 9, 12, 17])
+def test_community_plays_through_its_plan_to_finalized_positions(player_count):
+    engine = create_engine(player_count)
+    assert in_request(engine.initialize_tournament, TOURNAMENT_ID)['success']
+    plan = engine.storage.get_bracket(TOURNAMENT_ID)['progression']['community'][COMMUNITY_ID]
+    planned_rounds = [stage['round'] for stage in plan['stages']]
+    
+    played_rounds = [planned_rounds[0]]
+    while True:
+        complete_open_matches(engine)
+        assert progression_state(engine) in ('stage_decided', 'positions_decided')
+        result = in_request(engine.generate_community_next_round, TOURNAMENT_ID, COMMUNITY_ID, played_rounds[-1])
+        if not result['success']:
+            break
+        played_rounds.append(result['roundGenerated'])
+        assert progression_state(engine) == 'awaiting_results'
+    
+    assert result['error'] == 'Community tournament completed'
+    assert played_rounds == planned_rounds
+    assert progression_state(engine) == 'positions_decided'
+    
+    finalized = in_request(engine.finalize_tournament_positions, TOURNAMENT_ID, COMMUNITY_ID, 'community')
+    assert finalized['success']
+    position_ids = [finalized['positions'][position]['id'] for position in ('1', '2', '3')]
+    assert len(set(position_ids)) == 3
+    assert progression_state(engine) == 'finalized'
+    stored_positions = engine.storage.get_bracket(TOURNAMENT_ID)['positions']['community'][COMMUNITY_ID]
+    assert [stored_positions[position]['id'] for position in ('1', '2', '3')] == position_ids
+
+@pytest.mark.parametrize('player_count', [0, 1, 2, 5, 8])
+def test_player_pairing_pairs_in_order_and_keeps_the_odd_player(player_count):
+    players = [{'id': f'player_{number}'} for number in range(player_count)]
+    pairing = routes.PlayerPairing(players, shuffle=False)
+    
+    pairs = list(pairing.pairs())
+    assert [(number, first['id'], second['id']) for number, first, second in pairs] == [
+        (number + 1, f'player_{2 * number}', f'player_{2 * number + 1}') for number in range(player_count // 2)]
+    assert pairing.odd_player == (players[-1] if player_count % 2 else None)
+    assert pairing.next_match_number == len(pairs) + 1
+
+def test_player_pairing_shuffles_a_copy():
+    players = [{'id': f'player_{number}'} for number in range(20)]
+    pairing = routes.PlayerPairing(players)
+    
+    assert [player['id'] for player in players] == [f'player_{number}' for number in range(20)]
+    assert sorted(player['id'] for player in pairing.players) == sorted(player['id'] for player in players)
+
+@pytest.mark.parametrize('round_name, level, phase, ordinal, base, next_round, previous_round', [
+    ('R1', 'community', 'R', 1, 'R1', 'R2', None),
+    ('R5', 'community', 'R', 5, 'R5', 'Community_Final', 'R4'),
+    ('R3_WB', 'community', 'WB', 3, 'R3', None, None),
+    ('Community_WF', 'community', 'WF', None, 'Community_WF', 'Community_Final', None),
+    ('County_R8', 'county', 'R', 8, 'County_R8', 'County_R9', 'County_R7'),
+    ('National_Final', 'national', 'Final', None, 'National_Final', None, None),
+])
+def test_round_descriptor_parses_round_names(round_name, level, phase, ordinal, base, next_round, previous_round):
+    descriptor = routes.round_descriptor(round_name)
+    
+    assert (descriptor.level, descriptor.phase, descriptor.ordinal) == (level, phase, ordinal)
+    assert (descriptor.base, descriptor.next, descriptor.previous) == (base, next_round, previous_round)
+    assert descriptor.is_elimination == (phase == 'R')
+    assert routes.round_descriptor(round_name) is descriptor
+
+def test_round_descriptor_priorities_and_unknown_names():
+    priorities = [routes.round_descriptor(name).priority for name in ('Community_Final', 'Community_WF', 'Community_SF', 'R2')]
+    assert priorities == sorted(priorities, reverse=True) and priorities[-1] == 0
+    
+    unknown = routes.round_descriptor('Playoff')
+    assert unknown.phase is None and unknown.level is None and not unknown.is_elimination
+    assert 'Playoff' not in routes.ROUND_DESCRIPTORS
+
+class ListenerStubStorage(routes.InMemoryStorageBackend):
+    """In-memory stand-in for the Firestore backend whose snapshot listeners only fire when told to"""
+    
+    def __init__(self):
+        super().__init__()
+        self.callbacks = {}
+    
+    def _listen(self, name):
+        def on_snapshot(callback):
+            self.callbacks[name] = callback
+            return SimpleNamespace(unsubscribe=lambda: None, is_active=True)
+        return SimpleNamespace(on_snapshot=on_snapshot)
+    
+    def _matches_collection(self, tournament_id):
+        return self._listen('matches')
+    
+    def _bracket_ref(self, tournament_id):
+        return self._listen('bracket')
+
+def deliver_initial_state(backend, match_id):
+    document = SimpleNamespace(id=match_id, exists=True, to_dict=lambda: {'roundNumber': 'R1', 'status': 'scheduled'})
+    backend.callbacks['matches']([], [SimpleNamespace(type=SimpleNamespace(name='ADDED'), document=document)], None)
+    backend.callbacks['bracket']([SimpleNamespace(exists=False)], [], None)
+
+def test_live_state_auto_watch_does_not_block_reads():
+    backend = ListenerStubStorage()
+    backend.write_matches(TOURNAMENT_ID, [{'id': 'm1', 'roundNumber': 'R1', 'status': 'scheduled'}])
+    live = routes.LiveStorageBackend(backend)
+    
+    started = time.time()
+    assert [match['id'] for match in live.get_matches(TOURNAMENT_ID, ['m1'])] == ['m1']
+    assert time.time() - started < 1
+    assert live.watched_tournaments() == [TOURNAMENT_ID]
+    
+    # Once both listeners delivered their initial state, reads are served from the resident copy
+    deliver_initial_state(backend, 'm2')
+    assert [match['id'] for match in live.query_matches(TOURNAMENT_ID, {'roundNumber': 'R1'})] == ['m2']
+
+def test_live_state_rewatched_while_unwatching_keeps_its_resident_copy():
+    backend = ListenerStubStorage()
+    live = routes.LiveStorageBackend(backend, auto_watch=False)
+    live.watch(TOURNAMENT_ID, timeout=0)
+    deliver_initial_state(backend, 'm1')
+    
+    def rewatch():
+        # Another request watches the tournament again while the old listeners are being stopped
+        live.watch(TOURNAMENT_ID, timeout=0)
+        deliver_initial_state(backend, 'm2')
+    
+    live._watches[TOURNAMENT_ID]['listeners'][0].unsubscribe = rewatch
+    assert live.unwatch(TOURNAMENT_ID)
+    
+    assert live.watched_tournaments() == [TOURNAMENT_ID]
+    assert [match['id'] for match in live.query_matches(TOURNAMENT_ID, {'roundNumber': 'R1'})] == ['m2']
+
+class CountingBracketStorage(routes.InMemoryStorageBackend):
+    def __init__(self):
+        super().__init__()
+        self.bracket_updates = []
+    
+    def update_bracket(self, tournament_id, updates):
+        self.bracket_updates.append(updates)
+        super().update_bracket(tournament_id, updates)
+
+def test_county_initialization_writes_every_county_status_at_once():
+    storage = CountingBracketStorage()
+    community_winners = {
+        f'C{number}': {
+            'position1': {'id': f'winner_{number}', 'name': 'A', 'countyId': f'K{number}', 'regionId': 'R0'},
+            'position2': {'id': f'runner_up_{number}', 'name': 'B', 'countyId': f'K{number}', 'regionId': 'R0'}
+        }
+        for number in range(10)
+    }
+    storage.brackets[TOURNAMENT_ID] = {'tournamentId': TOURNAMENT_ID, 'winners': {'community': community_winners}}
+    engine = routes.TournamentProgressionAlgorithm(storage=storage)
+    
+    result = in_request(engine.initialize_county_level, TOURNAMENT_ID)
+    
+    assert result['success'] and len(result['countiesInitialized']) == 10
+    assert len(storage.bracket_updates) == 1
+    assert sorted(storage.brackets[TOURNAMENT_ID]['bracketLevels']['county']) == [f'K{number}' for number in range(10)]